@@ -1,5 +1,6 @@
 # backend/app/config.py
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,8 +16,82 @@ class Settings:
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Authenticated-user cache settings
+    AUTH_CACHE_SIZE: int = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+    AUTH_CACHE_TTL_SECONDS: float = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+    
+    # Message decryption pool settings ("thread" or "process")
+    DECRYPT_EXECUTOR: str = os.getenv("DECRYPT_EXECUTOR", "thread")
+    DECRYPT_WORKERS: int = int(os.getenv("DECRYPT_WORKERS", str(os.cpu_count() or 4)))
+    DECRYPT_BATCH_SIZE: int = int(os.getenv("DECRYPT_BATCH_SIZE", "64"))
+    
+    # RSA key pool settings
+    RSA_KEY_POOL_SIZE: int = int(os.getenv("RSA_KEY_POOL_SIZE", "16"))
+    RSA_KEY_POOL_WORKERS: int = int(os.getenv("RSA_KEY_POOL_WORKERS", "2"))
+    RSA_KEY_BITS: int = int(os.getenv("RSA_KEY_BITS", "2048"))
+    
+    # Parsed key / cipher cache size (entries)
+    KEY_CACHE_SIZE: int = int(os.getenv("KEY_CACHE_SIZE", "4096"))
+    
+    # Logging settings (DEBUG_LOGGING restores the detailed diagnostics)
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "WARNING")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+    DEBUG_LOGGING: bool = os.getenv("DEBUG_LOGGING", "false").lower() in ("1", "true", "yes")
+    LOG_DEBUG_SAMPLE_RATE: float = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+    LOG_DEBUG_RATE_LIMIT: float = float(os.getenv("LOG_DEBUG_RATE_LIMIT", "20"))  # per call site per second
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    
+    # WebSocket fan-out broker ("memory", "unix" or "redis")
+    BROKER_BACKEND: str = os.getenv("BROKER_BACKEND", "memory")
+    BROKER_SOCKET_DIR: str = os.getenv(
+        "BROKER_SOCKET_DIR", os.path.join(tempfile.gettempdir(), "messaging-broker")
+    )
+    BROKER_URL: str = os.getenv("BROKER_URL", "redis://localhost:6379/0")
+    
+    # Per-connection WebSocket send queue ("drop", "coalesce" or "disconnect" when full)
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+    WS_SEND_QUEUE_POLICY: str = os.getenv("WS_SEND_QUEUE_POLICY", "disconnect")
+    
+    # WebSocket heartbeat: ping after HEARTBEAT_INTERVAL seconds of silence,
+    # close after IDLE_TIMEOUT seconds (0 disables)
+    WS_HEARTBEAT_INTERVAL: float = float(os.getenv("WS_HEARTBEAT_INTERVAL", "30"))
+    WS_IDLE_TIMEOUT: float = float(os.getenv("WS_IDLE_TIMEOUT", "90"))
+    
+    # WebSocket message write coalescing (one insert_many per batch)
+    MESSAGE_BATCH_SIZE: int = int(os.getenv("MESSAGE_BATCH_SIZE", "64"))
+    MESSAGE_BATCH_DELAY_MS: float = float(os.getenv("MESSAGE_BATCH_DELAY_MS", "5"))
+    
+    # WebSocket ingest pipeline: concurrent messages allowed in each stage
+    # (encrypt runs on INGEST_ENCRYPT_WORKERS threads)
+    INGEST_ENCRYPT_WORKERS: int = int(os.getenv("INGEST_ENCRYPT_WORKERS", str(os.cpu_count() or 4)))
+    INGEST_ENCRYPT_CONCURRENCY: int = int(os.getenv("INGEST_ENCRYPT_CONCURRENCY", "32"))
+    INGEST_PERSIST_CONCURRENCY: int = int(os.getenv("INGEST_PERSIST_CONCURRENCY", "512"))
+    INGEST_DELIVER_CONCURRENCY: int = int(os.getenv("INGEST_DELIVER_CONCURRENCY", "512"))
+    
     # File upload settings
     UPLOAD_FOLDER: str = "uploads"
+    GRIDFS_CHUNK_SIZE: int = int(os.getenv("GRIDFS_CHUNK_SIZE", str(255 * 1024)))
+    UPLOAD_READ_SIZE: int = int(os.getenv("UPLOAD_READ_SIZE", str(1024 * 1024)))
+    # Key for the content hash used to deduplicate uploads. Never the JWT
+    # secret itself: when unset, a separate key is derived from it with HKDF
+    FILE_DEDUP_KEY: str = os.getenv("FILE_DEDUP_KEY")
+    # Thumbnail/preview renditions ("name:max_px" list). Optional: Pillow for
+    # images, pypdfium2 for PDF first pages. RENDITION_EAGER_SIZES are
+    # rendered in the background right after upload, the rest on first request.
+    RENDITION_SIZES: dict = {
+        name.strip(): int(px) for name, px in (
+            item.split(":") for item in os.getenv("RENDITION_SIZES", "small:160,medium:480,large:1280").split(",")
+        )
+    }
+    # Default matches the size the chat bubble requests (FilePreview.tsx)
+    RENDITION_EAGER_SIZES: list = [
+        name.strip() for name in os.getenv("RENDITION_EAGER_SIZES", "medium").split(",") if name.strip()
+    ]
+    RENDITION_WORKERS: int = int(os.getenv("RENDITION_WORKERS", "2"))
+    RENDITION_MAX_SOURCE_BYTES: int = int(os.getenv("RENDITION_MAX_SOURCE_BYTES", str(50 * 1024 * 1024)))
+    RENDITION_QUALITY: int = int(os.getenv("RENDITION_QUALITY", "80"))
+    # Images larger than this (width * height) are not decoded
+    RENDITION_MAX_PIXELS: int = int(os.getenv("RENDITION_MAX_PIXELS", str(40 * 1000 * 1000)))
     
     # Email settings
     BREVO_API_KEY: str = os.getenv("BREVO_API_KEY")
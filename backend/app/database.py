@@ -1,18 +1,31 @@
 # backend/app/database.py
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
 from pymongo.server_api import ServerApi
 from bson import ObjectId
 from .config import settings
+from .services.user_cache import auth_cache
+from .services.metrics import MongoCommandMetrics
 import io
+import json
+import base64
+import asyncio
+import hashlib
+import re
 from datetime import datetime, timezone, timedelta
+import logging
 
-print("Connecting to MongoDB...")
+logger = logging.getLogger(__name__)
+
+logger.debug("Connecting to MongoDB...")
 
 # MongoDB connection
 try:
     client = AsyncIOMotorClient(
         settings.DATABASE_URL,
-        server_api=ServerApi('1')
+        server_api=ServerApi('1'),
+        event_listeners=[MongoCommandMetrics()]
     )
     
     # Database
@@ -22,20 +35,25 @@ try:
     users_collection = db.users
     messages_collection = db.messages
     files_collection = db.files
+    conversations_collection = db.conversations
+    sequences_collection = db.sequences
+    migrations_collection = db.migrations
+    file_blobs_collection = db.file_blobs
+    file_refs_collection = db.file_refs
 
     # GridFS buckets
     try:
         # GridFS buckets
         fs = AsyncIOMotorGridFSBucket(db)
-        print("GridFS bucket initialized")
+        logger.debug("GridFS bucket initialized")
     except Exception as e:
-        print(f"GridFS initialization error: {str(e)}")
+        logger.error("GridFS initialization error: %s", e)
         raise e
     message_files = AsyncIOMotorGridFSBucket(db, 'message_files')
-    print("MongoDB connected successfully")
-    print("MongoDB collections initialized")
+    logger.debug("MongoDB connected successfully")
+    logger.debug("MongoDB collections initialized")
 except Exception as e:
-    print(f"MongoDB connection error: {str(e)}")
+    logger.error("MongoDB connection error: %s", e)
     raise e
 
 # Export everything needed
@@ -43,17 +61,97 @@ __all__ = [
     'users_collection',
     'messages_collection',
     'files_collection',
+    'conversations_collection',
+    'sequences_collection',
+    'file_blobs_collection',
+    'file_refs_collection',
     'fs',
     'db',
     'save_file',
     'get_file',
+    'stream_upload',
     'get_messages',
-    'create_message'
+    'get_messages_page',
+    'create_message',
+    'create_messages',
+    'conversation_key',
+    'normalize_timestamp',
+    'ensure_indexes',
+    'backfill_conversation_ids',
+    'backfill_conversations',
+    'normalize_message_timestamps',
+    'update_conversation_summary',
+    'decrement_conversation_unread',
+    'mark_conversation_read',
+    'get_recent_conversations',
+    'encode_conversation_cursor',
+    'assign_delivery_seqs',
+    'get_messages_since'
 ]
 
 # GridFS fonksiyonları
 # Helper functions
 
+def conversation_key(user_a: str, user_b: str) -> str:
+    """İki kullanıcı arasındaki konuşma için sıralı, kanonik anahtar"""
+    first, second = sorted((str(user_a), str(user_b)))
+    return f"{first}_{second}"
+
+async def ensure_indexes():
+    """Sorguların kullandığı indeksleri oluştur (idempotent)"""
+    try:
+        await messages_collection.create_index(
+            # _id sayfalama cursor'ındaki eşitlik durumunu da indeksten çözer
+            [('conversation_id', 1), ('timestamp', 1), ('_id', 1)],
+            name='conversation_timestamp'
+        )
+        # Konuşma listesi (last_timestamp, _id) cursor'ıyla sayfalanır
+        await conversations_collection.create_index(
+            [('participants', 1), ('last_timestamp', -1), ('_id', -1)],
+            name='participants_last_timestamp'
+        )
+        # Delta senkronizasyonu: kullanıcının seq'ine göre alınan/gönderilen mesajlar
+        for role in ('receiver', 'sender'):
+            await messages_collection.create_index(
+                [(f'{role}_id', 1), (f'{role}_seq', 1)],
+                name=f'{role}_seq',
+                partialFilterExpression={f'{role}_seq': {'$exists': True}}
+            )
+        # Kullanıcının dosya listesi (klasöre göre)
+        await file_refs_collection.create_index(
+            [('owner_id', 1), ('bucket', 1), ('folder_id', 1)],
+            name='owner_bucket_folder'
+        )
+        # Kaynak dosyanın türevleri (küçük resim/önizleme)
+        for bucket_name in ('fs', 'message_files'):
+            await db[f'{bucket_name}.files'].create_index(
+                [('metadata.rendition_of', 1), ('metadata.rendition', 1)],
+                name='rendition_of',
+                partialFilterExpression={'metadata.rendition_of': {'$exists': True}}
+            )
+        logger.info("MongoDB indexes ensured")
+    except Exception as e:
+        logger.error("Error creating indexes: %s", e)
+        raise e
+
+async def backfill_conversation_ids():
+    """conversation_id alanı olmayan eski mesajlara alanı ekle"""
+    try:
+        result = await messages_collection.update_many(
+            {'conversation_id': {'$exists': False}},
+            [{'$set': {'conversation_id': {'$cond': [
+                {'$lte': ['$sender_id', '$receiver_id']},
+                {'$concat': ['$sender_id', '_', '$receiver_id']},
+                {'$concat': ['$receiver_id', '_', '$sender_id']}
+            ]}}}]
+        )
+        if result.modified_count:
+            logger.info("Backfilled conversation_id on %s messages", result.modified_count)
+        return result.modified_count
+    except Exception as e:
+        logger.error("Error backfilling conversation ids: %s", e)
+        raise e
+
 async def save_message_file(file_data: bytes, metadata: dict):
     """Mesaj dosyalarını ayrı bir koleksiyonda sakla"""
     try:
@@ -64,7 +162,7 @@ async def save_message_file(file_data: bytes, metadata: dict):
         )
         return str(file_id)
     except Exception as e:
-        print(f"Error saving message file: {str(e)}")
+        logger.error("Error saving message file: %s", e)
         raise e
     
 async def save_file(file_data: bytes, filename: str):
@@ -76,9 +174,50 @@ async def save_file(file_data: bytes, filename: str):
         )
         return str(file_id)
     except Exception as e:
-        print(f"Error saving file: {str(e)}")
+        logger.error("Error saving file: %s", e)
         raise e
 
+async def stream_upload(bucket: AsyncIOMotorGridFSBucket, filename: str, source,
+                        metadata: dict, encryptor=None) -> dict:
+    """
+    source'u (read(size) coroutine'i olan UploadFile vb.) parça parça
+    GridFS'e yaz. Boyut ve SHA-256 düz içerik üzerinden yazarken hesaplanır
+    ve metadata'ya size/sha256 olarak eklenir. encryptor verilirse
+    (update/finalize) parçalar yazılmadan önce şifrelenir. Bellekte aynı
+    anda sadece bir parça tutulur; hata olursa yazılan chunk'lar silinir.
+    """
+    # id önceden üretilir; GridIn'in iç alanlarına bakmak gerekmez
+    file_id = ObjectId()
+    grid_in = bucket.open_upload_stream_with_id(
+        file_id,
+        filename,
+        chunk_size_bytes=settings.GRIDFS_CHUNK_SIZE,
+        metadata=metadata
+    )
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = await source.read(settings.UPLOAD_READ_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            digest.update(chunk)
+            if encryptor is not None:
+                chunk = encryptor.update(chunk)
+            if chunk:
+                await grid_in.write(chunk)
+        if encryptor is not None:
+            await grid_in.write(encryptor.finalize())
+
+        metadata = {**metadata, "size": size, "sha256": digest.hexdigest()}
+        await grid_in.set("metadata", metadata)
+        await grid_in.close()
+    except BaseException:
+        await grid_in.abort()
+        raise
+    return {"id": str(file_id), "size": size, "sha256": metadata["sha256"], "metadata": metadata}
+
 async def get_file(file_id: str):
     """GridFS'den dosyayı getir."""
     try:
@@ -86,7 +225,7 @@ async def get_file(file_id: str):
         contents = await grid_out.read()
         return contents
     except Exception as e:
-        print(f"Error retrieving file: {str(e)}")
+        logger.error("Error retrieving file: %s", e)
         return None
 
 # ObjectId -> string dönüşümü için yardımcı fonksiyon
@@ -97,66 +236,595 @@ def serialize_id(item):
         del item['_id']
     return item
 
+def format_message_timestamp(msg: dict) -> dict:
+    """Mesajın timestamp alanını API formatına getir"""
+    if 'timestamp' in msg:
+        if isinstance(msg['timestamp'], datetime):
+            msg['timestamp'] = msg['timestamp'].strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        elif not isinstance(msg['timestamp'], str):
+            msg['timestamp'] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    else:
+        msg['timestamp'] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    return msg
+
 async def get_messages(sender_id: str, receiver_id: str):
     try:
-        print(f"\nFetching messages between {sender_id} and {receiver_id}")
+        logger.debug("Fetching messages between %s and %s", sender_id, receiver_id)
         
-        cursor = messages_collection.find({
-            '$or': [
-                {'sender_id': sender_id, 'receiver_id': receiver_id},
-                {'sender_id': receiver_id, 'receiver_id': sender_id}
-            ]
-        }).sort('timestamp', 1)
+        cursor = messages_collection.find(
+            _conversation_filter(sender_id, receiver_id)
+        ).sort('timestamp', 1)
 
         messages = []
         async for msg in cursor:
             msg['id'] = str(msg.pop('_id'))
-            
-            # Timestamp formatını düzelt
-            if 'timestamp' in msg:
-                if isinstance(msg['timestamp'], datetime):
-                    msg['timestamp'] = msg['timestamp'].strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-                elif not isinstance(msg['timestamp'], str):
-                    msg['timestamp'] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-            else:
-                msg['timestamp'] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-                
-            messages.append(msg)
-
-        print(f"Found {len(messages)} messages")
+            messages.append(format_message_timestamp(msg))
+
+        logger.debug("Found %s messages", len(messages))
         return messages
 
     except Exception as e:
-        print(f"Error in get_messages: {str(e)}")
+        logger.error("Error in get_messages: %s", e)
         raise e
 
-async def create_message(message_data: dict):
-    """Yeni mesaj oluştur"""
+# Sayfalama (cursor) yardımcıları
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(msg: dict) -> str:
+    """Mesajın (timestamp, _id) konumunu opak bir cursor'a çevir"""
+    timestamp = msg['timestamp']
+    payload = {'i': str(msg['_id'])}
+    if isinstance(timestamp, datetime):
+        payload['t'] = timestamp.isoformat()
+        payload['d'] = 1
+    else:
+        payload['t'] = timestamp
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('utf-8').rstrip('=')
+
+def decode_cursor(cursor: str):
+    """Opak cursor'ı (timestamp, ObjectId) ikilisine çevir, geçersizse ValueError"""
     try:
-        print(f"\nCreating message: {message_data}")
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('utf-8')))
+        timestamp = payload['t']
+        if payload.get('d'):
+            timestamp = datetime.fromisoformat(timestamp)
+        if not ObjectId.is_valid(payload['i']):
+            raise ValueError("invalid id")
+        return timestamp, ObjectId(payload['i'])
+    except Exception:
+        raise ValueError("Geçersiz cursor")
 
-        # Eğer timestamp yoksa ekle
-        if "timestamp" not in message_data:
-            message_data["timestamp"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-        elif isinstance(message_data["timestamp"], datetime):
-            message_data["timestamp"] = message_data["timestamp"].strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+# Mesajların timestamp alanı UTC, bu biçimde string olarak saklanır; string
+# karşılaştırmanın zaman sırasına uyması için sorgu değerleri de bu biçime çevrilir
+MESSAGE_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
-        result = await messages_collection.insert_one(message_data)
-        message_data['id'] = str(result.inserted_id)
-        
-        if '_id' in message_data:
-            del message_data['_id']
-            
-        print(f"Message created with ID: {message_data['id']}")
-        return message_data
+def normalize_timestamp(value) -> str:
+    """
+    ISO timestamp'i (string ya da datetime) saklanan UTC biçimine çevir.
+    Saat dilimi olmayan değerler UTC kabul edilir; geçersizse ValueError.
+    """
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.strftime(MESSAGE_TIMESTAMP_FORMAT)
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError("Geçersiz timestamp")
+
+def _conversation_filter(user_a: str, user_b: str) -> dict:
+    return {'conversation_id': conversation_key(user_a, user_b)}
+
+def _older_than(timestamp, message_id: ObjectId) -> dict:
+    return {'$or': [
+        {'timestamp': {'$lt': timestamp}},
+        {'timestamp': timestamp, '_id': {'$lt': message_id}}
+    ]}
+
+def _newer_than(timestamp, message_id: ObjectId) -> dict:
+    return {'$or': [
+        {'timestamp': {'$gt': timestamp}},
+        {'timestamp': timestamp, '_id': {'$gt': message_id}}
+    ]}
+
+async def _fetch_slice(query: dict, direction: int, limit: int):
+    """(timestamp, _id) sırasında limit+1 kayıt çek, fazlası varsa bildir"""
+    cursor = messages_collection.find(query).sort(
+        [('timestamp', direction), ('_id', direction)]
+    ).limit(limit + 1)
+    docs = await cursor.to_list(length=limit + 1)
+    has_more = len(docs) > limit
+    return docs[:limit], has_more
+
+async def get_messages_page(
+    sender_id: str,
+    receiver_id: str,
+    before: str = None,
+    after: str = None,
+    around: str = None,
+    limit: int = DEFAULT_PAGE_SIZE
+):
+    """
+    Konuşma geçmişinin tek bir sayfasını getir (eskiden yeniye sıralı).
+    before/after opak cursor, around ise ISO timestamp alır; hiçbiri yoksa
+    en yeni sayfa döner.
+    Returns: (messages, next_cursor, prev_cursor) - next_cursor daha eski
+    mesajlar için `before`, prev_cursor daha yeni mesajlar için `after` ile
+    kullanılır.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    base_query = _conversation_filter(sender_id, receiver_id)
+
+    has_older = has_newer = False
+    if before:
+        timestamp, message_id = decode_cursor(before)
+        docs, has_older = await _fetch_slice(
+            {'$and': [base_query, _older_than(timestamp, message_id)]}, -1, limit
+        )
+        docs.reverse()
+        has_newer = True
+    elif after:
+        timestamp, message_id = decode_cursor(after)
+        docs, has_newer = await _fetch_slice(
+            {'$and': [base_query, _newer_than(timestamp, message_id)]}, 1, limit
+        )
+        has_older = True
+    elif around:
+        around = normalize_timestamp(around)
+        # older_limit 0 olsa da tek kayıt çekilip daha eski mesaj olup olmadığına bakılır
+        older_limit = limit // 2
+        older, has_older = await _fetch_slice(
+            {'$and': [base_query, {'timestamp': {'$lt': around}}]}, -1, older_limit
+        )
+        older.reverse()
+        newer, has_newer = await _fetch_slice(
+            {'$and': [base_query, {'timestamp': {'$gte': around}}]}, 1, limit - older_limit
+        )
+        docs = older + newer
+    else:
+        docs, has_older = await _fetch_slice(base_query, -1, limit)
+        docs.reverse()
+
+    next_cursor = encode_cursor(docs[0]) if docs and has_older else None
+    prev_cursor = encode_cursor(docs[-1]) if docs and has_newer else None
+
+    messages = []
+    for msg in docs:
+        msg['id'] = str(msg.pop('_id'))
+        messages.append(format_message_timestamp(msg))
+
+    return messages, next_cursor, prev_cursor
+
+# Konuşma özetleri (conversations koleksiyonu)
+def _last_message_summary(message: dict) -> dict:
+    """Konuşmanın son mesajı için saklanan alanlar (içerik şifreli kalır)"""
+    fields = (
+        'content', 'encrypted_content', 'encryption_data', 'encryption_type',
+        'sender_id', 'receiver_id', 'timestamp', 'is_file'
+    )
+    summary = {field: message[field] for field in fields if field in message}
+    summary['id'] = str(message.get('id') or message.get('_id'))
+    return summary
+
+def _summary_update(entry: dict) -> dict:
+    """
+    Konuşma özeti için pipeline güncellemesi. Partiler sırasız yazılabildiği
+    için last_message sadece bu mesaj saklanandan daha yeni (ya da aynı
+    anda) ise değişir; last_timestamp ile her zaman aynı mesajı gösterir.
+    """
+    timestamp = {'$literal': entry['last']['timestamp']}
+    update = {
+        'participants': {'$ifNull': ['$participants', {'$literal': entry['participants']}]},
+        'last_message': {'$cond': [
+            {'$gte': [timestamp, {'$ifNull': ['$last_timestamp', '']}]},
+            {'$literal': _last_message_summary(entry['last'])},
+            '$last_message'
+        ]},
+        'last_timestamp': {'$max': ['$last_timestamp', timestamp]}
+    }
+    for field, count in entry['unread_inc'].items():
+        update[field] = {'$add': [{'$ifNull': [f'${field}', 0]}, count]}
+    return update
+
+async def update_conversation_summary(message: dict):
+    """Yeni mesajla konuşmanın son mesajını ve okunmamış sayısını güncelle"""
+    await update_conversation_summaries([message])
+
+async def update_conversation_summaries(messages: list):
+    """
+    Yeni mesajlarla konuşma özetlerini güncelle. Aynı konuşmadaki mesajlar
+    tek bir güncellemede birleştirilir (son mesaj + toplam okunmamış).
+    """
+    updates = {}
+    for message in messages:
+        sender_id = message['sender_id']
+        receiver_id = message['receiver_id']
+        conversation_id = message.get('conversation_id') or conversation_key(sender_id, receiver_id)
+
+        entry = updates.get(conversation_id)
+        if entry is None:
+            # Gönderen kendine yazıyorsa aynı alan tek bir $inc ile artırılır
+            entry = updates[conversation_id] = {
+                'participants': sorted({sender_id, receiver_id}),
+                'last': message,
+                'unread_inc': {f'unread.{sender_id}': 0, f'unread.{receiver_id}': 0}
+            }
+        elif message['timestamp'] >= entry['last']['timestamp']:
+            entry['last'] = message
+        if not message.get('is_read'):
+            entry['unread_inc'][f'unread.{receiver_id}'] += 1
+
+    if not updates:
+        return
+    try:
+        await conversations_collection.bulk_write([
+            UpdateOne({'_id': conversation_id}, [{'$set': _summary_update(entry)}], upsert=True)
+            for conversation_id, entry in updates.items()
+        ], ordered=False)
     except Exception as e:
-        print(f"Error creating message: {str(e)}")
+        # Özet tablosu mesajın kendisini bozmasın
+        logger.error("Error updating conversation summary: %s", e)
+
+async def decrement_conversation_unread(conversation_id: str, user_id: str, count: int = 1):
+    """Kullanıcının konuşmadaki okunmamış sayısını sıfırın altına düşürmeden azalt"""
+    await conversations_collection.update_one(
+        {'_id': conversation_id, f'unread.{user_id}': {'$gte': count}},
+        {'$inc': {f'unread.{user_id}': -count}}
+    )
+
+async def mark_conversation_read(
+    reader_id: str,
+    peer_id: str,
+    up_to_timestamp: str = None,
+    up_to_message_id: str = None
+):
+    """
+    Okuyucuya gelen mesajları verilen mesaja/zamana kadar (dahil) tek bir
+    update_many ile okundu işaretle. Sınır verilmezse tümü işaretlenir;
+    iki sınır birlikte verilirse ValueError.
+    Returns: (güncellenen mesaj sayısı, kullanılan timestamp sınırı)
+    """
+    if up_to_message_id and up_to_timestamp:
+        raise ValueError("up_to_message_id ve up_to_timestamp birlikte kullanılamaz")
+    conversation_id = conversation_key(reader_id, peer_id)
+    query = {
+        'conversation_id': conversation_id,
+        'receiver_id': reader_id,
+        'is_read': False
+    }
+
+    if up_to_message_id:
+        if not ObjectId.is_valid(up_to_message_id):
+            raise ValueError("Geçersiz mesaj ID'si")
+        message_id = ObjectId(up_to_message_id)
+        watermark = await messages_collection.find_one(
+            {'_id': message_id, 'conversation_id': conversation_id},
+            {'timestamp': 1}
+        )
+        if not watermark:
+            raise LookupError("Mesaj bulunamadı")
+        up_to_timestamp = watermark['timestamp']
+        query['$or'] = [
+            {'timestamp': {'$lt': up_to_timestamp}},
+            {'timestamp': up_to_timestamp, '_id': {'$lte': message_id}}
+        ]
+    elif up_to_timestamp:
+        up_to_timestamp = normalize_timestamp(up_to_timestamp)
+        query['timestamp'] = {'$lte': up_to_timestamp}
+
+    result = await messages_collection.update_many(query, {'$set': {'is_read': True}})
+
+    # Sayaç, kısmi işaretlemede de doğru kalsın diye yeniden hesaplanır
+    remaining = await messages_collection.count_documents({
+        'conversation_id': conversation_id,
+        'receiver_id': reader_id,
+        'is_read': False
+    })
+    await conversations_collection.update_one(
+        {'_id': conversation_id},
+        {'$set': {f'unread.{reader_id}': remaining}}
+    )
+    return result.modified_count, up_to_timestamp
+
+def encode_conversation_cursor(conversation: dict) -> str:
+    """Konuşmanın (last_timestamp, _id) konumunu opak bir cursor'a çevir"""
+    payload = {'t': conversation['last_timestamp'], 'i': conversation['_id']}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('utf-8').rstrip('=')
+
+def decode_conversation_cursor(cursor: str):
+    """Opak konuşma cursor'ını (last_timestamp, _id) ikilisine çevir, geçersizse ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('utf-8')))
+        if not isinstance(payload['t'], str) or not isinstance(payload['i'], str):
+            raise ValueError("invalid cursor")
+        return payload['t'], payload['i']
+    except Exception:
+        raise ValueError("Geçersiz cursor")
+
+async def get_recent_conversations(user_id: str, limit: int = DEFAULT_PAGE_SIZE, before: str = None):
+    """
+    Kullanıcının konuşmalarını son mesaj zamanına göre (yeniden eskiye)
+    getir. before, encode_conversation_cursor ile üretilen cursor'dır; aynı
+    zamanlı konuşmalar _id ile ayrıldığı için sayfa sınırında atlanmaz.
+    """
+    query = {'participants': user_id}
+    if before:
+        timestamp, conversation_id = decode_conversation_cursor(before)
+        query['$or'] = [
+            {'last_timestamp': {'$lt': timestamp}},
+            {'last_timestamp': timestamp, '_id': {'$lt': conversation_id}}
+        ]
+    cursor = conversations_collection.find(query).sort(
+        [('last_timestamp', -1), ('_id', -1)]
+    ).limit(limit)
+    return await cursor.to_list(length=limit)
+
+# Tamamlanan backfill'in işareti (migrations koleksiyonu)
+CONVERSATIONS_BACKFILL_MARKER = 'conversations_backfill'
+
+async def backfill_conversations():
+    """
+    conversations koleksiyonunu mevcut mesajlardan bir kez oluştur. Bitince
+    migrations koleksiyonuna işaret yazılır; yarıda kalan backfill sonraki
+    açılışta tekrar çalışır ($setOnInsert mevcut özetlere dokunmaz).
+    """
+    try:
+        if await migrations_collection.find_one({'_id': CONVERSATIONS_BACKFILL_MARKER}):
+            return 0
+
+        unread = {}
+        async for row in messages_collection.aggregate([
+            {'$match': {'is_read': False}},
+            {'$group': {
+                '_id': {'c': '$conversation_id', 'r': '$receiver_id'},
+                'count': {'$sum': 1}
+            }}
+        ]):
+            unread.setdefault(row['_id']['c'], {})[row['_id']['r']] = row['count']
+
+        operations = []
+        async for row in messages_collection.aggregate([
+            {'$sort': {'conversation_id': 1, 'timestamp': 1, '_id': 1}},
+            {'$group': {
+                '_id': '$conversation_id',
+                'last': {'$last': '$$ROOT'},
+                'senders': {'$addToSet': '$sender_id'},
+                'receivers': {'$addToSet': '$receiver_id'}
+            }}
+        ], allowDiskUse=True):
+            last = row['last']
+            participants = sorted(set(row['senders']) | set(row['receivers']))
+            counts = unread.get(row['_id'], {})
+            operations.append(UpdateOne(
+                {'_id': row['_id']},
+                {'$setOnInsert': {
+                    'participants': participants,
+                    'last_message': _last_message_summary(last),
+                    'last_timestamp': last['timestamp'],
+                    'unread': {user: counts.get(user, 0) for user in participants}
+                }},
+                upsert=True
+            ))
+
+        if operations:
+            await conversations_collection.bulk_write(operations, ordered=False)
+            logger.info("Backfilled %s conversations", len(operations))
+        await migrations_collection.update_one(
+            {'_id': CONVERSATIONS_BACKFILL_MARKER},
+            {'$set': {'completed_at': datetime.now(timezone.utc), 'conversations': len(operations)}},
+            upsert=True
+        )
+        return len(operations)
+    except Exception as e:
+        logger.error("Error backfilling conversations: %s", e)
         raise e
 
-async def get_user(user_id: str):
+# Eski kayıtlardaki timestamp'lerin MESSAGE_TIMESTAMP_FORMAT'a çevrildiğinin işareti
+MESSAGE_TIMESTAMPS_MARKER = 'message_timestamps'
+NORMALIZED_TIMESTAMP = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{6}Z$')
+MIGRATION_BATCH_SIZE = 1000
+
+async def _normalize_timestamp_field(collection, field: str) -> int:
+    """Koleksiyonda `field` alanı saklanan biçimde olmayan kayıtları düzelt"""
+    operations = []
+    updated = 0
+    async for doc in collection.find(
+        {field: {'$exists': True, '$not': NORMALIZED_TIMESTAMP}}, {field: 1}
+    ):
+        value = doc
+        for part in field.split('.'):
+            value = value.get(part) if isinstance(value, dict) else None
+        try:
+            normalized = normalize_timestamp(value)
+        except ValueError:
+            logger.warning("Skipping %s %s: unparseable %s", collection.name, doc['_id'], field)
+            continue
+        operations.append(UpdateOne({'_id': doc['_id']}, {'$set': {field: normalized}}))
+        if len(operations) >= MIGRATION_BATCH_SIZE:
+            await collection.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+        updated += len(operations)
+    return updated
+
+async def normalize_message_timestamps():
+    """
+    Eski mesajların (ve konuşma özetlerinin) timestamp'lerini bir kez
+    MESSAGE_TIMESTAMP_FORMAT'a çevir; yoksa string karşılaştırmalı
+    sayfalama ve `around` sorguları bu kayıtları yanlış sıralar. Saat dilimi
+    olmayan eski değerler normalize_timestamp gibi UTC kabul edilir.
+    Yarıda kalırsa sonraki açılışta kalan kayıtlardan devam eder.
+    """
+    try:
+        if await migrations_collection.find_one({'_id': MESSAGE_TIMESTAMPS_MARKER}):
+            return 0
+
+        updated = await _normalize_timestamp_field(messages_collection, 'timestamp')
+        for field in ('last_timestamp', 'last_message.timestamp'):
+            await _normalize_timestamp_field(conversations_collection, field)
+        if updated:
+            logger.info("Normalized timestamps on %s messages", updated)
+        await migrations_collection.update_one(
+            {'_id': MESSAGE_TIMESTAMPS_MARKER},
+            {'$set': {'completed_at': datetime.now(timezone.utc), 'messages': updated}},
+            upsert=True
+        )
+        return updated
+    except Exception as e:
+        logger.error("Error normalizing message timestamps: %s", e)
+        raise e
+
+# Teslim sıra numaraları (delta senkronizasyonu)
+# Daha düşük seq'li bir mesaj hâlâ yazılıyor olabileceğinden, sync sırasında
+# bu süreden yeni bir boşluk görülürse boşluktan sonrası bir sonraki isteğe kalır
+SYNC_SETTLE_SECONDS = 2
+
+async def allocate_sequences(counts: dict) -> dict:
+    """Her kullanıcı için counts[user_id] kadar ardışık seq ayır; ilk değerleri döndür"""
+    user_ids = list(counts)
+    counters = await asyncio.gather(*(
+        sequences_collection.find_one_and_update(
+            {'_id': user_id},
+            {'$inc': {'seq': counts[user_id]}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        for user_id in user_ids
+    ))
+    return {
+        user_id: counter['seq'] - counts[user_id] + 1
+        for user_id, counter in zip(user_ids, counters)
+    }
+
+async def assign_delivery_seqs(messages: list):
+    """
+    Mesajlara gönderen ve alıcının kullanıcı bazlı, artan teslim sıra
+    numaralarını (sender_seq / receiver_seq) ekle. Her kullanıcı için
+    tek bir sayaç güncellemesi yapılır; seq'ler liste sırasıyla verilir.
+    """
+    counts = {}
+    for message in messages:
+        for user_id in {message['sender_id'], message['receiver_id']}:
+            counts[user_id] = counts.get(user_id, 0) + 1
+
+    next_seq = await allocate_sequences(counts)
+    for message in messages:
+        seqs = {}
+        for user_id in dict.fromkeys((message['sender_id'], message['receiver_id'])):
+            seqs[user_id] = next_seq[user_id]
+            next_seq[user_id] += 1
+        message['sender_seq'] = seqs[message['sender_id']]
+        message['receiver_seq'] = seqs[message['receiver_id']]
+    return messages
+
+async def get_messages_since(user_id: str, since: int = 0, limit: int = DEFAULT_PAGE_SIZE):
+    """
+    Kullanıcının seq'i `since`ten büyük mesajlarını (alınan ve gönderilen)
+    seq sırasıyla getir. Her mesaja kullanıcının seq'i 'seq' olarak eklenir.
+    Returns: (messages, last_seq, has_more) - last_seq bir sonraki `since`
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    branches = await asyncio.gather(*(
+        messages_collection.find({f'{role}_id': user_id, f'{role}_seq': {'$gt': since}})
+            .sort(f'{role}_seq', 1)
+            .limit(limit + 1)
+            .to_list(length=limit + 1)
+        for role in ('receiver', 'sender')
+    ))
+
+    merged = {}
+    for role, docs in zip(('receiver', 'sender'), branches):
+        for msg in docs:
+            msg['seq'] = msg[f'{role}_seq']
+            merged[msg['_id']] = msg
+    candidates = sorted(merged.values(), key=lambda msg: msg['seq'])
+
+    settle_cutoff = datetime.now(timezone.utc) - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    messages = []
+    last_seq = since
+    for msg in candidates[:limit]:
+        if msg['seq'] != last_seq + 1 and msg['_id'].generation_time > settle_cutoff:
+            # Aradaki seq henüz yazılmamış olabilir
+            break
+        last_seq = msg['seq']
+        msg['id'] = str(msg.pop('_id'))
+        messages.append(format_message_timestamp(msg))
+
+    # Boşlukta durulduysa has_more False: kalan kısım bir sonraki senkronizasyona kalır
+    has_more = len(messages) == limit and len(candidates) > limit
+    return messages, last_seq, has_more
+
+def _prepare_message(message_data: dict) -> dict:
+    # Eğer timestamp yoksa ekle; varsa sıralanabilir UTC biçimine çevir
+    message_data["timestamp"] = normalize_timestamp(
+        message_data.get("timestamp") or datetime.now(timezone.utc)
+    )
+
+    message_data["conversation_id"] = conversation_key(
+        message_data["sender_id"], message_data["receiver_id"]
+    )
+    return message_data
+
+async def create_messages(messages: list) -> list:
+    """
+    Mesajları tek bir sırasız insert_many ile kaydet. Sonuçlar girişle aynı
+    sırada döner: kaydedilen mesaj (id alanıyla) ya da o mesajın hatası.
+    Sıralama (timestamp, _id) ve seq ile belirlendiğinden, sırasız yazım
+    konuşma içi sırayı bozmaz: _id'ler ve seq'ler liste sırasıyla verilir.
+    """
+    for message_data in messages:
+        _prepare_message(message_data)
+        logger.debug("Creating message: %s", message_data)
+    await assign_delivery_seqs(messages)
+
+    failed = {}
+    try:
+        await messages_collection.insert_many(messages, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get('writeErrors', []):
+            failed[error['index']] = Exception(error.get('errmsg', 'Message insert failed'))
+        logger.error("Error creating %s of %s messages", len(failed), len(messages))
+
+    results = []
+    saved = []
+    for index, message_data in enumerate(messages):
+        message_id = message_data.pop('_id', None)
+        if index in failed:
+            results.append(failed[index])
+            continue
+        message_data['id'] = str(message_id)
+        saved.append(message_data)
+        results.append(message_data)
+
+    await update_conversation_summaries(saved)
+    return results
+
+async def create_message(message_data: dict):
+    """Yeni mesaj oluştur"""
+    try:
+        (result,) = await create_messages([message_data])
+        if isinstance(result, Exception):
+            raise result
+        logger.debug("Message created with ID: %s", result['id'])
+        return result
+    except Exception as e:
+        logger.error("Error creating message: %s", e)
+        raise e
+
+# Kimlik doğrulamada kullanıcıyla birlikte taşınmaması gereken alanlar
+AUTH_USER_PROJECTION = {'hashed_password': 0, 'verification_code': 0}
+
+async def get_user(user_id: str, projection: dict = None):
     if not ObjectId.is_valid(user_id):
         return None
-    user = await users_collection.find_one({'_id': ObjectId(user_id)})
+    user = await users_collection.find_one({'_id': ObjectId(user_id)}, projection)
     return serialize_id(user) if user else None
 
 async def get_user_by_email(email: str):
@@ -174,10 +842,17 @@ async def verify_user(verification_code: str):
         {'$set': {'is_verified': True, 'verification_code': None}},
         return_document=True
     )
+    if result:
+        auth_cache.invalidate(str(result['_id']))
     return serialize_id(result) if result else None
 
 async def delete_unverified_user(email: str):
-    await users_collection.delete_one({"email": email, "is_verified": False})
+    user = await users_collection.find_one_and_delete(
+        {"email": email, "is_verified": False},
+        projection={'_id': 1}
+    )
+    if user:
+        auth_cache.invalidate(str(user['_id']))
 
 async def get_user_by_verification_code(code: str):
     user = await users_collection.find_one({"verification_code": code})
@@ -185,12 +860,12 @@ async def get_user_by_verification_code(code: str):
 
 async def find_user(email: str):
     try:
-        print(f"\nDatabase find_user called with email: {email}")
+        logger.debug("Database find_user called with email: %s", email)
         
         # MongoDB sorgusu
         user = await users_collection.find_one({"email": email})
         
-        print(f"Database find_user result: {user}")
+        logger.debug("Database find_user result: %s", user)
         
         if user:
             # ObjectId'yi string'e çevir
@@ -200,15 +875,15 @@ async def find_user(email: str):
             
         return user
     except Exception as e:
-        print(f"Database error in find_user: {str(e)}")
+        logger.error("Database error in find_user: %s", e)
         return None
 
 async def delete_rsa_messages():
     """RSA şifreli tüm mesajları sil"""
     try:
         result = await messages_collection.delete_many({"encryption_type": "RSA"})
-        print(f"Deleted {result.deleted_count} RSA messages")
+        logger.info("Deleted %s RSA messages", result.deleted_count)
         return result.deleted_count
     except Exception as e:
-        print(f"Error deleting RSA messages: {str(e)}")
+        logger.error("Error deleting RSA messages: %s", e)
         return 0
\ No newline at end of file
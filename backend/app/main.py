@@ -1,7 +1,29 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from .routers import auth, messages, files 
+from fastapi.responses import JSONResponse, PlainTextResponse
+import time
+import logging
+from .utils.logger import setup_logging, shutdown_logging
+
+# Router ve veritabanı modülleri import edilirken log yazabildiği için önce
+setup_logging()
+
+from .routers import auth, messages, files
+from .database import (
+    ensure_indexes, backfill_conversation_ids, backfill_conversations, normalize_message_timestamps
+)
+from .services.encryption import encryption_service
+from .services.rsa_key_pool import rsa_key_pool
+from .services.user_cache import auth_cache
+from .services.key_cache import key_cache
+from .services.websocket_manager import ws_manager
+from .services.message_writer import message_writer
+from .services.ingest import ingest_pipeline
+from .services.renditions import rendition_service
+from .services.file_storage import recover_file_refs
+from .services.metrics import registry, http_request_duration, stats_gauge
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
@@ -13,11 +35,78 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"]
 )
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Etiket olarak ham path yerine route şablonu kullanılır
+        route = request.scope.get("route")
+        http_request_duration.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status_code
+        )
+
+# Servis önbellek/havuz istatistikleri
+stats_gauge("auth_cache_users", "Authenticated-user cache statistics",
+            lambda: auth_cache.stats()["users"], ("size", "hits", "misses"))
+stats_gauge("auth_cache_claims", "Decoded token cache statistics",
+            lambda: auth_cache.stats()["claims"], ("size", "hits", "misses"))
+stats_gauge("key_cache", "Parsed key cache statistics",
+            key_cache.stats, ("size", "hits", "misses"))
+stats_gauge("rsa_key_pool", "Pre-generated RSA key pool statistics",
+            rsa_key_pool.stats, ("depth", "target", "hits", "misses", "generated"))
+stats_gauge("websocket_users", "Connected users and per-user WebSocket connection counts",
+            ws_manager.stats, ("users", "connections", "max_per_user", "peers", "remote_users"))
+stats_gauge("websocket_send_queue", "Outbound WebSocket send queue depth",
+            ws_manager.stats, ("queued", "max_queue_depth", "reaped"))
+
+stats_gauge("message_writer", "Coalesced WebSocket message writes",
+            message_writer.stats, ("pending", "batches", "messages"))
+stats_gauge("ingest_pipeline", "WebSocket ingest pipeline messages waiting/active per stage",
+            ingest_pipeline.stats, tuple(
+                f"{stage}_{state}"
+                for stage in ("encrypt", "persist", "deliver")
+                for state in ("waiting", "active", "processed")
+            ))
+stats_gauge("renditions", "Thumbnail/preview renditions being rendered and rendered so far",
+            rendition_service.stats, ("inflight", "background", "generated", "failed"))
+
 # Router'ları ekle
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(messages.router, prefix="/api/messages", tags=["Messages"])
 app.include_router(files.router, prefix="/api/files", tags=["files"])
 
+@app.on_event("startup")
+async def startup():
+    # Eski mesajlar indeksli sorgulara dahil olsun diye önce backfill
+    await backfill_conversation_ids()
+    await normalize_message_timestamps()
+    await ensure_indexes()
+    await backfill_conversations()
+    await recover_file_refs()
+    await rsa_key_pool.start()
+    await ws_manager.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await ws_manager.stop()
+    await message_writer.flush()
+    await rendition_service.stop()
+    await rsa_key_pool.stop()
+    encryption_service.shutdown()
+    shutdown_logging()
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/ping")
 def ping():
     return {"message": "pong"}
@@ -32,7 +121,7 @@ async def http_exception_handler(request, exc):
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
-    print(f"Global error: {str(exc)}")
+    logger.error("Global error: %s", exc, exc_info=exc)
     return JSONResponse(
         status_code=500,
         content={"detail": str(exc)}
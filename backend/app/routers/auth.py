@@ -6,11 +6,15 @@ import random
 import string
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from ..database import get_user, get_user_by_email, create_user, users_collection
+from ..database import get_user, get_user_by_email, create_user, users_collection, AUTH_USER_PROJECTION
+from ..services.user_cache import auth_cache
 from ..utils.email import send_verification_email
 from ..config import settings
 from ..schemas.user import UserCreate, UserResponse  # UserResponse'u ekledik
 import uuid
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -27,8 +31,12 @@ def create_access_token(data: dict):
 # Kullanıcı doğrulama
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
-        print("Decoding token...")  # Debug log
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        # Çözülmüş token ve kullanıcı kaydı önbellekteyse veritabanına gidilmez
+        payload = auth_cache.get_claims(token)
+        if payload is None:
+            logger.debug("Decoding token...")
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            auth_cache.set_claims(token, payload)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(
@@ -36,12 +44,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
                 detail="Could not validate credentials"
             )
             
-        user = await get_user(user_id)
+        user = auth_cache.get_user(user_id)
         if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found"
-            )
+            user = await get_user(user_id, AUTH_USER_PROJECTION)
+            if user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="User not found"
+                )
+            auth_cache.set_user(user_id, user)
             
         return user
     except JWTError:
@@ -53,32 +64,33 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 
 @router.post("/register")
 async def register(user: UserCreate):
-    print("Register isteği alındı:", user.dict())  # Debug log
+    logger.debug("Register isteği alındı: %s", user.email)
     try:
         # Email kontrolü
         existing_user = await get_user_by_email(user.email)
         if existing_user:
-            print(f"Email zaten kayıtlı: {user.email}")  # Debug log
+            logger.debug("Email zaten kayıtlı: %s", user.email)
             if not existing_user.get('is_verified'):
                 await users_collection.delete_one({"email": user.email})
-                print(f"Doğrulanmamış kullanıcı silindi: {user.email}")  # Debug log
+                auth_cache.invalidate(existing_user['id'])
+                logger.debug("Doğrulanmamış kullanıcı silindi: %s", user.email)
             else:
                 raise HTTPException(status_code=400, detail="Bu email zaten kayıtlı")
         
         # Log other steps
-        print("Doğrulama kodu oluşturuluyor...")  # Debug log
+        logger.debug("Doğrulama kodu oluşturuluyor...")
         verification_code = ''.join(random.choices(string.digits, k=6))
         
-        print("Şifre hashleniyor...")  # Debug log
+        logger.debug("Şifre hashleniyor...")
         hashed_password = pwd_context.hash(user.password)
         
-        print("Email gönderiliyor...")  # Debug log
+        logger.debug("Email gönderiliyor...")
         email_sent = await send_verification_email(user.email, verification_code)
         if not email_sent:
-            print("Email gönderilemedi!")  # Debug log
+            logger.warning("Email gönderilemedi: %s", user.email)
             raise HTTPException(status_code=500, detail="Doğrulama emaili gönderilemedi")
 
-        print("Kullanıcı veritabanına kaydediliyor...")  # Debug log
+        logger.debug("Kullanıcı veritabanına kaydediliyor...")
         # Kullanıcı verisi
         user_data = {
             "email": user.email,
@@ -91,12 +103,12 @@ async def register(user: UserCreate):
         }
         
         await users_collection.insert_one(user_data)
-        print("Kullanıcı başarıyla kaydedildi!")  # Debug log
+        logger.debug("Kullanıcı başarıyla kaydedildi!")
         
         return {"status": "success", "message": "Doğrulama kodu email adresinize gönderildi"}
 
     except Exception as e:
-        print(f"Hata oluştu: {str(e)}")  # Debug log
+        logger.error("Hata oluştu: %s", e)
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(
@@ -140,18 +152,18 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         }
 
     except Exception as e:
-        print(f"Login error: {str(e)}")
+        logger.error("Login error: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     
 
 # backend/app/routers/auth.py - verify_email fonksiyonunu güncelleyelim
 @router.post("/verify/{code}")
 async def verify_email(code: str):
-    print(f"Gelen doğrulama kodu: {code}")  # Debug log
+    logger.debug("Doğrulama isteği alındı (%s karakter kod)", len(code))
     
     # Kullanıcıyı bul
     user = await users_collection.find_one({"verification_code": code})
-    print(f"Bulunan kullanıcı: {user}")  # Debug log
+    logger.debug("Bulunan kullanıcı: %s", user["_id"] if user else None)
     
     if not user:
         raise HTTPException(status_code=400, detail="Geçersiz doğrulama kodu")
@@ -173,12 +185,13 @@ async def verify_email(code: str):
         
         if result.modified_count == 0:
             raise HTTPException(status_code=500, detail="Doğrulama işlemi başarısız oldu")
+        auth_cache.invalidate(str(user["_id"]))
         
-        print("Kullanıcı başarıyla doğrulandı")  # Debug log
+        logger.debug("Kullanıcı başarıyla doğrulandı")
         return {"message": "Email başarıyla doğrulandı"}
         
     except Exception as e:
-        print(f"Doğrulama hatası: {str(e)}")  # Debug log
+        logger.error("Doğrulama hatası: %s", e)
         raise HTTPException(
             status_code=500, 
             detail=f"Doğrulama sırasında bir hata oluştu: {str(e)}"
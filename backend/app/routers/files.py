@@ -1,15 +1,31 @@
 # backend/app/routers/files.py
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body
-from fastapi.responses import StreamingResponse
-from typing import List, Optional
-from ..database import fs
-from ..services.encryption import encryption_service
-from ..services.file_encryption import file_encryption_service
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body, Request, Query
+from fastapi.responses import Response, StreamingResponse
+from typing import Optional
+from ..database import fs, file_refs_collection
+from ..services.file_storage import (
+    open_plaintext_stream,
+    plaintext_length,
+    RangeReader,
+    store_blob,
+    create_file_ref,
+    delete_file_ref,
+    resolve_file,
+    delete_renditions,
+    storage_stats
+)
+from ..services.renditions import rendition_service
+from ..utils.file_responses import rendition_response
+from ..utils.http_range import parse_range_header, RangeNotSatisfiable
+from cryptography.fernet import InvalidToken
 from .auth import get_current_user
 from bson import ObjectId
 import io
-import json
+import uuid
 from datetime import datetime, timezone
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -27,6 +43,15 @@ async def get_gridfs_file(file_id: str, check_owner: str = None):
     except StopAsyncIteration:
         raise HTTPException(status_code=404, detail="Dosya bulunamadı")
 
+async def get_owned_file(file_id: str, user_id: str) -> dict:
+    """Dosya kaydını (resolve_file) getir ve sahibinin kullanıcı olduğunu doğrula"""
+    stored = await resolve_file(fs, file_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Dosya bulunamadı")
+    if stored["metadata"].get("owner_id") != user_id:
+        raise HTTPException(status_code=403, detail="Bu dosyaya erişim izniniz yok")
+    return stored
+
 async def create_gridfs_entry(filename: str, content: bytes, metadata: dict):
     """GridFS'e yeni dosya/klasör ekle"""
     try:
@@ -39,6 +64,69 @@ async def create_gridfs_entry(filename: str, content: bytes, metadata: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Dosya kaydedilemedi: {str(e)}")
 
+async def partial_file_response(request: Request, grid_out, encryption_key: Optional[str],
+                                metadata: dict, headers: dict) -> Optional[Response]:
+    """
+    İstekte Range başlığı varsa 206 (tek aralık ya da multipart/byteranges)
+    veya 416 yanıtı üret; aralık istenmediyse ya da karşılanamıyorsa None
+    döner ve tüm dosya gönderilir. GridFS dosyaları değişmediği için ETag
+    dosya id'sidir; If-Range uyuşmazsa tüm dosya gönderilir.
+    """
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if not range_header or (if_range and if_range != headers["ETag"]):
+        return None
+
+    reader = await RangeReader.open(grid_out, encryption_key, metadata.get("size"))
+    if reader.length is None:
+        return None
+    try:
+        ranges = parse_range_header(range_header, reader.length)
+    except RangeNotSatisfiable:
+        return Response(
+            status_code=416,
+            headers={"Content-Range": f"bytes */{reader.length}", "Accept-Ranges": "bytes"}
+        )
+    if ranges is None:
+        return None
+
+    media_type = metadata.get("content_type", "application/octet-stream")
+    headers = {key: value for key, value in headers.items() if key not in ("Content-Length", "Content-Type")}
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{reader.length}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(reader.iter_range(start, end), status_code=206,
+                                 media_type=media_type, headers=headers)
+
+    boundary = uuid.uuid4().hex
+    parts = [
+        (
+            (b"\r\n" if index else b"") + (
+                f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{reader.length}\r\n\r\n"
+            ).encode("utf-8"),
+            start,
+            end
+        )
+        for index, (start, end) in enumerate(ranges)
+    ]
+    closing = f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+    async def body():
+        for part_header, start, end in parts:
+            yield part_header
+            async for chunk in reader.iter_range(start, end):
+                yield chunk
+        yield closing
+
+    headers["Content-Length"] = str(
+        sum(len(part_header) + end - start + 1 for part_header, start, end in parts) + len(closing)
+    )
+    return StreamingResponse(body(), status_code=206,
+                             media_type=f"multipart/byteranges; boundary={boundary}", headers=headers)
+
 # API Endpoint'leri
 @router.post("/upload")
 async def upload_file(
@@ -47,50 +135,36 @@ async def upload_file(
     current_user: dict = Depends(get_current_user)
 ):
     try:
-        print("\n=== UPLOAD FILE DEBUG ===")
-        print(f"User ID: {current_user['id']}")
-        print(f"File: {file.filename} ({file.content_type})")
-        print(f"Folder ID: {folder_id}")
+        logger.debug("User ID: %s", current_user['id'])
+        logger.debug("File: %s (%s)", file.filename, file.content_type)
+        logger.debug("Folder ID: %s", folder_id)
         
-        contents = await file.read()
-        encrypted_contents, encryption_key = file_encryption_service.encrypt_file(contents)
-        
-        metadata = {
-            "filename": file.filename,
-            "content_type": file.content_type,
-            "size": len(contents),
-            "owner_id": str(current_user["id"]),
-            "folder_id": folder_id,
-            "encryption_key": encryption_key,
-            "upload_date": datetime.now(timezone.utc),
-            "is_encrypted": True
-        }
-        
-        print(f"Metadata prepared: {metadata}")
-        
-        file_id = await fs.upload_from_stream(
-            file.filename,
-            io.BytesIO(encrypted_contents),
-            metadata=metadata
+        # Aynı içerik daha önce yüklendiyse sadece yeni bir kayıt eklenir;
+        # yoksa istek gövdesi parça parça şifrelenip GridFS'e yazılır
+        blob = await store_blob(fs, file, file.filename, file.content_type, encrypt=True)
+        ref = await create_file_ref(
+            fs, blob, str(current_user["id"]), file.filename, file.content_type,
+            folder_id=folder_id
         )
+        # Küçük resim arka planda hazırlanır (aynı içerik için zaten varsa atlanır)
+        rendition_service.schedule(fs, blob["gridfs_id"], file.content_type)
         
         response_data = {
-            "id": str(file_id),
+            "id": str(ref["_id"]),
             "name": file.filename,
             "type": file.content_type,
-            "size": len(contents),
+            "size": ref["size"],
             "uploadedBy": str(current_user["id"]),
-            "uploadDate": metadata["upload_date"].isoformat(),
+            "uploadDate": ref["upload_date"].isoformat(),
             "isEncrypted": True
         }
         
-        print(f"File uploaded successfully: {response_data}")
-        print("=======================\n")
+        logger.debug("File uploaded successfully: %s", response_data)
         
         return response_data
         
     except Exception as e:
-        print(f"Error in upload_file: {str(e)}")
+        logger.error("Error in upload_file: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/list")
@@ -99,9 +173,8 @@ async def list_files(
     current_user: dict = Depends(get_current_user)
 ):
     try:
-        print("\n=== LIST FILES DEBUG ===")
-        print(f"User ID: {current_user['id']}")
-        print(f"Folder ID: {folder_id}")
+        logger.debug("User ID: %s", current_user['id'])
+        logger.debug("Folder ID: %s", folder_id)
 
         # Temel sorgu - "_folder" olmayanları getir
         base_query = {
@@ -113,10 +186,26 @@ async def list_files(
         if folder_id:
             base_query["metadata.folder_id"] = folder_id
 
-        print(f"Query: {base_query}")
+        ref_query = {"owner_id": str(current_user["id"]), "bucket": "fs", "deleting": {"$ne": True}}
+        if folder_id:
+            ref_query["folder_id"] = folder_id
+
+        files = []
+        async for ref in file_refs_collection.find(ref_query):
+            files.append({
+                "id": str(ref["_id"]),
+                "name": ref["filename"],
+                "type": ref.get("content_type"),
+                "size": ref["size"],
+                "uploadedBy": ref["owner_id"],
+                "uploadDate": ref["upload_date"].isoformat(),
+                "isEncrypted": True
+            })
+
+        # Tekilleştirmeden önce yüklenmiş (tek parça saklanan) dosyalar
+        logger.debug("Query: %s", base_query)
         cursor = fs.find(base_query)
         
-        files = []
         async for doc in cursor:
             try:
                 files.append({
@@ -128,100 +217,128 @@ async def list_files(
                     "uploadDate": doc.metadata.get("upload_date").isoformat(),
                     "isEncrypted": doc.metadata.get("is_encrypted", False)
                 })
-                print(f"Added file: {doc.filename}")
+                logger.debug("Added file: %s", doc.filename)
             except Exception as e:
-                print(f"Error processing file {doc._id}: {str(e)}")
+                logger.error("Error processing file %s: %s", doc._id, e)
                 continue
         
-        print(f"Total files found: {len(files)}")
+        logger.debug("Total files found: %s", len(files))
         return files
 
     except Exception as e:
-        print(f"Error listing files: {str(e)}")
+        logger.error("Error listing files: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     
+@router.get("/storage")
+async def get_storage_stats(current_user: dict = Depends(get_current_user)):
+    """Kullanıcının dosya sayısı ve toplam boyutu"""
+    try:
+        return await storage_stats(str(current_user["id"]))
+    except Exception as e:
+        logger.error("Error computing storage stats: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/download/{file_id}")
 async def download_file(
     file_id: str,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
     try:
         # Dosya kontrolü
-        cursor = fs.find({"_id": ObjectId(file_id)})
-        file = await cursor.next()
-        
-        if file.metadata.get("owner_id") != str(current_user["id"]):
-            raise HTTPException(status_code=403, detail="Bu dosyaya erişim izniniz yok")
+        stored = await get_owned_file(file_id, str(current_user["id"]))
+        metadata = stored["metadata"]
+
+        # Dosya chunk chunk okunur ve şifreliyse parça parça çözülür
+        grid_out = await fs.open_download_stream(stored["gridfs_id"])
+        headers = {
+            "Content-Disposition": f'attachment; filename="{stored["filename"]}"',
+            "Accept-Ranges": "bytes",
+            "ETag": f'"{file_id}"'
+        }
 
-        # Dosya içeriğini oku
-        file_data = await fs.open_download_stream(ObjectId(file_id))
-        contents = await file_data.read()
+        # Yarıda kalan indirmeler Range ile devam eder
+        partial = await partial_file_response(
+            request, grid_out, metadata.get("encryption_key"), metadata, headers
+        )
+        if partial is not None:
+            return partial
 
-        # Şifreliyse çöz
-        if file.metadata.get("encryption_key"):
-            try:
-                contents = file_encryption_service.decrypt_file(
-                    contents,
-                    file.metadata["encryption_key"]
-                )
-            except Exception as e:
-                print(f"Decryption error: {str(e)}")
-                # Şifre çözme başarısız olursa orijinal içeriği gönder
-                pass
+        # Şifreli olmayan eski dosyalar olduğu gibi gönderilir; doğrulanamayan
+        # şifreli dosya (bozuk/değiştirilmiş) gönderilmez
+        chunks, decrypted = await open_plaintext_stream(
+            grid_out, metadata.get("encryption_key"), fallback_raw=True
+        )
+        headers["Content-Length"] = str(plaintext_length(grid_out, metadata, decrypted))
 
         return StreamingResponse(
-            io.BytesIO(contents),
-            media_type=file.metadata.get("content_type", "application/octet-stream"),
-            headers={
-                "Content-Disposition": f'attachment; filename="{file.filename}"'
-            }
+            chunks,
+            media_type=metadata.get("content_type", "application/octet-stream"),
+            headers=headers
         )
 
+    except HTTPException:
+        raise
+    except InvalidToken as e:
+        logger.error("Decryption error: %s", e)
+        raise HTTPException(status_code=500, detail="Dosya çözülemedi")
     except Exception as e:
-        print(f"Error downloading file: {str(e)}")
+        logger.error("Error downloading file: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/preview/{file_id}")
-async def preview_file(file_id: str, current_user: dict = Depends(get_current_user)):
+async def preview_file(
+    file_id: str,
+    request: Request,
+    size: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
     try:
-        print(f"\n=== PREVIEW FILE DEBUG ===")
-        print(f"File ID: {file_id}")
+        logger.debug("File ID: %s", file_id)
+        if size is not None and size not in rendition_service.sizes:
+            raise HTTPException(status_code=400, detail="Geçersiz önizleme boyutu")
+
+        # Meta veri ve yetki kontrolü
+        stored = await get_owned_file(file_id, str(current_user["id"]))
+        metadata = stored["metadata"]
+
+        # Küçük resim/PDF önizlemesi istendiyse türev gönderilir; üretilemezse orijinal
+        if size is not None:
+            rendition = await rendition_response(request, fs, stored, file_id, size)
+            if rendition is not None:
+                return rendition
+
+        # Dosyayı chunk chunk oku, şifreliyse parça parça çöz
+        grid_out = await fs.open_download_stream(stored["gridfs_id"])
+        encryption_key = metadata.get("encryption_key") if metadata.get("is_encrypted") else None
+        headers = {
+            "Content-Disposition": f'inline; filename="{stored["filename"]}"',
+            "Accept-Ranges": "bytes",
+            "ETag": f'"{file_id}"'
+        }
 
-        # Meta veriyi al
-        cursor = fs.find({"_id": ObjectId(file_id)})
-        file_info = await cursor.next()
-        
-        # Yetki kontrolü
-        metadata = file_info.metadata if hasattr(file_info, 'metadata') else {}
-        if str(current_user["id"]) != metadata.get("owner_id"):
-            raise HTTPException(status_code=403, detail="Bu dosyaya erişim izniniz yok")
-
-        # Dosyayı oku
-        grid_out = await fs.open_download_stream(ObjectId(file_id))
-        contents = await grid_out.read()
-
-        # Eğer dosya şifreliyse çöz
-        if metadata.get("is_encrypted"):
-            encryption_key = metadata.get("encryption_key")
-            if encryption_key:
-                try:
-                    contents = file_encryption_service.decrypt_file(contents, encryption_key)
-                    print("File decrypted successfully")
-                except Exception as e:
-                    print(f"Decryption error: {str(e)}")
-                    raise HTTPException(status_code=500, detail="Dosya çözülemedi")
-
-        print("File read successfully, sending response")
+        # Video/ses oynatıcılar ileri sarınca sadece istenen aralık okunur
+        try:
+            partial = await partial_file_response(request, grid_out, encryption_key, metadata, headers)
+            if partial is not None:
+                return partial
+            chunks, decrypted = await open_plaintext_stream(grid_out, encryption_key)
+        except InvalidToken as e:
+            logger.error("Decryption error: %s", e)
+            raise HTTPException(status_code=500, detail="Dosya çözülemedi")
+        headers["Content-Length"] = str(plaintext_length(grid_out, metadata, decrypted))
+
+        logger.debug("File opened successfully, streaming response")
         return StreamingResponse(
-            io.BytesIO(contents),
+            chunks,
             media_type=metadata.get("content_type", "application/octet-stream"),
-            headers={
-                "Content-Disposition": f'inline; filename="{file_info.filename}"'
-            }
+            headers=headers
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in preview file: {str(e)}")
+        logger.error("Error in preview file: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/files/{file_id}")
@@ -230,107 +347,102 @@ async def delete_file(
     current_user: dict = Depends(get_current_user)
 ):
     try:
-        print(f"\n=== Delete File Debug ===")
-        print(f"File ID: {file_id}")
-        print(f"User ID: {current_user['id']}")
+        logger.debug("File ID: %s", file_id)
+        logger.debug("User ID: %s", current_user['id'])
 
         # Dosya kontrolü
-        cursor = fs.find({"_id": ObjectId(file_id)})
-        file = None
-        try:
-            file = await cursor.next()
-            print(f"File found: {file.filename}")
-        except StopAsyncIteration:
-            print("File not found")
+        stored = await resolve_file(fs, file_id)
+        if stored is None:
+            logger.debug("File not found")
             raise HTTPException(status_code=404, detail="Dosya bulunamadı")
+        logger.debug("File found: %s", stored["filename"])
 
         # Yetki kontrolü
-        owner_id = file.metadata.get("owner_id")
-        print(f"File owner: {owner_id}")
+        owner_id = stored["metadata"].get("owner_id")
+        logger.debug("File owner: %s", owner_id)
         
         if owner_id != str(current_user["id"]):
             raise HTTPException(status_code=403, detail="Bu dosyayı silme yetkiniz yok")
 
-        # Dosyayı sil
-        await fs.delete(ObjectId(file_id))
-        print("File deleted successfully")
+        # Kaydı sil; içerik başka kayıtlarca kullanılmıyorsa blob da silinir
+        if stored["ref"] is not None:
+            await delete_file_ref(fs, stored["ref"])
+        else:
+            await fs.delete(stored["gridfs_id"])
+            await delete_renditions(fs, stored["gridfs_id"])
+        logger.debug("File deleted successfully")
         
         return {"message": "Dosya başarıyla silindi"}
     except Exception as e:
-        print(f"Error deleting file: {str(e)}")
+        logger.error("Error deleting file: %s", e)
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/files/{file_id}")
-async def get_file(file_id: str, current_user: dict = Depends(get_current_user)):
+async def get_file(file_id: str, request: Request, current_user: dict = Depends(get_current_user)):
     try:
-        print(f"\n=== GET FILE DEBUG ===")
-        print(f"Getting file with ID: {file_id}")
-        print(f"Current user: {current_user}")
+        logger.debug("Getting file with ID: %s", file_id)
+        logger.debug("Current user: %s", current_user)
 
         if not ObjectId.is_valid(file_id):
-            print(f"Invalid ObjectID: {file_id}")
+            logger.debug("Invalid ObjectID: %s", file_id)
             raise HTTPException(status_code=400, detail="Geçersiz dosya ID'si")
 
         try:
-            # GridFS'den dosyayı bul
-            cursor = fs.find({"_id": ObjectId(file_id)})
-            try:
-                file_info = await cursor.next()
-                print(f"File info metadata: {file_info.metadata}")
-                
-                # Yetki kontrolü
-                metadata = file_info.metadata if hasattr(file_info, 'metadata') else {}
-                owner_id = metadata.get("owner_id")
-                print(f"File owner_id: {owner_id}, Current user id: {current_user['id']}")
-
-                if str(current_user["id"]) != owner_id:
-                    raise HTTPException(status_code=403, detail="Bu dosyaya erişim izniniz yok")
-
-                # Dosyayı oku
-                grid_out = await fs.open_download_stream(ObjectId(file_id))
-                contents = await grid_out.read()
-
-                print(f"File read, size before decryption: {len(contents)} bytes")
-
-                # Şifreli dosyayı çöz
-                if metadata.get("is_encrypted") and metadata.get("encryption_key"):
-                    try:
-                        print("Attempting to decrypt file...")
-                        contents = file_encryption_service.decrypt_file(
-                            contents,
-                            metadata["encryption_key"]
-                        )
-                        print(f"File decrypted, new size: {len(contents)} bytes")
-                    except Exception as e:
-                        print(f"Decryption error: {str(e)}")
-                        raise HTTPException(status_code=500, detail="Dosya çözülemedi")
-
-                return StreamingResponse(
-                    io.BytesIO(contents),
-                    media_type=metadata.get("content_type", "application/octet-stream"),
-                    headers={
-                        "Content-Type": metadata.get("content_type", "application/octet-stream"),
-                        "Content-Disposition": f'inline; filename="{file_info.filename}"',
-                        "Cache-Control": "no-cache"
-                    }
-                )
-
-            except StopAsyncIteration:
-                print(f"File not found in cursor for ID: {file_id}")
+            # Dosya kaydını bul
+            stored = await resolve_file(fs, file_id)
+            if stored is None:
+                logger.debug("File not found for ID: %s", file_id)
                 raise HTTPException(status_code=404, detail="Dosya bulunamadı")
 
+            # Yetki kontrolü
+            metadata = stored["metadata"]
+            owner_id = metadata.get("owner_id")
+            logger.debug("File owner_id: %s, Current user id: %s", owner_id, current_user['id'])
+
+            if str(current_user["id"]) != owner_id:
+                raise HTTPException(status_code=403, detail="Bu dosyaya erişim izniniz yok")
+
+            # Dosyayı chunk chunk oku
+            grid_out = await fs.open_download_stream(stored["gridfs_id"])
+            logger.debug("File opened, stored size: %s bytes", grid_out.length)
+
+            # Şifreli dosya parça parça çözülür
+            encryption_key = metadata.get("encryption_key") if metadata.get("is_encrypted") else None
+            headers = {
+                "Content-Type": metadata.get("content_type", "application/octet-stream"),
+                "Content-Disposition": f'inline; filename="{stored["filename"]}"',
+                "Accept-Ranges": "bytes",
+                "ETag": f'"{file_id}"',
+                "Cache-Control": "no-cache"
+            }
+            try:
+                partial = await partial_file_response(request, grid_out, encryption_key, metadata, headers)
+                if partial is not None:
+                    return partial
+                chunks, decrypted = await open_plaintext_stream(grid_out, encryption_key)
+            except InvalidToken as e:
+                logger.error("Decryption error: %s", e)
+                raise HTTPException(status_code=500, detail="Dosya çözülemedi")
+            headers["Content-Length"] = str(plaintext_length(grid_out, metadata, decrypted))
+
+            return StreamingResponse(
+                chunks,
+                media_type=metadata.get("content_type", "application/octet-stream"),
+                headers=headers
+            )
+
         except Exception as inner_e:
-            print(f"Inner error: {str(inner_e)}")
+            logger.error("Inner error: %s", inner_e)
             raise inner_e
 
     except HTTPException as he:
-        print(f"HTTP error: {str(he)}")
+        logger.debug("HTTP error: %s", he)
         raise he
     except Exception as e:
-        print(f"Outer error in get_file: {str(e)}")
+        logger.error("Outer error in get_file: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/folders")
@@ -402,6 +514,7 @@ async def delete_folder(
         # Alt klasörleri ve dosyaları sil
         async for item in fs.find({"metadata.path": {"$regex": f"^{path}/"}}):
             await fs.delete(item._id)
+            await delete_renditions(fs, item._id)
 
         # Klasörü sil
         await fs.delete(ObjectId(folder_id))
@@ -418,9 +531,8 @@ async def create_subfolder(
     current_user: dict = Depends(get_current_user)
 ):
     try:
-        print(f"\n=== Create Subfolder Debug ===")
-        print(f"Parent ID: {parent_id}")
-        print(f"Name: {name}")
+        logger.debug("Parent ID: %s", parent_id)
+        logger.debug("Name: %s", name)
 
         # Parent klasör kontrolü
         cursor = fs.find({"_id": ObjectId(parent_id), "filename": "_folder"})
@@ -448,7 +560,7 @@ async def create_subfolder(
             "path": f"{parent_path}/{name}",
         }
         
-        print(f"Creating folder with metadata: {metadata}")
+        logger.debug("Creating folder with metadata: %s", metadata)
         
         file_id = await fs.upload_from_stream(
             "_folder",
@@ -456,7 +568,7 @@ async def create_subfolder(
             metadata=metadata
         )
         
-        print(f"Created folder with ID: {file_id}")
+        logger.debug("Created folder with ID: %s", file_id)
         
         return {
             "id": str(file_id),
@@ -467,7 +579,7 @@ async def create_subfolder(
             "path": metadata["path"]
         }
     except Exception as e:
-        print(f"Error creating subfolder: {str(e)}")
+        logger.error("Error creating subfolder: %s", e)
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
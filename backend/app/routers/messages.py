@@ -1,33 +1,56 @@
 # backend/app/routers/messages.py
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, File, UploadFile, Form
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, File, UploadFile, Form, Query, Request
 from fastapi.responses import JSONResponse, StreamingResponse
-from typing import List
+from typing import List, Optional
 import json
-import io
 from datetime import datetime, timezone, timedelta
 from bson import ObjectId
 from ..database import (
-    save_file,
-    get_file,
     users_collection,
     message_files,
     messages_collection, 
     create_message,
     get_messages,
+    get_messages_page,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    conversation_key,
+    normalize_timestamp,
+    update_conversation_summary,
+    decrement_conversation_unread,
+    mark_conversation_read,
+    get_recent_conversations,
+    encode_conversation_cursor,
+    assign_delivery_seqs,
+    get_messages_since,
     fs,
     db,
     client,
     delete_rsa_messages
 )
-from ..schemas.message import MessageCreate, MessageResponse
+from ..schemas.message import MessageCreate, MessageResponse, ReadReceiptRequest
 from .auth import get_current_user
 from ..services.websocket_manager import ws_manager
+from ..services.ingest import ingest_pipeline
+from ..services.user_loader import UserLoader, get_user_loader, format_user_summary, USER_SUMMARY_PROJECTION
 from ..services.encryption import encryption_service
-from ..services.file_encryption import file_encryption_service
+from ..services.file_storage import (
+    open_plaintext_stream,
+    plaintext_length,
+    store_blob,
+    create_file_ref,
+    resolve_file
+)
+from ..services.renditions import rendition_service
+from ..utils.file_responses import rendition_response
 import base64
+import time
 from Crypto.Random import get_random_bytes
 from Crypto.Cipher import AES, Blowfish, PKCS1_OAEP
 from Crypto.PublicKey import RSA
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 db = client.get_database("Bitirme")  # database bağlantısı
@@ -40,6 +63,9 @@ fs_chunks = db.fs.chunks  # GridFS chunks koleksiyonu
 from motor.motor_asyncio import AsyncIOMotorGridFSBucket
 bucket = AsyncIOMotorGridFSBucket(db)
 
+# /recent-chats yanıtındaki son mesaj önizlemesinin uzunluğu
+RECENT_CHAT_PREVIEW_LENGTH = 100
+
 def format_turkish_time(dt=None):
     """Tarihi Türkiye saatine göre formatlar"""
     if dt is None:
@@ -52,303 +78,301 @@ def format_turkish_time(dt=None):
 @router.get("/all-users")
 async def get_all_users(current_user = Depends(get_current_user)):
     try:
-        print("\n--- GET ALL USERS DEBUG ---")
-        print(f"Current user: {current_user}")  # Mevcut kullanıcı bilgisi
-        
-        # Önce tüm kullanıcıları getirelim
-        all_users = await users_collection.find().to_list(length=None)
-        print(f"Total users in database: {len(all_users)}")  # Toplam kullanıcı sayısı
+        logger.debug("Current user: %s", current_user['id'])
         
-        # Mevcut kullanıcı dışındaki kullanıcıları filtrele
-        other_users = [
-            user for user in all_users 
-            if str(user["_id"]) != current_user["id"]
-        ]
-        print(f"Users excluding current user: {len(other_users)}")  # Filtrelenmiş kullanıcı sayısı
-        
-        # Yanıt için kullanıcıları formatla
-        formatted_users = []
-        for user in other_users:
-            formatted_user = {
-                "id": str(user["_id"]),
-                "email": user.get("email", ""),
-                "first_name": user.get("first_name", ""),
-                "last_name": user.get("last_name", "")
-            }
-            formatted_users.append(formatted_user)
-            print(f"Formatted user: {formatted_user}")  # Her bir formatlanmış kullanıcı
+        # Mevcut kullanıcı dışındaki kullanıcıları sadece özet alanlarıyla getir
+        cursor = users_collection.find(
+            {"_id": {"$ne": ObjectId(current_user["id"])}},
+            USER_SUMMARY_PROJECTION
+        )
+        formatted_users = [format_user_summary(user) async for user in cursor]
             
-        print(f"Returning {len(formatted_users)} users")  # Döndürülen kullanıcı sayısı
-        print("------------------------\n")
+        logger.debug("Returning %s users", len(formatted_users))
         
         return formatted_users
 
     except Exception as e:
-        print(f"Error in get_all_users: {str(e)}")
+        logger.error("Error in get_all_users: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     
 async def update_message_status(message_id: str, is_read: bool):
     try:
-        result = await messages_collection.update_one(
-            {"_id": ObjectId(message_id)},
-            {"$set": {"is_read": is_read}}
+        message = await messages_collection.find_one_and_update(
+            {"_id": ObjectId(message_id), "is_read": {"$ne": is_read}},
+            {"$set": {"is_read": is_read}},
+            projection={"conversation_id": 1, "receiver_id": 1}
         )
-        return result.modified_count > 0
+        if not message:
+            return False
+
+        if is_read and message.get("conversation_id"):
+            await decrement_conversation_unread(message["conversation_id"], message["receiver_id"])
+        return True
     except Exception as e:
-        print(f"Error updating message status: {str(e)}")
+        logger.error("Error updating message status: %s", e)
         return False
 
+async def mark_read_and_notify(
+    reader_id: str,
+    peer_id: str,
+    up_to_timestamp: Optional[str] = None,
+    up_to_message_id: Optional[str] = None
+) -> dict:
+    """Konuşmayı sınıra kadar okundu işaretle ve gönderene tek bir bildirim yolla"""
+    updated, watermark = await mark_conversation_read(
+        reader_id, peer_id, up_to_timestamp, up_to_message_id
+    )
+
+    receipt = {
+        "type": "read_receipt",
+        "reader_id": reader_id,
+        "conversation_id": conversation_key(reader_id, peer_id),
+        "up_to_timestamp": watermark,
+        "up_to_message_id": up_to_message_id,
+        "count": updated,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+    if updated:
+        await ws_manager.send_personal_message(receipt, peer_id)
+    return receipt
+
+async def load_sync_delta(user_id: str, since: int, limit: int = MAX_PAGE_SIZE) -> dict:
+    """Kullanıcının `since` seq'inden sonraki mesajları çözülmüş olarak getir"""
+    messages, last_seq, has_more = await get_messages_since(user_id, since, limit)
+    return {
+        "messages": await decrypt_message_records(messages),
+        "seq": last_seq,
+        "has_more": has_more
+    }
+
+async def stream_sync(connection, user_id: str, since: int):
+    """
+    Kaçırılan mesajları sayfa sayfa "sync" olayları olarak sokete gönder,
+    sonunda "sync_complete" ile son seq'i bildir. Bu sırada gelen canlı
+    mesajlar da gönderilebilir; istemci seq'e göre tekrarları ayıklar.
+    """
+    while True:
+        delta = await load_sync_delta(user_id, since)
+        if delta["messages"]:
+            connection.enqueue(json.dumps({"type": "sync", **delta}, ensure_ascii=False))
+        since = delta["seq"]
+        if not delta["has_more"] or not delta["messages"]:
+            break
+    connection.enqueue(json.dumps({"type": "sync_complete", "seq": since}))
+
 @router.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    await ws_manager.connect(websocket, user_id)
+async def websocket_endpoint(websocket: WebSocket, user_id: str, since: Optional[int] = None):
+    """`since` verilirse bağlanınca o seq'ten sonraki mesajlar gönderilir"""
+    connection = await ws_manager.connect(websocket, user_id)
     try:
+        if since is not None:
+            await stream_sync(connection, user_id, since)
+
         while True:
             data = await websocket.receive_json()
+            # Duvar saati: mesaj başka bir worker'daki sokete de teslim edilebilir
+            received_at = time.time()
+            connection.touch()
             
-            if data.get("type") == "message":
-                print("\n=== WEBSOCKET MESSAGE DEBUG ===")
-                print(f"Message Type: {data.get('type')}")
-                print(f"Encryption Type: {data.get('encryptionType')}")
-                print(f"Content: {data.get('content')}")
-
-                if data.get("content", "").startswith("[FILE:"):
-                    print("Dosya mesajı tespit edildi, şifreleme atlanıyor...")
-                    message_data = {
-                        "content": data["content"],
-                        "sender_id": user_id,
-                        "receiver_id": data["receiverId"],
-                        "timestamp": datetime.now().isoformat(),
-                        "is_read": False,
-                        "encryption_type": "NONE"
-                    }
-                else:
-                    try:
-                        encrypted_content = None
-                        encryption_data = None
-
-                        print("\n--Encryption Process Start--")
-                        print(f"Orijinal Mesaj: {data['content']}")
-                        print(f"Şifreleme Yöntemi: {data['encryptionType']}")
-                        
-                        if data["encryptionType"] == "AES":
-                            print("\n=== AES Encryption ===")
-                            encrypted_content, encryption_data = encryption_service.encrypt_aes(data["content"])
-                            print(f"Şifreli İçerik: {encrypted_content}")
-                            print(f"Şifreleme Verisi: {encryption_data}")
-
-                        elif data["encryptionType"] == "BLOWFISH":
-                            print("\n=== BLOWFISH Encryption ===")
-                            encrypted_content, encryption_data = encryption_service.encrypt_blowfish(data["content"])
-                            print(f"Şifreli İçerik: {encrypted_content}")
-                            print(f"Şifreleme Verisi: {encryption_data}")
-
-                        elif data["encryptionType"] == "RSA":
-                            print("\n=== RSA Encryption ===")
-                            encrypted_content, encryption_data = encryption_service.encrypt_rsa(data["content"])
-                            print(f"Şifreli İçerik: {encrypted_content}")
-                            print(f"Private Key: {encryption_data.get('private_key', 'Bulunamadı')[:50]}...")
-                            print(f"Public Key: {encryption_data.get('public_key', 'Bulunamadı')[:50]}...")
-
-                        elif data["encryptionType"] == "VIGENERE":
-                            print("\n=== VIGENERE Encryption ===")
-                            encrypted_content, encryption_data = encryption_service.encrypt_vigenere(data["content"])
-                            print(f"Şifreli İçerik: {encrypted_content}")
-                            print(f"Anahtar: {encryption_data.get('key', 'Bulunamadı')}")
-
-                        elif data["encryptionType"] == "BASE64":
-                            print("\n=== BASE64 Encoding ===")
-                            encrypted_content = encryption_service.encrypt_base64(data["content"])[0]
-                            print(f"Kodlanmış İçerik: {encrypted_content}")
-                            encryption_data = None
-
-                        print("\nŞifreleme Sonuçları:")
-                        print(f"Şifreli İçerik Tipi: {type(encrypted_content)}")
-                        print(f"Şifreleme Verisi Tipi: {type(encryption_data)}")
-                        print("--Encryption Process End--\n")
-
-                        # Mesaj verisini oluştur
-                        message_data = {
-                            "encrypted_content": encrypted_content,
-                            "encryption_data": encryption_data,
-                            "encryption_type": data["encryptionType"],
-                            "sender_id": user_id,
-                            "receiver_id": data["receiverId"],
-                            "timestamp": datetime.now().isoformat(),
-                            "is_read": False
-                        }
-
-                    except Exception as e:
-                        print(f"\nENCRYPTION ERROR: {str(e)}")
-                        print(f"Error Type: {type(e)}")
-                        print(f"Error Args: {e.args}")
-                        raise e
-
-                print("\n=== MESSAGE DATA DEBUG ===")
-                print(f"Final Message Data: {message_data}")
-                
-                created_message = await create_message(message_data)
-                await ws_manager.send_personal_message(created_message, data["receiverId"])
+            if data.get("type") == "pong":
+                continue
+
+            if data.get("type") == "ping":
+                connection.enqueue(json.dumps({"type": "pong", "timestamp": datetime.now(timezone.utc).isoformat()}))
+
+            elif data.get("type") == "resume":
+                try:
+                    await stream_sync(connection, user_id, int(data.get("since", 0)))
+                except (TypeError, ValueError) as e:
+                    logger.warning("Invalid resume event from %s: %s", user_id, e)
+
+            elif data.get("type") == "message":
+                logger.debug("Encryption Type: %s", data.get('encryptionType'))
+                # Şifreleme executor'da, kayıt ve teslim ayrı aşamalarda yapılır
+                try:
+                    await ingest_pipeline.process(user_id, data, received_at)
+                except (KeyError, ValueError) as e:
+                    logger.warning("Invalid message event from %s: %s", user_id, e)
+                    connection.enqueue(json.dumps({"type": "error", "detail": str(e)}))
+
+            elif data.get("type") == "read":
+                # Konuşmayı verilen mesaja/zamana kadar okundu işaretle
+                try:
+                    await mark_read_and_notify(
+                        user_id,
+                        data["peerId"],
+                        up_to_timestamp=data.get("upToTimestamp"),
+                        up_to_message_id=data.get("upToMessageId")
+                    )
+                except (KeyError, ValueError, LookupError) as e:
+                    logger.warning("Invalid read event from %s: %s", user_id, e)
+                    connection.enqueue(json.dumps({"type": "error", "detail": str(e)}))
 
     except WebSocketDisconnect:
-        ws_manager.disconnect(user_id)
-        print(f"User {user_id} disconnected from WebSocket")
+        ws_manager.disconnect(user_id, websocket)
+        logger.info("User %s disconnected from WebSocket", user_id)
     except Exception as e:
-        print(f"WebSocket error: {str(e)}")
-        ws_manager.disconnect(user_id)
+        logger.exception("WebSocket error for user %s", user_id)
+        ws_manager.disconnect(user_id, websocket)
 
 @router.get("/recent-chats")
-async def get_recent_chats(current_user = Depends(get_current_user)):
+async def get_recent_chats(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    current_user = Depends(get_current_user),
+    user_loader: UserLoader = Depends(get_user_loader)
+):
+    """
+    Kullanıcının konuşmalarını son mesaja göre sıralı getir. Sonraki sayfa
+    için X-Next-Cursor başlığındaki değer `before` olarak gönderilir.
+    """
     try:
-        # Sadece mevcut kullanıcının mesajlaştığı kişileri getir
-        messages = await messages_collection.find({
-            "$or": [
-                {"sender_id": str(current_user["id"])},
-                {"receiver_id": str(current_user["id"])}
-            ]
-        }).to_list(length=None)
-
-        # Benzersiz kullanıcı ID'lerini topla
-        user_ids = set()
-        for msg in messages:
-            if msg["sender_id"] != str(current_user["id"]):
-                user_ids.add(msg["sender_id"])
-            if msg["receiver_id"] != str(current_user["id"]):
-                user_ids.add(msg["receiver_id"])
-
-        # Bu kullanıcıların bilgilerini getir
+        current_user_id = str(current_user["id"])
+        try:
+            conversations = await get_recent_conversations(current_user_id, limit, before)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # Konuşmadaki diğer kullanıcılar tek $in sorgusunda yüklenir
+        peer_ids = [
+            next((p for p in conversation["participants"] if p != current_user_id), None)
+            for conversation in conversations
+        ]
+        users = await user_loader.load_many(peer_id or "" for peer_id in peer_ids)
+
+        # Son mesaj önizlemeleri tek seferde çözülür
+        previews = await decrypt_message_records([
+            dict(c["last_message"]) for c in conversations if c.get("last_message")
+        ])
+        last_messages = {preview["id"]: preview for preview in previews}
+
         chat_users = []
-        for user_id in user_ids:
-            user = await users_collection.find_one({"_id": ObjectId(user_id)})
-            if user:
-                chat_users.append({
-                    "id": str(user["_id"]),
-                    "email": user["email"],
-                    "first_name": user.get("first_name", ""),
-                    "last_name": user.get("last_name", "")
-                })
-
-        return chat_users
+        for conversation, user in zip(conversations, users):
+            if not user:
+                continue
+
+            last_message = last_messages.get(conversation.get("last_message", {}).get("id"))
+            if last_message and isinstance(last_message.get("content"), str):
+                last_message["content"] = last_message["content"][:RECENT_CHAT_PREVIEW_LENGTH]
+
+            chat_users.append({
+                **user,
+                "last_message": last_message,
+                "last_timestamp": conversation.get("last_timestamp"),
+                "unread_count": conversation.get("unread", {}).get(current_user_id, 0)
+            })
+
+        headers = {}
+        if len(conversations) == limit:
+            headers["X-Next-Cursor"] = encode_conversation_cursor(conversations[-1])
+
+        return JSONResponse(content=chat_users, headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in get_recent_chats: {str(e)}")
+        logger.error("Error in get_recent_chats: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     
-@router.get("/{receiver_id}")
-async def get_user_messages(receiver_id: str, current_user = Depends(get_current_user)):
+@router.get("/sync")
+async def sync_messages(
+    since: int = Query(0, ge=0),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user = Depends(get_current_user)
+):
+    """
+    Kullanıcının `since` seq'inden sonraki mesajları (WebSocket resume ile
+    aynı delta). Dönen `seq` bir sonraki istekte `since` olarak gönderilir;
+    `has_more` true ise hemen tekrar istenmelidir.
+    """
     try:
-        print(f"\n=== GET MESSAGES DEBUG ===")
-        print(f"Current user: {current_user['id']}, Receiver: {receiver_id}")
-        
-        messages = await get_messages(current_user["id"], receiver_id)
-        print(f"Found {len(messages)} messages")
-
-        decrypted_messages = []
-
-        for msg in messages:
-            try:
-                msg_id = str(msg["_id"]) if "_id" in msg else str(msg.get("id"))
-                print(f"\n--- Processing Message {msg_id} ---")
-                print(f"Raw Message Data: {msg}")
-
-                # Dosya mesajı kontrolü
-                if msg.get("content", "").startswith('[FILE:'):
-                    print("File message detected, skipping decryption")
-                    decrypted_messages.append({
-                        "id": msg_id,
-                        "content": msg["content"],
-                        "sender_id": msg["sender_id"],
-                        "receiver_id": msg["receiver_id"],
-                        "timestamp": msg["timestamp"],
-                        "is_read": msg.get("is_read", False),
-                        "encryption_type": msg.get("encryption_type", "")
-                    })
-                    continue
-
-                # Normal mesaj şifre çözme
-                encryption_type = msg.get("encryption_type", "")
-                encryption_data = msg.get("encryption_data")
-                encrypted_content = msg.get("encrypted_content")
-
-                print(f"Encryption Type: {encryption_type}")
-                print(f"Encryption Data: {encryption_data}")
-                print(f"Encrypted Content Type: {type(encrypted_content)}")
-                if isinstance(encrypted_content, str):
-                    print(f"Encrypted Content Length: {len(encrypted_content)}")
-
-                if encryption_type and encrypted_content:
-                    try:
-                        print("\n--Decryption Process Start--")
-                        print(f"Şifreleme Yöntemi: {encryption_type}")
-                        print(f"Şifreli İçerik: {encrypted_content}")
-                        print(f"Şifreleme Verisi: {encryption_data}")
-                        decrypted_content = None
-
-                        if encryption_type == "AES":
-                            print("\n=== AES Decryption ===")
-                            decrypted_content = encryption_service.decrypt_aes(
-                                encrypted_content, encryption_data
-                            )
-                            print(f"Çözülmüş İçerik: {decrypted_content}")
-
-                        elif encryption_type == "BLOWFISH":
-                            print("\n=== BLOWFISH Decryption ===")
-                            decrypted_content = encryption_service.decrypt_blowfish(
-                                encrypted_content, encryption_data
-                            )
-                            print(f"Çözülmüş İçerik: {decrypted_content}")
-
-                        elif encryption_type == "RSA":
-                            print("\n=== RSA Decryption ===")
-                            decrypted_content = encryption_service.decrypt_rsa(
-                                encrypted_content, encryption_data
-                            )
-                            print(f"Çözülmüş İçerik: {decrypted_content}")
-
-                        elif encryption_type == "VIGENERE":
-                            print("\n=== VIGENERE Decryption ===")
-                            decrypted_content = encryption_service.decrypt_vigenere(
-                                encrypted_content, encryption_data
-                            )
-                            print(f"Çözülmüş İçerik: {decrypted_content}")
-
-                        elif encryption_type == "BASE64":
-                            print("\n=== BASE64 Decoding ===")
-                            decrypted_content = encryption_service.decrypt_base64(
-                                encrypted_content
-                            )
-                            print(f"Çözülmüş İçerik: {decrypted_content}")
-
-                        print("\nŞifre Çözme Sonuçları:")
-                        print(f"Çözülmüş İçerik Tipi: {type(decrypted_content)}")
-                        if isinstance(decrypted_content, str):
-                            print(f"Çözülmüş İçerik Uzunluğu: {len(decrypted_content)} karakter")
-                        print("--Decryption Process End--\n")
-
-                    except Exception as e:
-                        print(f"\nDECRYPTION ERROR: {str(e)}")
-                        print(f"Error Type: {type(e)}")
-                        print(f"Error Args: {e.args}")
-                        decrypted_content = "Mesaj çözülemedi"
-                else:
-                    decrypted_content = msg.get("content", "")
-
-                decrypted_messages.append({
-                    "id": msg_id,
-                    "content": decrypted_content,
-                    "sender_id": msg["sender_id"],
-                    "receiver_id": msg["receiver_id"],
-                    "timestamp": msg["timestamp"],
-                    "is_read": msg.get("is_read", False),
-                    "encryption_type": encryption_type
-                })
-
-            except Exception as e:
-                print(f"Error processing message: {str(e)}")
-                continue
+        return await load_sync_delta(str(current_user["id"]), since, limit)
+    except Exception as e:
+        logger.error("Error in sync_messages: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return decrypted_messages
+async def decrypt_message_records(messages: List[dict]) -> List[dict]:
+    """Mesaj kayıtlarını toplu çözüp API yanıtına çevir (sıra korunur)"""
+    results = await encryption_service.decrypt_many(messages)
+
+    decrypted_messages = []
+    for msg, result in zip(messages, results):
+        try:
+            msg_id = str(msg["_id"]) if "_id" in msg else str(msg.get("id"))
+            decrypted = {
+                "id": msg_id,
+                "content": result.content,
+                "sender_id": msg["sender_id"],
+                "receiver_id": msg["receiver_id"],
+                "timestamp": msg["timestamp"],
+                "is_read": msg.get("is_read", False),
+                "encryption_type": msg.get("encryption_type", "")
+            }
+            if "seq" in msg:
+                decrypted["seq"] = msg["seq"]
+            if result.error:
+                logger.warning("Decryption error for message %s: %s", msg_id, result.error)
+                decrypted["content"] = "Mesaj çözülemedi"
+                # Ayrıntı sadece logda; istemciye sabit bir kod döner
+                decrypted["decryption_error"] = "decryption_failed"
+            decrypted_messages.append(decrypted)
+        except Exception as e:
+            logger.error("Error processing message: %s", e)
+            continue
+
+    return decrypted_messages
 
+@router.get("/{receiver_id}")
+async def get_user_messages(
+    receiver_id: str,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    around: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user = Depends(get_current_user)
+):
+    """
+    Konuşma geçmişini sayfa sayfa getir. Daha eski mesajlar için
+    X-Next-Cursor başlığındaki değer `before`, daha yenileri için
+    X-Prev-Cursor başlığındaki değer `after` parametresi olarak gönderilir.
+    `around` bir ISO timestamp alır ve o ana denk gelen sayfayı döndürür.
+    """
+    try:
+        logger.debug("Current user: %s, Receiver: %s", current_user['id'], receiver_id)
+
+        if sum(1 for param in (before, after, around) if param) > 1:
+            raise HTTPException(
+                status_code=400,
+                detail="before, after ve around parametreleri birlikte kullanılamaz"
+            )
+
+        try:
+            messages, next_cursor, prev_cursor = await get_messages_page(
+                current_user["id"],
+                receiver_id,
+                before=before,
+                after=after,
+                around=around,
+                limit=limit
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        logger.debug("Found %s messages", len(messages))
+
+        # Sadece istenen sayfa, executor'da toplu olarak çözülür
+        decrypted_messages = await decrypt_message_records(messages)
+
+        headers = {}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        if prev_cursor:
+            headers["X-Prev-Cursor"] = prev_cursor
+
+        return JSONResponse(content=decrypted_messages, headers=headers)
+
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in get_user_messages: {str(e)}")
+        logger.error("Error in get_user_messages: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
     
@@ -366,6 +390,37 @@ async def mark_message_as_read(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+@router.put("/conversations/{peer_id}/read")
+async def mark_conversation_as_read(
+    peer_id: str,
+    receipt: Optional[ReadReceiptRequest] = None,
+    current_user = Depends(get_current_user)
+):
+    """
+    peer_id'den gelen mesajları up_to_message_id veya up_to_timestamp'e kadar
+    (dahil) okundu işaretle; ikisi de yoksa tüm konuşma okunur.
+    """
+    try:
+        receipt = receipt or ReadReceiptRequest()
+        result = await mark_read_and_notify(
+            str(current_user["id"]),
+            peer_id,
+            up_to_timestamp=receipt.up_to_timestamp,
+            up_to_message_id=receipt.up_to_message_id
+        )
+        return {
+            "status": "success",
+            "updated": result["count"],
+            "up_to_timestamp": result["up_to_timestamp"]
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error("Error in mark_conversation_as_read: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    
 @router.get("/find-user")
 async def find_user(email: str, current_user = Depends(get_current_user)):
     try:
@@ -373,33 +428,28 @@ async def find_user(email: str, current_user = Depends(get_current_user)):
             raise HTTPException(status_code=400, detail="Email adresi gereklidir")
 
         # Debug: Arama parametresi
-        print(f"\nSearching for email: {email}")
+        logger.debug("Searching for email: %s", email)
 
         # MongoDB sorgusu
-        user = await users_collection.find_one({"email": email})
+        user = await users_collection.find_one({"email": email}, USER_SUMMARY_PROJECTION)
         
         # Debug: MongoDB yanıtı
-        print(f"MongoDB response: {user}")
+        logger.debug("MongoDB response: %s", user["_id"] if user else None)
 
         if not user:
             raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
 
         # Result objesi oluştur
-        result = {
-            "id": str(user.get("_id")),
-            "email": user.get("email"),
-            "first_name": user.get("first_name", ""),
-            "last_name": user.get("last_name", "")
-        }
+        result = format_user_summary(user)
 
         # Debug: Döndürülen veri
-        print(f"Returning data: {result}")
+        logger.debug("Returning user: %s", result["id"])
         
         # Response objesi ile dön
         return JSONResponse(content=result)
 
     except Exception as e:
-        print(f"Error in find_user endpoint: {str(e)}")
+        logger.error("Error in find_user endpoint: %s", e)
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=str(e))
@@ -408,21 +458,9 @@ async def find_user(email: str, current_user = Depends(get_current_user)):
 async def send_message(message: MessageCreate, current_user = Depends(get_current_user)):
     try:
         # Mesaj içeriğini şifrele
-        encrypted_content = None
-        encryption_data = None
-        
-        if message.encryption_type == "RSA":
-            encrypted_content, encryption_data = encryption_service.encrypt_rsa(message.content)
-        elif message.encryption_type == "AES":
-            encrypted_content, encryption_data = encryption_service.encrypt_aes(message.content)
-        elif message.encryption_type == "BLOWFISH":
-            encrypted_content, encryption_data = encryption_service.encrypt_blowfish(message.content)
-        elif message.encryption_type == "VIGENERE":
-            encrypted_content, encryption_data = encryption_service.encrypt_vigenere(message.content)
-        elif message.encryption_type == "BASE64":
-            encrypted_content, encryption_data = encryption_service.encrypt_base64(message.content)
-        else:
-            raise ValueError(f"Unsupported encryption type: {message.encryption_type}")
+        encrypted_content, encryption_data = await encryption_service.encrypt_async(
+            message.encryption_type, message.content
+        )
 
         message_data = {
             "encrypted_content": encrypted_content,
@@ -446,45 +484,38 @@ async def upload_file(
     current_user: dict = Depends(get_current_user)
 ):
     try:
-        print(f"\n=== UPLOAD MESSAGE FILE DEBUG ===")
-        print(f"File: {file.filename} ({file.content_type})")
-        print(f"Receiver ID: {receiver_id}")
-
-        # Dosya içeriğini oku
-        contents = await file.read()
-
-        # Güvenli metadata oluştur
-        metadata = {
-            "content_type": file.content_type,
-            "owner_id": str(current_user["id"]),
-            "receiver_id": receiver_id,
-            "upload_date": datetime.now(timezone.utc).isoformat(),  # ISO format kullan
-            "encrypted": True
-        }
-
-        # Dosyayı message_files koleksiyonuna kaydet
-        file_id = await message_files.upload_from_stream(
-            filename=file.filename,
-            source=io.BytesIO(contents),
-            metadata=metadata
+        logger.debug("File: %s (%s)", file.filename, file.content_type)
+        logger.debug("Receiver ID: %s", receiver_id)
+
+        # Aynı içerik daha önce gönderildiyse mevcut blob kullanılır,
+        # yoksa dosya message_files koleksiyonuna parça parça yazılır
+        blob = await store_blob(message_files, file, file.filename, file.content_type, encrypt=False)
+        ref = await create_file_ref(
+            message_files, blob, str(current_user["id"]), file.filename, file.content_type,
+            receiver_id=receiver_id
         )
-        
-        file_id_str = str(file_id)
+        file_id_str = str(ref["_id"])
+        # Sohbet balonundaki küçük resim mesaj gönderilirken hazırlanmaya başlar
+        rendition_service.schedule(message_files, blob["gridfs_id"], file.content_type)
 
         # Mesaj verisini oluştur
         message_data = {
             "sender_id": str(current_user["id"]),
             "receiver_id": receiver_id,
-            "content": f'[FILE:{{"id":"{file_id_str}","name":"{file.filename}","type":"{file.content_type}","size":{len(contents)}}}]',
-            "timestamp": datetime.now(timezone.utc).isoformat(),  # ISO format kullan
+            "content": f'[FILE:{{"id":"{file_id_str}","name":"{file.filename}","type":"{file.content_type}","size":{ref["size"]}}}]',
+            "timestamp": normalize_timestamp(datetime.now(timezone.utc)),  # Diğer mesajlarla aynı UTC biçimi
             "is_read": False,
             "encryption_type": encryption_type,
             "is_file": True,
-            "file_id": file_id_str
+            "file_id": file_id_str,
+            "conversation_id": conversation_key(current_user["id"], receiver_id)
         }
+        await assign_delivery_seqs([message_data])
 
         # Mesajı kaydet
         result = await messages_collection.insert_one(message_data)
+        message_data["id"] = str(result.inserted_id)
+        await update_conversation_summary(message_data)
         
         response_data = {
             "id": str(result.inserted_id),
@@ -498,76 +529,86 @@ async def upload_file(
             "file_id": message_data["file_id"]
         }
         
-        print(f"Message saved with ID: {response_data['id']}")
+        logger.debug("Message saved with ID: %s", response_data['id'])
         return response_data
 
     except Exception as e:
-        print(f"Error in upload_file: {str(e)}")
+        logger.error("Error in upload_file: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Dosya önizleme endpoint'i
 # messages.py dosyasında preview endpoint'ini şu şekilde güncelleyin:
 
 @router.get("/files/preview/{file_id}")
-async def preview_file(file_id: str, current_user: dict = Depends(get_current_user)):
+async def preview_file(
+    file_id: str,
+    request: Request,
+    size: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
     try:
-        print(f"\n=== PREVIEW MESSAGE FILE DEBUG ===")
-        print(f"File ID: {file_id}")
-        print(f"User ID: {current_user['id']}")
+        logger.debug("File ID: %s", file_id)
+        logger.debug("User ID: %s", current_user['id'])
+        if size is not None and size not in rendition_service.sizes:
+            raise HTTPException(status_code=400, detail="Geçersiz önizleme boyutu")
 
         # Dosya meta verilerini bul
-        file_info = await db['message_files.files'].find_one({'_id': ObjectId(file_id)})
-        if not file_info:
+        stored = await resolve_file(message_files, file_id)
+        if not stored:
             raise HTTPException(status_code=404, detail="Dosya bulunamadı")
 
         # Yetki kontrolü
-        metadata = file_info.get('metadata', {})
+        metadata = stored["metadata"]
         if (str(current_user["id"]) != metadata.get('owner_id') and 
             str(current_user["id"]) != metadata.get('receiver_id')):
             raise HTTPException(status_code=403, detail="Bu dosyaya erişim izniniz yok")
 
-        # Dosyayı oku
-        grid_out = await message_files.open_download_stream(ObjectId(file_id))
-        contents = await grid_out.read()
+        # Küçük resim istendiyse orijinal yerine (şifreli saklanan) türev gönderilir
+        if size is not None:
+            rendition = await rendition_response(request, message_files, stored, file_id, size)
+            if rendition is not None:
+                return rendition
 
-        # Eğer şifreliyse çöz
-        if metadata.get("is_encrypted"):
-            encryption_key = metadata.get("encryption_key")
-            if encryption_key:
-                contents = file_encryption_service.decrypt_file(contents, encryption_key)
+        # Dosyayı chunk chunk oku, şifreliyse parça parça çöz
+        grid_out = await message_files.open_download_stream(stored["gridfs_id"])
+        encryption_key = metadata.get("encryption_key") if metadata.get("is_encrypted") else None
+        chunks, decrypted = await open_plaintext_stream(grid_out, encryption_key)
 
-        print("File read successfully, sending response")
+        logger.debug("File opened successfully, streaming response")
         return StreamingResponse(
-            io.BytesIO(contents),
-            media_type=metadata.get("content_type", "application/octet-stream")
+            chunks,
+            media_type=metadata.get("content_type", "application/octet-stream"),
+            headers={"Content-Length": str(plaintext_length(grid_out, metadata, decrypted))}
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in preview message file: {str(e)}")
+        logger.error("Error in preview message file: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/files/{file_id}")
 async def get_message_file(file_id: str, current_user: dict = Depends(get_current_user)):
     try:
-        print(f"\n=== GET MESSAGE FILE DEBUG ===")
-        print(f"Getting file with ID: {file_id}")
-
-        # message_files bucket'ından dosyayı al
-        grid_out = await message_files.open_download_stream(ObjectId(file_id))
-        contents = await grid_out.read()
+        logger.debug("Getting file with ID: %s", file_id)
 
         # Meta verileri al
-        file_info = await db['message_files.files'].find_one({"_id": ObjectId(file_id)})
-        if not file_info:
+        stored = await resolve_file(message_files, file_id)
+        if not stored:
             raise HTTPException(status_code=404, detail="Dosya bulunamadı")
 
+        # message_files bucket'ından dosyayı chunk chunk gönder
+        grid_out = await message_files.open_download_stream(stored["gridfs_id"])
+        chunks, _ = await open_plaintext_stream(grid_out)
+
         return StreamingResponse(
-            io.BytesIO(contents),
-            media_type=file_info.get("metadata", {}).get("content_type", "application/octet-stream")
+            chunks,
+            media_type=stored["metadata"].get("content_type", "application/octet-stream"),
+            headers={"Content-Length": str(grid_out.length)}
         )
 
     except Exception as e:
-        print(f"Error in get_message_file: {str(e)}")
+        logger.error("Error in get_message_file: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/clear-rsa")
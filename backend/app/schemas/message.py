@@ -11,6 +11,10 @@ class MessageCreate(BaseModel):
     receiver_id: str
     encryption_type: str
 
+class ReadReceiptRequest(BaseModel):
+    up_to_message_id: Optional[str] = None
+    up_to_timestamp: Optional[str] = None
+
 class MessageResponse(BaseModel):
     id: str
     content: str
@@ -0,0 +1,360 @@
+# backend/app/services/broker.py
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# deliver(user_id, message, received_at) -> mesaj bu worker'daki en az bir
+# sokete gittiyse True. received_at (time.time()) teslim gecikmesi içindir.
+DeliverFn = Callable[[str, dict, Optional[float]], Awaitable[bool]]
+
+# Unix soket broker'ında tek bir çerçevenin (JSON satırı) üst sınırı
+FRAME_LIMIT = 16 * 1024 * 1024
+
+def _dumps(data: dict) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+class MessageBroker(ABC):
+    """
+    Kullanıcı id'sine göre yönlendirilen pub/sub arayüzü.
+    WebSocketManager bir kullanıcının bu worker'daki ilk soketi açılınca
+    subscribe(), sonuncusu kapanınca unsubscribe() çağırır; publish()
+    mesajı kullanıcının bağlı olduğu tüm worker'lara ulaştırır.
+    Backend'ler en az publish()'i uygular; start/stop ve abonelik
+    kayıtları için buradaki varsayılanlar super() ile kullanılır.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.deliver: Optional[DeliverFn] = None
+        self._local_users: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        self._tasks.clear()
+
+    def subscribe(self, user_id: str):
+        self._local_users.add(user_id)
+
+    def unsubscribe(self, user_id: str):
+        self._local_users.discard(user_id)
+
+    @abstractmethod
+    async def publish(self, user_id: str, message: dict, received_at: Optional[float] = None) -> bool:
+        """Mesajı kullanıcıya ilet; bir sokete ya da worker'a ulaştıysa True"""
+
+    async def _deliver_local(self, user_id: str, message: dict, received_at: Optional[float] = None) -> bool:
+        if user_id not in self._local_users or self.deliver is None:
+            return False
+        return await self.deliver(user_id, message, received_at)
+
+    def _spawn(self, coroutine: Awaitable):
+        try:
+            task = asyncio.get_running_loop().create_task(coroutine)
+        except RuntimeError:
+            # Event loop yoksa (ör. başlatılmamış broker) yapılacak iş de yok
+            coroutine.close()
+            return
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> dict:
+        return {"local_users": len(self._local_users)}
+
+class InProcessBroker(MessageBroker):
+    """Tek process için: mesaj doğrudan yerel soketlere gider"""
+
+    name = "memory"
+
+    async def publish(self, user_id: str, message: dict, received_at: Optional[float] = None) -> bool:
+        return await self._deliver_local(user_id, message, received_at)
+
+class UnixSocketBroker(MessageBroker):
+    """
+    Aynı makinedeki worker process'leri arasında broker.
+    Her worker socket_dir altında kendi Unix soketini dinler ve diğer
+    worker'lara bağlanır. Worker'lar hangi kullanıcıların kendilerine bağlı
+    olduğunu birbirine duyurur; mesaj sadece alıcının bağlı olduğu
+    worker'lara gönderilir. Çerçeveler satır sonuyla ayrılmış JSON'dur.
+    """
+
+    name = "unix"
+
+    def __init__(self, socket_dir: str):
+        super().__init__()
+        self.socket_dir = socket_dir
+        self.path = os.path.join(socket_dir, f"worker-{os.getpid()}.sock")
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: Dict[str, asyncio.StreamWriter] = {}  # giden bağlantılar
+        self._routes: Dict[str, Set[str]] = {}  # user_id -> worker soketleri
+        self._peer_users: Dict[str, Set[str]] = {}  # worker soketi -> user_id'ler
+
+    async def start(self):
+        os.makedirs(self.socket_dir, exist_ok=True)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(
+            self._handle_peer, path=self.path, limit=FRAME_LIMIT
+        )
+        for name in sorted(os.listdir(self.socket_dir)):
+            path = os.path.join(self.socket_dir, name)
+            if name.endswith(".sock") and path != self.path:
+                await self._connect_peer(path)
+        logger.info("Unix socket broker listening on %s (%s peers)", self.path, len(self._peers))
+
+    async def stop(self):
+        await super().stop()
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for path in list(self._peers):
+            self._drop_peer(path)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+
+    async def _connect_peer(self, path: str):
+        if path in self._peers or path == self.path:
+            return
+        try:
+            _, writer = await asyncio.open_unix_connection(path, limit=FRAME_LIMIT)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # Kapanmış bir worker'dan kalan soket dosyası
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+            return
+        except OSError as e:
+            logger.warning("Could not connect to broker peer %s: %s", path, e)
+            return
+
+        self._peers[path] = writer
+        self._write(path, {"op": "hello", "peer": self.path, "users": sorted(self._local_users)})
+
+    def _write(self, path: str, frame: dict) -> bool:
+        writer = self._peers.get(path)
+        if writer is None:
+            return False
+        try:
+            writer.write((_dumps(frame) + "\n").encode("utf-8"))
+            return True
+        except Exception as e:
+            logger.warning("Broker peer %s write failed: %s", path, e)
+            self._drop_peer(path)
+            return False
+
+    async def _send(self, path: str, frame: dict) -> bool:
+        if not self._write(path, frame):
+            return False
+        writer = self._peers.get(path)
+        try:
+            if writer is not None:
+                await writer.drain()
+            return True
+        except Exception as e:
+            logger.warning("Broker peer %s drain failed: %s", path, e)
+            self._drop_peer(path)
+            return False
+
+    def _broadcast(self, frame: dict):
+        for path in list(self._peers):
+            self._write(path, frame)
+
+    def _drop_peer(self, path: str):
+        writer = self._peers.pop(path, None)
+        if writer is not None:
+            writer.close()
+        for user_id in self._peer_users.pop(path, ()):
+            self._remove_route(user_id, path)
+
+    def _add_routes(self, path: str, user_ids: Iterable[str]):
+        users = self._peer_users.setdefault(path, set())
+        for user_id in user_ids:
+            users.add(user_id)
+            self._routes.setdefault(user_id, set()).add(path)
+
+    def _remove_route(self, user_id: str, path: str):
+        paths = self._routes.get(user_id)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del self._routes[user_id]
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                frame = json.loads(line)
+                op = frame.get("op")
+                if op == "hello":
+                    peer = frame["peer"]
+                    self._peer_users.pop(peer, None)
+                    self._add_routes(peer, frame.get("users", []))
+                    # Yeni worker'a bizdeki kullanıcıları duyurmak için geri bağlan
+                    if peer not in self._peers:
+                        await self._connect_peer(peer)
+                elif peer is None:
+                    continue
+                elif op == "sub":
+                    self._add_routes(peer, frame["users"])
+                elif op == "unsub":
+                    for user_id in frame["users"]:
+                        self._peer_users.get(peer, set()).discard(user_id)
+                        self._remove_route(user_id, peer)
+                elif op == "msg":
+                    await self._deliver_local(frame["user"], frame["data"], frame.get("received_at"))
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, KeyError) as e:
+            logger.warning("Broker peer %s connection error: %s", peer, e)
+        finally:
+            if peer is not None:
+                self._drop_peer(peer)
+            writer.close()
+
+    def subscribe(self, user_id: str):
+        if user_id not in self._local_users:
+            super().subscribe(user_id)
+            self._broadcast({"op": "sub", "users": [user_id]})
+
+    def unsubscribe(self, user_id: str):
+        if user_id in self._local_users:
+            super().unsubscribe(user_id)
+            self._broadcast({"op": "unsub", "users": [user_id]})
+
+    async def publish(self, user_id: str, message: dict, received_at: Optional[float] = None) -> bool:
+        """
+        Yerel soketlere doğrudan, diğer worker'lara çerçeve olarak gönder.
+        Uzak worker'a iletilen mesaj teslim edilmiş sayılır.
+        """
+        delivered = await self._deliver_local(user_id, message, received_at)
+        paths = self._routes.get(user_id)
+        if paths:
+            frame = {"op": "msg", "user": user_id, "data": message, "received_at": received_at}
+            for path in list(paths):
+                if await self._send(path, frame):
+                    delivered = True
+        return delivered
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "peers": len(self._peers),
+            "remote_users": len(self._routes)
+        }
+
+class RedisBroker(MessageBroker):
+    """
+    Redis (veya Redis protokolünü konuşan bir sunucu) pub/sub üzerinden
+    broker. Her kullanıcı için ayrı bir kanal kullanılır, böylece Redis
+    mesajı sadece o kullanıcıya abone olan worker'lara iletir.
+    'redis' paketi isteğe bağlıdır ve sadece bu backend seçilince gerekir.
+    """
+
+    name = "redis"
+    CHANNEL_PREFIX = "ws:user:"
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.url = url
+        # Kendi yayınladığımız mesajları tekrar teslim etmemek için
+        self.origin = uuid.uuid4().hex
+        self._redis = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def _channel(self, user_id: str) -> str:
+        return f"{self.CHANNEL_PREFIX}{user_id}"
+
+    async def start(self):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("BROKER_BACKEND=redis requires the 'redis' package") from e
+
+        self._redis = aioredis.from_url(self.url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        # Abone kullanıcı olmasa da bağlantı dinleme modunda kalsın
+        await self._pubsub.subscribe(
+            f"{self.CHANNEL_PREFIX}_broker",
+            *(self._channel(user_id) for user_id in self._local_users)
+        )
+        self._listener = asyncio.create_task(self._listen())
+        logger.info("Redis broker connected to %s", self.url)
+
+    async def stop(self):
+        await super().stop()
+        if self._listener is not None:
+            self._listener.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._listener
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+            self._pubsub = None
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    async def _listen(self):
+        async for item in self._pubsub.listen():
+            if item.get("type") != "message":
+                continue
+            try:
+                payload = json.loads(item["data"])
+                if payload.get("o") == self.origin:
+                    continue
+                channel = item["channel"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode("utf-8")
+                await self._deliver_local(channel[len(self.CHANNEL_PREFIX):], payload["d"], payload.get("r"))
+            except Exception as e:
+                logger.warning("Invalid broker message on %s: %s", item.get("channel"), e)
+
+    def subscribe(self, user_id: str):
+        if user_id not in self._local_users:
+            super().subscribe(user_id)
+            if self._pubsub is not None:
+                self._spawn(self._pubsub.subscribe(self._channel(user_id)))
+
+    def unsubscribe(self, user_id: str):
+        if user_id in self._local_users:
+            super().unsubscribe(user_id)
+            if self._pubsub is not None:
+                self._spawn(self._pubsub.unsubscribe(self._channel(user_id)))
+
+    async def publish(self, user_id: str, message: dict, received_at: Optional[float] = None) -> bool:
+        local = user_id in self._local_users
+        delivered = await self._deliver_local(user_id, message, received_at)
+        if self._redis is None:
+            return delivered
+
+        receivers = await self._redis.publish(
+            self._channel(user_id),
+            _dumps({"o": self.origin, "d": message, "r": received_at})
+        )
+        # Kendi aboneliğimiz de alıcı sayısına dahil
+        return delivered or receivers - (1 if local else 0) > 0
+
+def create_broker(backend: Optional[str] = None) -> MessageBroker:
+    """BROKER_BACKEND ayarına göre broker oluştur: memory, unix veya redis"""
+    backend = (backend or settings.BROKER_BACKEND).lower()
+    if backend == "memory":
+        return InProcessBroker()
+    if backend == "unix":
+        return UnixSocketBroker(settings.BROKER_SOCKET_DIR)
+    if backend == "redis":
+        return RedisBroker(settings.BROKER_URL)
+    raise ValueError(f"Unsupported broker backend: {backend}")
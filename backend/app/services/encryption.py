@@ -1,20 +1,242 @@
 # services/encryption.py
 
 import base64
+import re
+import string
 from Crypto.Cipher import AES, Blowfish, PKCS1_OAEP
 from Crypto.PublicKey import RSA
 from Crypto.Random import get_random_bytes
 from Crypto.Util.Padding import pad, unpad
-from typing import Tuple, Dict, Union
+from Crypto.Util.strxor import strxor
+from typing import Tuple, Dict, Union, List, NamedTuple, Optional
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+import asyncio
+from ..config import settings
+from .rsa_key_pool import rsa_key_pool
+from .key_cache import key_cache
+from .metrics import encryption_duration
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _cbc_decrypt(ecb_cipher, iv: bytes, encrypted: bytes, block_size: int) -> bytes:
+    """
+    Önbellekteki ECB cipher ile CBC çözme: P_i = D(C_i) XOR C_(i-1).
+    Anahtar genişletme her mesajda tekrar edilmez.
+    """
+    if not encrypted or len(encrypted) % block_size:
+        raise ValueError("Ciphertext length must be a multiple of the block size")
+    if len(iv) != block_size:
+        raise ValueError("Incorrect IV length")
+    return strxor(ecb_cipher.decrypt(encrypted), iv + encrypted[:-block_size])
+
+# Vigenere tabloları modül yüklenirken bir kez hazırlanır
+_VIGENERE_TR_LOWER = "ğüşıöç"
+_VIGENERE_TR_UPPER = "ĞÜŞİÖÇ"
+_VIGENERE_TR_EN = "GUSIOC"
+_VIGENERE_TR_PATTERN = re.compile(f"[{_VIGENERE_TR_LOWER}{_VIGENERE_TR_UPPER}]+")
+# Türkçe karakter konumlarında çözülen harfi Türkçe karşılığına çevirir
+_VIGENERE_TO_TURKISH = str.maketrans(
+    _VIGENERE_TR_EN + _VIGENERE_TR_EN.lower(),
+    _VIGENERE_TR_UPPER + _VIGENERE_TR_LOWER
+)
+
+def _vigenere_table(shift: int, turkish_output: bool) -> dict:
+    """
+    Harfleri `shift` kadar kaydıran, büyük/küçük harfi koruyan çeviri tablosu.
+    Türkçe harfler İngilizce karşılıkları üzerinden kaydırılır; şifrelemede
+    sonuç GUSIOC'den biriyse Türkçe harf olarak yazılır.
+    """
+    def shifted(letter: str) -> str:
+        return string.ascii_uppercase[(ord(letter) - ord('A') + shift) % 26]
+
+    table = {}
+    for upper in string.ascii_uppercase:
+        table[ord(upper)] = shifted(upper)
+        table[ord(upper.lower())] = shifted(upper).lower()
+
+    tr_upper_of = dict(zip(_VIGENERE_TR_EN, _VIGENERE_TR_UPPER))
+    tr_lower_of = dict(zip(_VIGENERE_TR_EN, _VIGENERE_TR_LOWER))
+    for en, tr_lower, tr_upper in zip(_VIGENERE_TR_EN, _VIGENERE_TR_LOWER, _VIGENERE_TR_UPPER):
+        result = shifted(en)
+        if turkish_output:
+            table[ord(tr_lower)] = tr_lower_of.get(result, result.lower())
+            table[ord(tr_upper)] = tr_upper_of.get(result, result)
+        else:
+            table[ord(tr_lower)] = result.lower()
+            table[ord(tr_upper)] = result
+    return table
+
+_VIGENERE_ENCRYPT_TABLES = [_vigenere_table(shift, True) for shift in range(26)]
+_VIGENERE_DECRYPT_TABLES = [_vigenere_table(shift, False) for shift in range(26)]
+
+def _vigenere_apply(text: str, key: str, tables: List[dict], direction: int) -> str:
+    """Anahtarın her konumu için metnin o konuma düşen dilimini tek translate ile kaydır"""
+    chars = list(text)
+    key_length = len(key)
+    for position, key_char in enumerate(key.upper()):
+        shift = (direction * (ord(key_char) - ord('A'))) % 26
+        chars[position::key_length] = text[position::key_length].translate(tables[shift])
+    return "".join(chars)
+
+def _vigenere_encode_tr_runs(message: str) -> str:
+    """Türkçe karakter bloklarını 'boşluk,uzunluk,...' çiftleri olarak kodla"""
+    runs = []
+    position = 0
+    for match in _VIGENERE_TR_PATTERN.finditer(message):
+        runs.append(f"{match.start() - position},{match.end() - match.start()}")
+        position = match.end()
+    return ",".join(runs)
+
+def _vigenere_restore_turkish(text: str, encoded_runs: str) -> str:
+    if not encoded_runs:
+        return text
+    values = [int(value) for value in encoded_runs.split(",")]
+    parts = []
+    position = 0
+    for gap, length in zip(values[::2], values[1::2]):
+        start = position + gap
+        parts.append(text[position:start])
+        parts.append(text[start:start + length].translate(_VIGENERE_TO_TURKISH))
+        position = start + length
+    if position > len(text):
+        raise ValueError("Turkish character runs do not match message length")
+    parts.append(text[position:])
+    return "".join(parts)
+
+class DecryptResult(NamedTuple):
+    """decrypt_many sonucu: çözülen içerik ya da hata mesajı"""
+    content: Optional[str]
+    error: Optional[str] = None
+
+def _decrypt_batch(encryption_type: str, items: List[Tuple[str, Dict]]) -> List[DecryptResult]:
+    """Aynı algoritmayla şifrelenmiş bir grup mesajı çöz (executor içinde çalışır)"""
+    results = []
+    for encrypted_content, encryption_data in items:
+        try:
+            results.append(DecryptResult(
+                encryption_service.decrypt_message(encryption_type, encrypted_content, encryption_data)
+            ))
+        except Exception as e:
+            results.append(DecryptResult(None, f"{type(e).__name__}: {str(e)}"))
+    return results
+
 class EncryptionService:
     def __init__(self):
         self.vigenere_key = "GUVENLI"  # Sabit Vigenere anahtarı
         self.rsa_keys = {}  # Kullanıcı bazlı RSA anahtarları
+        self._executor: Optional[Executor] = None
+        self._encrypt_executor: Optional[Executor] = None
+
+    # Tek giriş noktası: şifreleme türüne göre
+    def encrypt_message(self, encryption_type: str, content: str) -> Tuple[str, Dict]:
+        """Mesajı verilen yöntemle şifrele; (encrypted_content, encryption_data) döner"""
+        if encryption_type == "AES":
+            return self.encrypt_aes(content)
+        elif encryption_type == "BLOWFISH":
+            return self.encrypt_blowfish(content)
+        elif encryption_type == "RSA":
+            return self.encrypt_rsa(content)
+        elif encryption_type == "VIGENERE":
+            return self.encrypt_vigenere(content)
+        elif encryption_type == "BASE64":
+            return self.encrypt_base64(content)
+        raise ValueError(f"Unsupported encryption type: {encryption_type}")
+
+    def _get_encrypt_executor(self) -> Executor:
+        # RSA anahtar havuzu process'e özel olduğu için şifreleme thread'lerde yapılır
+        if self._encrypt_executor is None:
+            self._encrypt_executor = ThreadPoolExecutor(
+                max_workers=settings.INGEST_ENCRYPT_WORKERS,
+                thread_name_prefix="encrypt"
+            )
+        return self._encrypt_executor
+
+    async def encrypt_async(self, encryption_type: str, content: str) -> Tuple[str, Dict]:
+        """encrypt_message'ı event loop'u bloklamadan executor'da çalıştır"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_encrypt_executor(), self.encrypt_message, encryption_type, content
+        )
+
+    # Toplu şifre çözme
+    def decrypt_message(self, encryption_type: str, encrypted_content: str, encryption_data: Dict) -> str:
+        """Tek bir mesajı çöz; başarısız olursa exception fırlatır"""
+        if encryption_type == "AES":
+            return self._decrypt_aes(encrypted_content, encryption_data)
+        elif encryption_type == "BLOWFISH":
+            return self._decrypt_blowfish(encrypted_content, encryption_data)
+        elif encryption_type == "RSA":
+            return self._decrypt_rsa(encrypted_content, encryption_data)
+        elif encryption_type == "VIGENERE":
+            return self._decrypt_vigenere(encrypted_content, encryption_data)
+        elif encryption_type == "BASE64":
+            return self._decrypt_base64(encrypted_content, encryption_data)
+        raise ValueError(f"Unsupported encryption type: {encryption_type}")
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if settings.DECRYPT_EXECUTOR == "process":
+                self._executor = ProcessPoolExecutor(max_workers=settings.DECRYPT_WORKERS)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.DECRYPT_WORKERS,
+                    thread_name_prefix="decrypt"
+                )
+        return self._executor
+
+    async def decrypt_many(self, messages: List[Dict]) -> List[DecryptResult]:
+        """
+        Mesaj kayıtlarını encryption_type'a göre gruplayıp executor'da çöz.
+        Sonuçlar girişle aynı sırada döner; bir mesajın hatası diğerlerini
+        etkilemez. Şifreli içeriği olmayan kayıtların content alanı aynen döner.
+        """
+        results: List[Optional[DecryptResult]] = [None] * len(messages)
+        groups: Dict[str, List[int]] = {}
+
+        for index, msg in enumerate(messages):
+            encryption_type = msg.get("encryption_type")
+            if encryption_type and msg.get("encrypted_content"):
+                groups.setdefault(encryption_type, []).append(index)
+            else:
+                results[index] = DecryptResult(msg.get("content", ""))
+
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        batch_size = max(1, settings.DECRYPT_BATCH_SIZE)
+        batches = []
+        for encryption_type, indexes in groups.items():
+            for start in range(0, len(indexes), batch_size):
+                batch = indexes[start:start + batch_size]
+                items = [
+                    (messages[i]["encrypted_content"], messages[i].get("encryption_data"))
+                    for i in batch
+                ]
+                batches.append((batch, loop.run_in_executor(executor, _decrypt_batch, encryption_type, items)))
+
+        for batch, future in batches:
+            try:
+                batch_results = await future
+            except Exception as e:
+                # Executor'ın kendisi hata verirse sadece bu grup etkilenir
+                batch_results = [DecryptResult(None, f"{type(e).__name__}: {str(e)}")] * len(batch)
+            for index, result in zip(batch, batch_results):
+                results[index] = result
+
+        return results
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._encrypt_executor is not None:
+            self._encrypt_executor.shutdown(wait=False, cancel_futures=True)
+            self._encrypt_executor = None
 
     # AES Şifreleme
+    @encryption_duration.timed(algorithm="AES", operation="encrypt")
     def encrypt_aes(self, message: str) -> Tuple[str, Dict]:
         try:
-            print("\n=== AES Encryption Process Start ===")
             # 32 byte (256 bit) anahtar ve 16 byte IV oluştur
             key = get_random_bytes(32)
             cipher = AES.new(key, AES.MODE_CBC)
@@ -28,45 +250,52 @@ class EncryptionService:
             key_b64 = base64.b64encode(key).decode('utf-8')
             iv_b64 = base64.b64encode(cipher.iv).decode('utf-8')
             
-            print(f"Message Length: {len(message)} chars")
-            print(f"Encrypted Length: {len(encrypted_data)} bytes")
-            print("=== AES Encryption Process End ===\n")
+            logger.debug("Message Length: %s chars", len(message))
+            logger.debug("Encrypted Length: %s bytes", len(encrypted_data))
             
             return encrypted_b64, {'key': key_b64, 'iv': iv_b64}
             
         except Exception as e:
-            print(f"AES encryption error: {str(e)}")
+            logger.error("AES encryption error: %s", e)
             raise e
 
     def decrypt_aes(self, encrypted_message: str, encryption_data: Dict) -> str:
         try:
-            print("\n=== AES Decryption Process Start ===")
+            return self._decrypt_aes(encrypted_message, encryption_data)
+        except Exception as e:
+            return f"Decrypt Error: {str(e)}"
+
+    @encryption_duration.timed(algorithm="AES", operation="decrypt")
+    def _decrypt_aes(self, encrypted_message: str, encryption_data: Dict) -> str:
+        try:
             # Base64 decode
             encrypted = base64.b64decode(encrypted_message)
-            key = base64.b64decode(encryption_data['key'])
+            key_b64 = encryption_data['key']
             iv = base64.b64decode(encryption_data['iv'])
             
-            print(f"Encrypted Length: {len(encrypted)} bytes")
+            logger.debug("Encrypted Length: %s bytes", len(encrypted))
             
-            # Deşifreleme
-            cipher = AES.new(key, AES.MODE_CBC, iv)
-            decrypted_padded = cipher.decrypt(encrypted)
+            # Deşifreleme (anahtarı genişletilmiş cipher önbellekten gelir)
+            cipher = key_cache.get_or_create(
+                "AES", key_b64,
+                lambda: AES.new(base64.b64decode(key_b64), AES.MODE_ECB)
+            )
+            decrypted_padded = _cbc_decrypt(cipher, iv, encrypted, AES.block_size)
             decrypted = unpad(decrypted_padded, AES.block_size)
             decrypted_text = decrypted.decode('utf-8')
             
-            print(f"Decrypted Length: {len(decrypted_text)} chars")
-            print("=== AES Decryption Process End ===\n")
+            logger.debug("Decrypted Length: %s chars", len(decrypted_text))
             
             return decrypted_text
             
         except Exception as e:
-            print(f"AES decryption error: {str(e)}")
-            return f"Decrypt Error: {str(e)}"
+            logger.debug("AES decryption error: %s", e)
+            raise e
 
     # Blowfish Şifreleme
+    @encryption_duration.timed(algorithm="BLOWFISH", operation="encrypt")
     def encrypt_blowfish(self, message: str) -> Tuple[str, Dict]:
         try:
-            print("\n=== Blowfish Encryption Process Start ===")
             # 16 byte anahtar ve 8 byte IV oluştur
             key = get_random_bytes(16)
             iv = get_random_bytes(8)
@@ -81,68 +310,70 @@ class EncryptionService:
             key_b64 = base64.b64encode(key).decode('utf-8')
             iv_b64 = base64.b64encode(iv).decode('utf-8')
             
-            print(f"Message Length: {len(message)} chars")
-            print(f"Encrypted Length: {len(encrypted_data)} bytes")
-            print("=== Blowfish Encryption Process End ===\n")
+            logger.debug("Message Length: %s chars", len(message))
+            logger.debug("Encrypted Length: %s bytes", len(encrypted_data))
             
             return encrypted_b64, {'key': key_b64, 'iv': iv_b64}
             
         except Exception as e:
-            print(f"Blowfish encryption error: {str(e)}")
+            logger.error("Blowfish encryption error: %s", e)
             raise e
 
     def decrypt_blowfish(self, encrypted_message: str, encryption_data: Dict) -> str:
         try:
-            print("\n=== Blowfish Decryption Process Start ===")
+            return self._decrypt_blowfish(encrypted_message, encryption_data)
+        except Exception as e:
+            return f"Decrypt Error: {str(e)}"
+
+    @encryption_duration.timed(algorithm="BLOWFISH", operation="decrypt")
+    def _decrypt_blowfish(self, encrypted_message: str, encryption_data: Dict) -> str:
+        try:
             # Base64 decode
             encrypted = base64.b64decode(encrypted_message)
-            key = base64.b64decode(encryption_data['key'])
+            key_b64 = encryption_data['key']
             iv = base64.b64decode(encryption_data['iv'])
             
-            print(f"Encrypted Length: {len(encrypted)} bytes")
+            logger.debug("Encrypted Length: %s bytes", len(encrypted))
             
-            # Deşifreleme
-            cipher = Blowfish.new(key, Blowfish.MODE_CBC, iv)
-            decrypted_padded = cipher.decrypt(encrypted)
+            # Deşifreleme (anahtarı genişletilmiş cipher önbellekten gelir)
+            cipher = key_cache.get_or_create(
+                "BLOWFISH", key_b64,
+                lambda: Blowfish.new(base64.b64decode(key_b64), Blowfish.MODE_ECB)
+            )
+            decrypted_padded = _cbc_decrypt(cipher, iv, encrypted, Blowfish.block_size)
             decrypted = unpad(decrypted_padded, Blowfish.block_size)
             decrypted_text = decrypted.decode('utf-8')
             
-            print(f"Decrypted Length: {len(decrypted_text)} chars")
-            print("=== Blowfish Decryption Process End ===\n")
+            logger.debug("Decrypted Length: %s chars", len(decrypted_text))
             
             return decrypted_text
             
         except Exception as e:
-            print(f"Blowfish decryption error: {str(e)}")
-            return f"Decrypt Error: {str(e)}"
+            logger.debug("Blowfish decryption error: %s", e)
+            raise e
 
     # RSA Şifreleme
+    @encryption_duration.timed(algorithm="RSA", operation="encrypt")
     def encrypt_rsa(self, message: str) -> Tuple[str, Dict]:
         try:
-            print("\n=== RSA Encryption Process Start ===")
             
-            # RSA anahtar çifti oluştur
-            key = RSA.generate(2048)
+            # Önceden üretilmiş anahtar çiftini havuzdan al
+            private_key_pem, public_key_pem = rsa_key_pool.acquire()
             
             # Mesajı şifrele
-            cipher = PKCS1_OAEP.new(key)
+            cipher = PKCS1_OAEP.new(RSA.import_key(public_key_pem))
             message_bytes = message.encode('utf-8')
             encrypted = cipher.encrypt(message_bytes)
             
-            # Anahtarları PEM formatında sakla
-            private_key_pem = key.export_key(format='PEM')
-            public_key_pem = key.publickey().export_key(format='PEM')
-            
             # Base64 encoding
             encrypted_b64 = base64.b64encode(encrypted).decode('utf-8')
             private_key_b64 = base64.b64encode(private_key_pem).decode('utf-8')
             public_key_b64 = base64.b64encode(public_key_pem).decode('utf-8')
             
-            print(f"Message Length: {len(message_bytes)} bytes")
-            print(f"Private Key Length: {len(private_key_pem)} bytes")
-            print(f"Public Key Length: {len(public_key_pem)} bytes")
-            print(f"Encrypted Length: {len(encrypted)} bytes")
-            print("=== RSA Encryption Process End ===\n")
+            logger.debug("Message Length: %s bytes", len(message_bytes))
+            logger.debug("Private Key Length: %s bytes", len(private_key_pem))
+            logger.debug("Public Key Length: %s bytes", len(public_key_pem))
+            logger.debug("Encrypted Length: %s bytes", len(encrypted))
             
             return encrypted_b64, {
                 'private_key': private_key_b64,
@@ -150,12 +381,18 @@ class EncryptionService:
             }
             
         except Exception as e:
-            print(f"RSA encryption error: {str(e)}")
+            logger.error("RSA encryption error: %s", e)
             raise e
 
     def decrypt_rsa(self, encrypted_message: str, encryption_data: Dict) -> str:
         try:
-            print("\n=== RSA Decryption Process Start ===")
+            return self._decrypt_rsa(encrypted_message, encryption_data)
+        except Exception as e:
+            return f"Decrypt Error: {str(e)}"
+
+    @encryption_duration.timed(algorithm="RSA", operation="decrypt")
+    def _decrypt_rsa(self, encrypted_message: str, encryption_data: Dict) -> str:
+        try:
             
             # RSA şifre çözme
             encrypted = base64.b64decode(encrypted_message)
@@ -163,106 +400,74 @@ class EncryptionService:
             if not key_data:
                 raise ValueError("Private key not found in encryption data")
                 
-            private_key_pem = base64.b64decode(key_data)
-            
-            print(f"Encrypted Length: {len(encrypted)} bytes")
-            print(f"Private Key Length: {len(private_key_pem)} bytes")
+            logger.debug("Encrypted Length: %s bytes", len(encrypted))
             
-            # Private key'i yükle
-            private_key = RSA.import_key(private_key_pem)
+            # Private key'i yükle (ayrıştırılmış anahtar önbellekten gelir)
+            cipher = key_cache.get_or_create(
+                "RSA", key_data,
+                lambda: PKCS1_OAEP.new(RSA.import_key(base64.b64decode(key_data)))
+            )
             
             # Deşifreleme
-            cipher = PKCS1_OAEP.new(private_key)
             decrypted = cipher.decrypt(encrypted)
             decrypted_text = decrypted.decode('utf-8')
             
-            print(f"Decrypted Length: {len(decrypted_text)} chars")
-            print("=== RSA Decryption Process End ===\n")
+            logger.debug("Decrypted Length: %s chars", len(decrypted_text))
             
             return decrypted_text
             
         except Exception as e:
-            print(f"RSA decryption error: {str(e)}")
-            return f"Decrypt Error: {str(e)}"
+            logger.debug("RSA decryption error: %s", e)
+            raise e
         
-    # RSA şifreleme
-    def encrypt_rsa(message: str, public_key) -> bytes:
-        cipher = PKCS1_OAEP.new(public_key)
-        return cipher.encrypt(message.encode())
-    
     # Vigenere Şifreleme
+    @encryption_duration.timed(algorithm="VIGENERE", operation="encrypt")
     def encrypt_vigenere(self, message: str) -> Tuple[str, Dict]:
         try:
-            print("\n=== Vigenere Encryption Process Start ===")
-            result = []
             key = self.vigenere_key
-            key_length = len(key)
             
-            # Türkçe karakter eşleştirme tablosu
-            tr_chars = "ĞÜŞİÖÇğüşıöç"
-            en_chars = "GUSIOCgusioc"
-            tr_to_en_map = dict(zip(tr_chars, en_chars))
-            en_to_tr_map = dict(zip(en_chars, tr_chars))
+            # Büyük/küçük harf şifreli metinde korunur; sadece Türkçe karakter
+            # konumları run-length olarak saklanır
+            encrypted = _vigenere_apply(message, key, _VIGENERE_ENCRYPT_TABLES, 1)
+            tr_runs = _vigenere_encode_tr_runs(message)
             
-            print(f"Original Message: {message}")
-            print(f"Key: {key}")
+            logger.debug("Message Length: %s chars", len(message))
             
-            # Büyük/küçük harf ve Türkçe karakter bilgisini sakla
-            char_info = []
-            message_conv = ""
-            for c in message:
-                if c in tr_chars:
-                    # Türkçe karakter
-                    char_info.append(('tr', c in "ĞÜŞİÖÇ"))  # True if uppercase
-                    message_conv += tr_to_en_map[c]
-                else:
-                    # Normal karakter
-                    char_info.append(('en', c.isupper()))
-                    message_conv += c
+            return encrypted, {'key': key, 'tr_runs': tr_runs}
             
-            # Şifreleme için mesajı ve anahtarı büyük harfe çevir
-            message_upper = message_conv.upper()
-            key_upper = key.upper()
+        except Exception as e:
+            logger.error("Vigenere encryption error: %s", e)
+            raise e
+        
+
+    def decrypt_vigenere(self, encrypted_message: str, encryption_data: Dict) -> str:
+        try:
+            return self._decrypt_vigenere(encrypted_message, encryption_data)
+        except Exception as e:
+            return f"Decrypt Error: {str(e)}"
+
+    @encryption_duration.timed(algorithm="VIGENERE", operation="decrypt")
+    def _decrypt_vigenere(self, encrypted_message: str, encryption_data: Dict) -> str:
+        # char_info listesi içeren eski kayıtlar eski yöntemle çözülür
+        if 'tr_runs' not in encryption_data:
+            return self._decrypt_vigenere_legacy(encrypted_message, encryption_data)
+        try:
+            key = encryption_data['key']
             
-            for i, char in enumerate(message_upper):
-                if char.isalpha():
-                    # Alfabetik karakterler için şifreleme
-                    key_char = key_upper[i % key_length]
-                    # Şifreleme formülü: (mesaj_char + anahtar_char) mod 26
-                    shifted = (ord(char) - ord('A') + ord(key_char) - ord('A')) % 26
-                    shifted_char = chr(shifted + ord('A'))
-                    
-                    # Orijinal karakter bilgisini kullanarak formatı geri yükle
-                    char_type, is_upper = char_info[i]
-                    if char_type == 'tr':
-                        # Türkçe karakter ise
-                        if shifted_char in en_chars:
-                            tr_char = en_to_tr_map[shifted_char]
-                            result.append(tr_char if is_upper else tr_char.lower())
-                        else:
-                            result.append(shifted_char if is_upper else shifted_char.lower())
-                    else:
-                        # Normal karakter ise
-                        result.append(shifted_char if is_upper else shifted_char.lower())
-                else:
-                    # Alfabetik olmayan karakterleri olduğu gibi bırak
-                    result.append(char)
+            decrypted = _vigenere_apply(encrypted_message, key, _VIGENERE_DECRYPT_TABLES, -1)
+            decrypted = _vigenere_restore_turkish(decrypted, encryption_data['tr_runs'])
             
-            encrypted = ''.join(result)
-            print(f"Message Length: {len(message)} chars")
-            print(f"Encrypted Message: {encrypted}")
-            print("=== Vigenere Encryption Process End ===\n")
+            logger.debug("Message Length: %s chars", len(encrypted_message))
             
-            return encrypted, {'key': key, 'char_info': char_info}
+            return decrypted
             
         except Exception as e:
-            print(f"Vigenere encryption error: {str(e)}")
+            logger.debug("Vigenere decryption error: %s", e)
             raise e
-        
 
-    def decrypt_vigenere(self, encrypted_message: str, encryption_data: Dict) -> str:
+    def _decrypt_vigenere_legacy(self, encrypted_message: str, encryption_data: Dict) -> str:
+        """Karakter başına char_info tutan eski Vigenere formatını çöz"""
         try:
-            print("\n=== Vigenere Decryption Process Start ===")
             result = []
             key = encryption_data['key']
             char_info = encryption_data.get('char_info', [('en', True)] * len(encrypted_message))
@@ -274,8 +479,8 @@ class EncryptionService:
             tr_to_en_map = dict(zip(tr_chars, en_chars))
             en_to_tr_map = dict(zip(en_chars, tr_chars))
             
-            print(f"Encrypted Message: {encrypted_message}")
-            print(f"Key: {key}")
+            logger.debug("Message Length: %s chars", len(encrypted_message))
+            logger.debug("Key Length: %s chars", len(key))
             
             # Şifreli mesajı İngilizce karakterlere dönüştür
             encrypted_conv = ""
@@ -317,48 +522,50 @@ class EncryptionService:
                     result.append(char)
             
             decrypted = ''.join(result)
-            print(f"Message Length: {len(encrypted_message)} chars")
-            print(f"Decrypted Message: {decrypted}")
-            print("=== Vigenere Decryption Process End ===\n")
+            logger.debug("Decrypted Length: %s chars", len(decrypted))
             
             return decrypted
             
         except Exception as e:
-            print(f"Vigenere decryption error: {str(e)}")
-            return f"Decrypt Error: {str(e)}"
+            logger.debug("Vigenere decryption error: %s", e)
+            raise e
         
     
     # Base64 Encoding
+    @encryption_duration.timed(algorithm="BASE64", operation="encrypt")
     def encrypt_base64(self, message: str) -> Tuple[str, Dict]:
         try:
-            print("\n=== Base64 Encoding Process Start ===")
             encoded = base64.b64encode(message.encode()).decode()
             
-            print(f"Message Length: {len(message)} chars")
-            print(f"Encoded Length: {len(encoded)} chars")
-            print("=== Base64 Encoding Process End ===\n")
+            logger.debug("Message Length: %s chars", len(message))
+            logger.debug("Encoded Length: %s chars", len(encoded))
             
             return encoded, {}
             
         except Exception as e:
-            print(f"Base64 encoding error: {str(e)}")
+            logger.error("Base64 encoding error: %s", e)
             raise e
 
     def decrypt_base64(self, encoded_message: str, encryption_data: Dict = None) -> str:
         try:
-            print("\n=== Base64 Decoding Process Start ===")
-            print(f"Encoded Length: {len(encoded_message)} chars")
+            return self._decrypt_base64(encoded_message, encryption_data)
+        except Exception as e:
+            return f"Decode Error: {str(e)}"
+
+    @encryption_duration.timed(algorithm="BASE64", operation="decrypt")
+    def _decrypt_base64(self, encoded_message: str, encryption_data: Dict = None) -> str:
+        try:
+            logger.debug("Encoded Length: %s chars", len(encoded_message))
             
             decoded = base64.b64decode(encoded_message).decode()
             
-            print(f"Decoded Length: {len(decoded)} chars")
-            print("=== Base64 Decoding Process End ===\n")
+            logger.debug("Decoded Length: %s chars", len(decoded))
             
             return decoded
             
         except Exception as e:
-            print(f"Base64 decoding error: {str(e)}")
-            return f"Decode Error: {str(e)}"
+            logger.debug("Base64 decoding error: %s", e)
+            raise e
     
     def encrypt_image(self, image_data: bytes):
         """Resim verilerini AES ile şifreler."""
@@ -389,7 +596,7 @@ class EncryptionService:
             decrypted_data = unpad(decrypted_padded, AES.block_size)
             return decrypted_data
         except Exception as e:
-            print(f"Error decrypting image: {str(e)}")
+            logger.warning("Error decrypting image: %s", e)
             return encrypted_data  # Hata durumunda orijinal veriyi döndür
         
     def encrypt_binary_aes(self, binary_data: bytes):
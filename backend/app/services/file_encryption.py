@@ -1,44 +1,335 @@
 # backend/app/services/file_encryption.py
-from cryptography.fernet import Fernet
+from cryptography.exceptions import InvalidSignature, InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes, padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.hmac import HMAC
+from typing import Tuple, Union
 import base64
+import os
+import struct
+from ..config import settings
+from .metrics import encryption_duration
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Segmentli AEAD konteyneri (v1)
+#
+#   header  = magic(4) | version(1) | record_size(4, BE) | nonce_prefix(7)
+#   record0 = header | AES-256-GCM(segment 0) | tag(16)
+#   recordN = AES-256-GCM(segment N) | tag(16)
+#
+# Her kayıt tam record_size byte'tır (sonuncusu hariç) ve record_size GridFS
+# chunk boyutuyla aynı seçilir; böylece N. segment N. chunk'tır. Nonce =
+# nonce_prefix | segment no (4, BE) | son segment bayrağı (1); header her
+# segmente AAD olarak bağlanır. Segment sırası değiştirilemez, dosya
+# kesilirse son segment bayrağı tutmadığı için fark edilir.
+AEAD_MAGIC = b"\x89SEG"
+AEAD_VERSION = 1
+AEAD_HEADER = struct.Struct(">4sBI7s")
+AEAD_TAG_SIZE = 16
+
+# Fernet token'ı base64 (0x80 sürüm byte'ı + 8 byte zaman) ile başlar; zamanın
+# üst byte'ları sıfır olduğundan token'lar bu önekle başlar
+FERNET_PREFIX = b"gAAAAA"
+
+def detect_format(head: bytes) -> str:
+    """Dosyanın ilk byte'larından şifreleme formatını belirle: 'aead' veya 'fernet'"""
+    return "aead" if head[:len(AEAD_MAGIC)] == AEAD_MAGIC else "fernet"
+
+def looks_encrypted(head: bytes) -> bool:
+    """İlk byte'lar AEAD header'ı ya da Fernet token'ı gibi görünüyor mu"""
+    return head[:len(AEAD_MAGIC)] == AEAD_MAGIC or head[:len(FERNET_PREFIX)] == FERNET_PREFIX
+
+class SegmentedFormat:
+    """Bir dosyanın segment düzeni ve segment bazında şifreleme/çözme"""
+
+    def __init__(self, key: bytes, record_size: int, nonce_prefix: bytes):
+        if record_size <= AEAD_HEADER.size + AEAD_TAG_SIZE:
+            raise ValueError(f"Record size too small: {record_size}")
+        self.record_size = record_size
+        self.nonce_prefix = nonce_prefix
+        self.header = AEAD_HEADER.pack(AEAD_MAGIC, AEAD_VERSION, record_size, nonce_prefix)
+        self._aead = AESGCM(key)
+
+    @classmethod
+    def new(cls, key: bytes, record_size: int) -> "SegmentedFormat":
+        return cls(key, record_size, os.urandom(7))
+
+    @classmethod
+    def from_header(cls, key: bytes, data: bytes) -> "SegmentedFormat":
+        if len(data) < AEAD_HEADER.size:
+            raise InvalidToken
+        magic, version, record_size, nonce_prefix = AEAD_HEADER.unpack_from(data)
+        if magic != AEAD_MAGIC or version != AEAD_VERSION:
+            raise InvalidToken
+        try:
+            return cls(key, record_size, nonce_prefix)
+        except ValueError as e:
+            raise InvalidToken from e
+
+    def capacity(self, index: int) -> int:
+        """index. segmentin alabileceği düz içerik boyutu"""
+        overhead = AEAD_TAG_SIZE + (AEAD_HEADER.size if index == 0 else 0)
+        return self.record_size - overhead
+
+    def segment_count(self, stored_length: int) -> int:
+        return max(1, -(-stored_length // self.record_size))
+
+    def plaintext_length(self, stored_length: int) -> int:
+        return stored_length - AEAD_HEADER.size - self.segment_count(stored_length) * AEAD_TAG_SIZE
+
+    def plaintext_offset(self, index: int) -> int:
+        """index. segmentin düz içerikteki başlangıç konumu"""
+        return 0 if index == 0 else self.capacity(0) + (index - 1) * self.capacity(1)
+
+    def locate(self, offset: int) -> Tuple[int, int]:
+        """Düz içerikteki offset -> (segment no, segment içindeki konum)"""
+        first = self.capacity(0)
+        if offset < first:
+            return 0, offset
+        index, within = divmod(offset - first, self.capacity(1))
+        return index + 1, within
+
+    def _nonce(self, index: int, last: bool) -> bytes:
+        return self.nonce_prefix + struct.pack(">IB", index, 1 if last else 0)
+
+    def seal(self, index: int, plaintext: bytes, last: bool) -> bytes:
+        return self._aead.encrypt(self._nonce(index, last), plaintext, self.header)
+
+    def open(self, index: int, ciphertext: bytes, last: bool) -> bytes:
+        """Tek segmenti çöz; record0 için header'sız kısım verilmelidir"""
+        try:
+            return self._aead.decrypt(self._nonce(index, last), ciphertext, self.header)
+        except InvalidTag as e:
+            raise InvalidToken from e
+
+    def open_record(self, index: int, record: bytes, last: bool) -> bytes:
+        """GridFS chunk'ını (kaydı) olduğu gibi çöz"""
+        if index == 0:
+            record = record[AEAD_HEADER.size:]
+        return self.open(index, record, last)
+
+class SegmentedEncryptor:
+    """
+    Düz içeriği segment kapasitesi kadar biriktirip kayıt kayıt şifreler.
+    Son segment finalize()'da yazılır; bu yüzden tam dolu bir segment bir
+    sonraki parça gelene kadar bekletilir. Bellekte en fazla bir segment
+    ve gelen parça tutulur.
+    """
+
+    def __init__(self, fmt: SegmentedFormat):
+        self.format = fmt
+        self._index = 0
+        self._buffer = b""
+
+    def _emit(self, plaintext: bytes, last: bool) -> bytes:
+        record = self.format.seal(self._index, plaintext, last)
+        if self._index == 0:
+            record = self.format.header + record
+        self._index += 1
+        return record
+
+    def update(self, chunk: bytes) -> bytes:
+        self._buffer += chunk
+        records = []
+        while len(self._buffer) > self.format.capacity(self._index):
+            capacity = self.format.capacity(self._index)
+            segment, self._buffer = self._buffer[:capacity], self._buffer[capacity:]
+            records.append(self._emit(segment, last=False))
+        return b"".join(records)
+
+    def finalize(self) -> bytes:
+        record = self._emit(self._buffer, last=True)
+        self._buffer = b""
+        return record
+
+class SegmentedDecryptor:
+    """
+    Segmentli konteyneri baştan sona parça parça çözer. Bir kaydın son
+    kayıt olup olmadığı ancak arkasından veri gelince anlaşılır; bu yüzden
+    tam bir kayıt ancak fazlası geldiğinde çözülür, kalan finalize()'da.
+    Her segment kendi tag'i ile doğrulandıktan sonra verilir.
+    """
+
+    def __init__(self, key: bytes):
+        self._key = key
+        self.format = None
+        self._index = 0
+        self._buffer = b""
+
+    def _record_length(self) -> int:
+        return self.format.record_size - (AEAD_HEADER.size if self._index == 0 else 0)
+
+    def update(self, chunk: bytes) -> bytes:
+        self._buffer += chunk
+        if self.format is None:
+            if len(self._buffer) < AEAD_HEADER.size:
+                return b""
+            self.format = SegmentedFormat.from_header(self._key, self._buffer)
+            self._buffer = self._buffer[AEAD_HEADER.size:]
+
+        plaintext = []
+        while len(self._buffer) > self._record_length():
+            length = self._record_length()
+            record, self._buffer = self._buffer[:length], self._buffer[length:]
+            plaintext.append(self.format.open(self._index, record, last=False))
+            self._index += 1
+        return b"".join(plaintext)
+
+    def finalize(self) -> bytes:
+        if self.format is None:
+            raise InvalidToken
+        plaintext = self.format.open(self._index, self._buffer, last=True)
+        self._buffer = b""
+        return plaintext
+
+class FernetStreamDecryptor:
+    """
+    Eski (Fernet) formatındaki dosyalar için. Parça parça gelen Fernet
+    token'ını çözer. Token'ın son 32 byte'ı HMAC
+    olduğu için her adımda geri tutulur; HMAC finalize() içinde doğrulanır
+    ve uyuşmazsa InvalidToken fırlatılır. Bu yüzden o ana kadar verilen
+    düz içerik ancak finalize() başarılı olursa geçerli sayılmalıdır;
+    istemciye gönderilmeden önce dosya FernetStreamVerifier ile doğrulanır.
+    """
+
+    HEADER_SIZE = 25  # 0x80 + 8 byte zaman + 16 byte IV
+    HMAC_SIZE = 32
+
+    def __init__(self, key: bytes):
+        try:
+            raw_key = base64.urlsafe_b64decode(key)
+        except ValueError as e:
+            raise InvalidToken from e
+        if len(raw_key) != 32:
+            raise InvalidToken
+        self._encryption_key = raw_key[16:]
+        self._hmac = HMAC(raw_key[:16], hashes.SHA256())
+        self._unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
+        self._decryptor = None
+        self._encoded = b""  # 4'lü base64 grubunu tamamlamamış karakterler
+        self._buffer = b""   # henüz işlenmemiş token byte'ları
+
+    def _decode(self, data: bytes, final: bool = False) -> bytes:
+        data = self._encoded + data
+        cut = len(data) if final else len(data) - len(data) % 4
+        self._encoded = data[cut:]
+        try:
+            return base64.urlsafe_b64decode(data[:cut])
+        except ValueError as e:
+            raise InvalidToken from e
+
+    def update(self, chunk: bytes) -> bytes:
+        self._buffer += self._decode(chunk)
+        if self._decryptor is None:
+            if len(self._buffer) < self.HEADER_SIZE:
+                return b""
+            header, self._buffer = self._buffer[:self.HEADER_SIZE], self._buffer[self.HEADER_SIZE:]
+            if header[0] != 0x80:
+                raise InvalidToken
+            self._hmac.update(header)
+            self._decryptor = Cipher(algorithms.AES(self._encryption_key), modes.CBC(header[9:])).decryptor()
+
+        cut = len(self._buffer) - self.HMAC_SIZE
+        if cut <= 0:
+            return b""
+        ciphertext, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        self._hmac.update(ciphertext)
+        return self._decrypt(ciphertext)
+
+    def _decrypt(self, ciphertext: bytes) -> bytes:
+        return self._unpadder.update(self._decryptor.update(ciphertext))
+
+    def _finish(self) -> bytes:
+        return self._unpadder.update(self._decryptor.finalize()) + self._unpadder.finalize()
+
+    def finalize(self) -> bytes:
+        self._buffer += self._decode(b"", final=True)
+        if self._decryptor is None or len(self._buffer) != self.HMAC_SIZE:
+            raise InvalidToken
+        try:
+            self._hmac.verify(self._buffer)
+            return self._finish()
+        except (InvalidSignature, ValueError) as e:
+            raise InvalidToken from e
+
+class FernetStreamVerifier(FernetStreamDecryptor):
+    """
+    Fernet token'ının sadece HMAC'ini parça parça doğrular (AES çözme
+    yapılmaz). Eski dosyalarda düz içerik istemciye gitmeden önce tüm
+    dosya bununla doğrulanır; uyuşmazsa finalize() InvalidToken fırlatır.
+    """
+
+    def _decrypt(self, ciphertext: bytes) -> bytes:
+        return b""
+
+    def _finish(self) -> bytes:
+        return b""
+
+StreamDecryptor = Union[SegmentedDecryptor, FernetStreamDecryptor]
 
 class FileEncryptionService:
-    def __init__(self):
-        self.fernet = None
+    """
+    Dosyalar segmentli AEAD konteyneriyle şifrelenir; anahtar base64 olarak
+    metadata'da saklanır. Eski Fernet dosyaları ilk byte'larından tanınıp
+    çözülmeye devam eder.
+    """
 
-    def encrypt_file(self, file_contents: bytes) -> tuple[bytes, str]:
+    def __init__(self, record_size: int = settings.GRIDFS_CHUNK_SIZE):
+        self.record_size = record_size
+
+    def encrypt_stream(self) -> Tuple[SegmentedEncryptor, str]:
+        """
+        Parça parça şifreleme için encryptor ve saklanacak key döndür.
+        Kayıtlar GridFS chunk boyutunda olduğu için upload da aynı chunk
+        boyutuyla yapılmalıdır.
+        """
+        key = AESGCM.generate_key(bit_length=256)
+        encryptor = SegmentedEncryptor(SegmentedFormat.new(key, self.record_size))
+        return encryptor, base64.b64encode(key).decode('utf-8')
+
+    @encryption_duration.timed(algorithm="AES-GCM", operation="encrypt")
+    def encrypt_file(self, file_contents: bytes) -> Tuple[bytes, str]:
         """
         Dosya içeriğini şifrele
         Returns: (encrypted_content, key)
         """
-        # Her dosya için yeni bir key oluştur
-        key = Fernet.generate_key()
-        fernet = Fernet(key)
-        
-        try:
-            # Direkt olarak bytes'ı şifrele
-            encrypted_contents = fernet.encrypt(file_contents)
-            # Key'i string olarak sakla
-            key_str = base64.b64encode(key).decode('utf-8')
-            return encrypted_contents, key_str
-        except Exception as e:
-            print(f"Encryption error: {str(e)}")
-            raise e
+        encryptor, key = self.encrypt_stream()
+        return encryptor.update(file_contents) + encryptor.finalize(), key
+
+    def decrypt_stream(self, key: str, head: bytes) -> StreamDecryptor:
+        """
+        decrypt_file'ın parça parça çalışan karşılığı. Format, dosyanın ilk
+        byte'larına (head) bakılarak seçilir.
+        """
+        key_bytes = base64.b64decode(key.encode('utf-8'))
+        if detect_format(head) == "aead":
+            return SegmentedDecryptor(key_bytes)
+        return FernetStreamDecryptor(key_bytes)
+
+    def verify_stream(self, key: str) -> FernetStreamVerifier:
+        """Eski Fernet dosyası için HMAC doğrulayıcı (update/finalize)"""
+        return FernetStreamVerifier(base64.b64decode(key.encode('utf-8')))
+
+    def segment_format(self, key: str, head: bytes) -> SegmentedFormat:
+        """Segmentli dosyanın düzenini header'ından oku (segment bazında erişim için)"""
+        return SegmentedFormat.from_header(base64.b64decode(key.encode('utf-8')), head)
 
+    @encryption_duration.timed(algorithm="FILE", operation="decrypt")
     def decrypt_file(self, encrypted_contents: bytes, key: str) -> bytes:
         """
-        Şifrelenmiş dosya içeriğini çöz
+        Şifrelenmiş dosya içeriğini çöz (AEAD ya da eski Fernet)
         """
         try:
-            # String formatındaki key'i bytes'a çevir
-            key_bytes = base64.b64decode(key.encode('utf-8'))
-            fernet = Fernet(key_bytes)
-            
-            # Şifreyi çöz ve bytes olarak döndür
-            decrypted_contents = fernet.decrypt(encrypted_contents)
-            return decrypted_contents
+            if detect_format(encrypted_contents) == "fernet":
+                return Fernet(base64.b64decode(key.encode('utf-8'))).decrypt(encrypted_contents)
+            decryptor = self.decrypt_stream(key, encrypted_contents)
+            return decryptor.update(encrypted_contents) + decryptor.finalize()
         except Exception as e:
-            print(f"Decryption error: {str(e)}")
+            logger.error("Decryption error: %s", e)
             raise e
 
-file_encryption_service = FileEncryptionService()
\ No newline at end of file
+file_encryption_service = FileEncryptionService()
@@ -0,0 +1,414 @@
+# backend/app/services/file_storage.py
+import hashlib
+import hmac
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional, Tuple
+from bson import ObjectId
+from cryptography.fernet import InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from pymongo import ReturnDocument
+from ..config import settings
+from ..database import db, fs, message_files, stream_upload, file_blobs_collection, file_refs_collection
+from .file_encryption import file_encryption_service, detect_format, looks_encrypted, AEAD_HEADER
+from .metrics import file_dedup_hits, file_dedup_bytes_saved
+
+logger = logging.getLogger(__name__)
+
+async def iter_chunks(grid_out) -> AsyncIterator[bytes]:
+    """GridFS dosyasını chunk chunk oku; bellekte aynı anda tek chunk tutulur"""
+    while True:
+        chunk = await grid_out.readchunk()
+        if not chunk:
+            return
+        yield chunk
+
+async def _chain(first: bytes, rest: Optional[AsyncIterator[bytes]] = None) -> AsyncIterator[bytes]:
+    if first:
+        yield first
+    if rest is not None:
+        async for chunk in rest:
+            yield chunk
+
+async def _decrypt_rest(head: bytes, chunks: AsyncIterator[bytes], decryptor) -> AsyncIterator[bytes]:
+    if head:
+        yield head
+    async for chunk in chunks:
+        data = decryptor.update(chunk)
+        if data:
+            yield data
+    tail = decryptor.finalize()
+    if tail:
+        yield tail
+
+async def verify_fernet(grid_out, encryption_key: str, first: bytes = b""):
+    """
+    Eski Fernet dosyasının HMAC'ini AES çözmesi yapmadan doğrula; uyuşmazsa
+    InvalidToken. first verilirse (zaten okunmuş ilk chunk) okuma oradan
+    devam eder. Sonunda dosya başa sarılır.
+    """
+    verifier = file_encryption_service.verify_stream(encryption_key)
+    if not first:
+        grid_out.seek(0)
+    verifier.update(first)
+    async for chunk in iter_chunks(grid_out):
+        verifier.update(chunk)
+    verifier.finalize()
+    grid_out.seek(0)
+
+async def open_plaintext_stream(grid_out, encryption_key: Optional[str] = None,
+                                fallback_raw: bool = False,
+                                verified: bool = False) -> Tuple[AsyncIterator[bytes], bool]:
+    """
+    Dosyanın düz içeriğini parça parça veren iterator'ı ve içeriğin
+    çözülüp çözülmediğini döndür.
+
+    İlk chunk burada okunup çözülür; anahtar/format hataları yanıt
+    başlamadan exception olarak yükselir. fallback_raw ise şifreli token
+    gibi görünmeyen dosya olduğu gibi verilir; token olup doğrulanamayan
+    (bozuk ya da değiştirilmiş) dosya ise her durumda hata verir. AEAD
+    dosyalarında her segment verilmeden önce kendi tag'iyle doğrulanır.
+    Eski Fernet dosyalarının HMAC'i burada, düz içerik verilmeden önce tüm
+    dosya üzerinden doğrulanır (verified ise çağıran zaten doğrulamıştır).
+    """
+    chunks = iter_chunks(grid_out)
+    first = await chunks.__anext__() if grid_out.length else b""
+    if not encryption_key:
+        return _chain(first, chunks), False
+
+    try:
+        if not verified and len(first) < grid_out.length and detect_format(first) == "fernet":
+            await verify_fernet(grid_out, encryption_key, first)
+            chunks = iter_chunks(grid_out)
+            first = await chunks.__anext__()
+        decryptor = file_encryption_service.decrypt_stream(encryption_key, first)
+        head = decryptor.update(first)
+        if len(first) >= grid_out.length:
+            head += decryptor.finalize()
+            return _chain(head), True
+    except InvalidToken:
+        if not fallback_raw or looks_encrypted(first):
+            raise
+        logger.warning("File %s is not a valid encrypted token, sending as stored", grid_out._id)
+        # Doğrulama ya da çözme denemesi chunk'ları tüketmiş olabilir; baştan okunur
+        grid_out.seek(0)
+        return iter_chunks(grid_out), False
+    return _decrypt_rest(head, chunks, decryptor), True
+
+def plaintext_length(grid_out, metadata: dict, decrypted: bool) -> int:
+    """Gönderilecek içeriğin boyutu: çözülen dosyada upload sırasındaki boyut"""
+    if decrypted and metadata.get("size") is not None:
+        return metadata["size"]
+    return grid_out.length
+
+async def iter_segments(grid_out, fmt, first: int, last: int) -> AsyncIterator[Tuple[int, bytes]]:
+    """
+    Segmentli dosyanın [first, last] aralığındaki segmentlerini çözerek ver.
+    Her segment tek bir GridFS chunk'ı olduğu için sadece bu chunk'lar okunur.
+    """
+    count = fmt.segment_count(grid_out.length)
+    grid_out.seek(first * fmt.record_size)
+    for index in range(first, min(last, count - 1) + 1):
+        record = await grid_out.readchunk()
+        yield index, fmt.open_record(index, record, last=index == count - 1)
+
+async def _trim(chunks: AsyncIterator[bytes], skip: int, size: int) -> AsyncIterator[bytes]:
+    """İlk `skip` byte'ı atlayıp sonraki `size` byte'ı ver"""
+    async for chunk in chunks:
+        if skip >= len(chunk):
+            skip -= len(chunk)
+            continue
+        chunk = chunk[skip:skip + size]
+        skip = 0
+        size -= len(chunk)
+        if chunk:
+            yield chunk
+        if size <= 0:
+            return
+
+class RangeReader:
+    """
+    Dosyanın düz içeriğinden [start, end] aralıklarını okur; sadece aralığı
+    kapsayan GridFS chunk'ları okunur. Düz dosyalarda doğrudan seek, AEAD
+    dosyalarında segment bazında çözme yapılır. Eski Fernet dosyaları seek
+    edilemediği için HMAC'leri open() içinde bir kez doğrulanır, her aralık
+    baştan çözülüp kesilir.
+    length None ise (boyutu bilinmeyen eski dosya) aralık desteklenmez.
+    """
+
+    def __init__(self, grid_out, length: Optional[int], encryption_key: Optional[str] = None, fmt=None):
+        self.grid_out = grid_out
+        self.length = length
+        self.encryption_key = encryption_key
+        self.format = fmt
+
+    @classmethod
+    async def open(cls, grid_out, encryption_key: Optional[str] = None,
+                   size: Optional[int] = None) -> "RangeReader":
+        """size: eski Fernet dosyaları için metadata'daki düz içerik boyutu"""
+        if not encryption_key:
+            return cls(grid_out, grid_out.length)
+        head = await grid_out.read(AEAD_HEADER.size)
+        grid_out.seek(0)
+        if detect_format(head) == "aead":
+            fmt = file_encryption_service.segment_format(encryption_key, head)
+            return cls(grid_out, fmt.plaintext_length(grid_out.length), encryption_key, fmt)
+        if size is not None:
+            await verify_fernet(grid_out, encryption_key)
+        return cls(grid_out, size, encryption_key)
+
+    async def iter_range(self, start: int, end: int) -> AsyncIterator[bytes]:
+        size = end - start + 1
+        if not self.encryption_key:
+            chunk_size = self.grid_out.chunk_size
+            self.grid_out.seek(start - start % chunk_size)
+            async for chunk in _trim(iter_chunks(self.grid_out), start % chunk_size, size):
+                yield chunk
+            return
+
+        if self.format is None:
+            self.grid_out.seek(0)
+            chunks, _ = await open_plaintext_stream(self.grid_out, self.encryption_key, verified=True)
+            async for chunk in _trim(chunks, start, size):
+                yield chunk
+            return
+
+        first, skip = self.format.locate(start)
+        last, _ = self.format.locate(end)
+        segments = (plaintext async for _, plaintext in iter_segments(self.grid_out, self.format, first, last))
+        async for chunk in _trim(segments, skip, size):
+            yield chunk
+
+# İçerik adresli depolama
+#
+# Aynı içerik (anahtarlı hash'e göre) her bucket'ta tek bir GridFS dosyası
+# (blob) olarak saklanır. file_blobs koleksiyonu "<bucket>:<hash>" -> GridFS
+# id ve referans sayısını tutar; kullanıcıya ait dosya adı, klasör, alıcı
+# gibi bilgiler file_refs kayıtlarındadır ve API'deki dosya id'si bu
+# kaydın id'sidir. Referans sayısı sıfıra inen blob silinir.
+
+def _dedup_key() -> bytes:
+    """
+    İçerik hash'inin anahtarı. FILE_DEDUP_KEY yoksa JWT imza anahtarı
+    doğrudan kullanılmaz, HKDF ile ondan ayrı bir anahtar türetilir.
+    """
+    if settings.FILE_DEDUP_KEY:
+        return settings.FILE_DEDUP_KEY.encode("utf-8")
+    logger.warning("FILE_DEDUP_KEY is not set; deriving the dedup key from SECRET_KEY")
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"file-dedup-hmac"
+    ).derive(settings.SECRET_KEY.encode("utf-8"))
+
+DEDUP_KEY = _dedup_key()
+
+async def keyed_digest(source) -> Tuple[str, int]:
+    """
+    İçeriğin HMAC-SHA256'sı ve boyutu. Anahtarlı olduğu için hash'i bilen
+    biri içeriği tahmin edip doğrulayamaz. source baştan sona parça parça
+    okunur ve sonra başa sarılır (UploadFile diske taşan geçici dosyadır).
+    """
+    mac = hmac.new(DEDUP_KEY, digestmod=hashlib.sha256)
+    size = 0
+    while True:
+        chunk = await source.read(settings.UPLOAD_READ_SIZE)
+        if not chunk:
+            break
+        mac.update(chunk)
+        size += len(chunk)
+    await source.seek(0)
+    return mac.hexdigest(), size
+
+async def store_blob(bucket, source, filename: str, content_type: Optional[str],
+                     encrypt: bool = True) -> dict:
+    """
+    Yüklenen içeriği blob olarak sakla ve referans sayısını artır. Aynı
+    içerik zaten varsa GridFS'e hiç yazılmaz. file_blobs kaydını döndürür.
+    """
+    bucket_name = bucket.collection.name
+    digest, size = await keyed_digest(source)
+    blob_id = f"{bucket_name}:{digest}"
+
+    blob = await file_blobs_collection.find_one_and_update(
+        {"_id": blob_id, "refcount": {"$gt": 0}},
+        {"$inc": {"refcount": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if blob is None:
+        metadata = {"content_type": content_type, "content_hash": digest, "is_encrypted": encrypt}
+        encryptor = None
+        if encrypt:
+            encryptor, metadata["encryption_key"] = file_encryption_service.encrypt_stream()
+        stored = await stream_upload(bucket, filename, source, metadata, encryptor=encryptor)
+        gridfs_id = ObjectId(stored["id"])
+
+        blob = await file_blobs_collection.find_one_and_update(
+            {"_id": blob_id},
+            {
+                "$setOnInsert": {
+                    "bucket": bucket_name,
+                    "gridfs_id": gridfs_id,
+                    "size": size,
+                    "created_at": datetime.now(timezone.utc)
+                },
+                "$inc": {"refcount": 1}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if blob["gridfs_id"] != gridfs_id:
+            # Aynı içerik eşzamanlı yüklenmiş; önce kaydedilen kopya kullanılır.
+            # Bu kopya yine de yazıldığı için dedup sayılmaz
+            await bucket.delete(gridfs_id)
+        return blob
+
+    # Sadece yükleme tamamen atlandığında
+    file_dedup_hits.inc(bucket=bucket_name)
+    file_dedup_bytes_saved.inc(size, bucket=bucket_name)
+    return blob
+
+async def release_blob(bucket, blob_id: str, gridfs_id: ObjectId, ref_id: Optional[ObjectId] = None):
+    """
+    Referans sayısını azalt; sıfıra inerse blob'u ve GridFS dosyasını sil.
+    ref_id verilirse azaltma o kayıt için bir kez yapılır (released
+    listesine yazılır), yarıda kalan bir silme tekrar edildiğinde sayı iki
+    kez düşmez. gridfs_id, aynı içerik için sonradan oluşturulmuş yeni bir
+    blob'un yanlışlıkla azaltılmasını önler.
+    """
+    query = {"_id": blob_id, "gridfs_id": gridfs_id}
+    update = {"$inc": {"refcount": -1}}
+    if ref_id is not None:
+        query["released"] = {"$ne": ref_id}
+        update["$push"] = {"released": ref_id}
+    blob = await file_blobs_collection.find_one_and_update(
+        query, update, return_document=ReturnDocument.AFTER
+    )
+    if blob is None or blob["refcount"] > 0:
+        return
+    # Bu arada aynı içerik tekrar yüklendiyse refcount artmıştır, silinmez
+    result = await file_blobs_collection.delete_one({"_id": blob_id, "refcount": {"$lte": 0}})
+    if result.deleted_count:
+        await bucket.delete(blob["gridfs_id"])
+        await delete_renditions(bucket, blob["gridfs_id"])
+
+async def create_file_ref(bucket, blob: dict, owner_id: str, filename: str,
+                          content_type: Optional[str], **fields) -> dict:
+    """
+    Kullanıcıya ait dosya kaydını oluştur; API'deki dosya id'si bu kaydın
+    id'sidir. store_blob'un aldığı referansı devralır: kayıt eklenemezse
+    referans bırakılır.
+    """
+    ref = {
+        "bucket": bucket.collection.name,
+        "blob_id": blob["_id"],
+        "gridfs_id": blob["gridfs_id"],
+        "owner_id": owner_id,
+        "filename": filename,
+        "content_type": content_type,
+        "size": blob["size"],
+        "upload_date": datetime.now(timezone.utc),
+        **fields
+    }
+    try:
+        result = await file_refs_collection.insert_one(ref)
+    except BaseException:
+        await release_blob(bucket, blob["_id"], blob["gridfs_id"])
+        raise
+    ref["_id"] = result.inserted_id
+    return ref
+
+async def _finish_ref_delete(bucket, ref: dict):
+    await release_blob(bucket, ref["blob_id"], ref["gridfs_id"], ref["_id"])
+    await file_refs_collection.delete_one({"_id": ref["_id"]})
+    await file_blobs_collection.update_one({"_id": ref["blob_id"]}, {"$pull": {"released": ref["_id"]}})
+
+async def delete_file_ref(bucket, ref: dict):
+    """
+    Kaydı sil ve blob referansını bırak. Kayıt önce "deleting" olarak
+    işaretlenir (artık listelenmez/çözülmez); işlem yarıda kalırsa
+    recover_file_refs açılışta tamamlar.
+    """
+    await file_refs_collection.update_one({"_id": ref["_id"]}, {"$set": {"deleting": True}})
+    await _finish_ref_delete(bucket, ref)
+
+async def recover_file_refs():
+    """Yarıda kalmış kayıt silmelerini tamamla (açılışta çalışır)"""
+    buckets = {"fs": fs, "message_files": message_files}
+    recovered = 0
+    async for ref in file_refs_collection.find({"deleting": True}):
+        await _finish_ref_delete(buckets[ref["bucket"]], ref)
+        recovered += 1
+    if recovered:
+        logger.info("Finished %s interrupted file deletions", recovered)
+    return recovered
+
+async def resolve_file(bucket, file_id: str) -> Optional[dict]:
+    """
+    API dosya id'sini çöz. Önce file_refs kaydına, yoksa tek parça saklanan
+    eski GridFS dosyasına bakılır. {"gridfs_id", "filename", "metadata",
+    "ref"} döner; metadata yetki kontrolü (owner_id/receiver_id) ve şifre
+    çözme (encryption_key) için gereken alanları içerir.
+    """
+    if not ObjectId.is_valid(file_id):
+        return None
+    files = db[f"{bucket.collection.name}.files"]
+    ref = await file_refs_collection.find_one({
+        "_id": ObjectId(file_id),
+        "bucket": bucket.collection.name,
+        "deleting": {"$ne": True}
+    })
+    if ref is not None:
+        blob_file = await files.find_one({"_id": ref["gridfs_id"]}, {"metadata": 1})
+        if blob_file is None:
+            return None
+        metadata = {
+            **(blob_file.get("metadata") or {}),
+            **{key: value for key, value in ref.items() if key not in ("_id", "blob_id", "gridfs_id")}
+        }
+        return {"gridfs_id": ref["gridfs_id"], "filename": ref["filename"], "metadata": metadata, "ref": ref}
+
+    legacy = await files.find_one({"_id": ObjectId(file_id)})
+    if legacy is None:
+        return None
+    return {
+        "gridfs_id": legacy["_id"],
+        "filename": legacy.get("filename"),
+        "metadata": legacy.get("metadata") or {},
+        "ref": None
+    }
+
+# Türevler (küçük resim / PDF ilk sayfa önizlemesi)
+#
+# Kaynak dosyayla aynı bucket'ta, şifreli ayrı GridFS dosyaları olarak
+# saklanır; metadata.rendition_of kaynağın GridFS id'si, metadata.rendition
+# boyut adıdır. Blob'u paylaşan tüm kayıtlar aynı türevleri kullanır.
+
+async def find_rendition(bucket, source_id: ObjectId, size: str) -> Optional[dict]:
+    files = db[f"{bucket.collection.name}.files"]
+    return await files.find_one(
+        {"metadata.rendition_of": source_id, "metadata.rendition": size},
+        {"metadata": 1, "length": 1}
+    )
+
+async def delete_renditions(bucket, source_id: ObjectId):
+    """Kaynak dosya silinirken türevlerini de sil"""
+    files = db[f"{bucket.collection.name}.files"]
+    async for rendition in files.find({"metadata.rendition_of": source_id}, {"_id": 1}):
+        await bucket.delete(rendition["_id"])
+
+async def storage_stats(owner_id: str) -> dict:
+    """
+    Kullanıcının kendi dosyalarının sayısı ve (mantıksal) toplam boyutu.
+    Tekilleştirme kullanıcılar arası olduğu için genel blob/tasarruf
+    rakamları burada verilmez (bir dosyanın başkasında olup olmadığı
+    anlaşılabilirdi); onlar sadece Prometheus sayaçlarındadır.
+    """
+    own = await file_refs_collection.aggregate([
+        {"$match": {"owner_id": owner_id, "deleting": {"$ne": True}}},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "bytes": {"$sum": "$size"}}}
+    ]).to_list(1)
+    own = own[0] if own else {"count": 0, "bytes": 0}
+    return {"files": own["count"], "bytes": own["bytes"]}
@@ -0,0 +1,125 @@
+# backend/app/services/ingest.py
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from ..config import settings
+from .encryption import encryption_service
+from .message_writer import message_writer
+from .websocket_manager import ws_manager
+from .metrics import ingest_stage_duration
+
+logger = logging.getLogger(__name__)
+
+class IngestStage:
+    """
+    Aynı anda en fazla `concurrency` mesajın çalıştığı pipeline aşaması.
+    Slot bekleyen mesajlar aşamanın kuyruğunu oluşturur; kuyruk dolunca
+    gönderenin receive döngüsü bekler, böylece baskı TCP'ye kadar yansır.
+    """
+
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.waiting = 0
+        self.active = 0
+        self.processed = 0
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    @asynccontextmanager
+    async def slot(self):
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        ingest_stage_duration.observe(started - start, stage=self.name, phase="wait")
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.processed += 1
+            self._semaphore.release()
+            ingest_stage_duration.observe(time.perf_counter() - started, stage=self.name, phase="run")
+
+class IngestPipeline:
+    """
+    WebSocket'ten gelen sohbet mesajı için aşamalı işleme:
+    şifreleme (executor'da) -> kayıt (toplu insert_many) -> teslim.
+    Her aşamanın kendi eşzamanlılık sınırı vardır; pahalı bir RSA/AES
+    mesajı sadece şifreleme slotlarından birini tutar, event loop ve
+    diğer soketlerin kayıt/teslim işleri beklemez.
+
+    Bir bağlantı mesajlarını sırayla işler (process() bitmeden sonraki
+    mesajı okumaz), böylece bir gönderenin mesaj sırası korunur.
+    """
+
+    def __init__(self, encrypt_concurrency: int, persist_concurrency: int, deliver_concurrency: int):
+        self.encrypt = IngestStage("encrypt", encrypt_concurrency)
+        self.persist = IngestStage("persist", persist_concurrency)
+        self.deliver = IngestStage("deliver", deliver_concurrency)
+        self.stages = (self.encrypt, self.persist, self.deliver)
+
+    async def _build_message(self, user_id: str, data: dict) -> dict:
+        content = data.get("content", "")
+        message_data = {
+            "sender_id": user_id,
+            "receiver_id": data["receiverId"],
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "is_read": False
+        }
+
+        if content.startswith("[FILE:"):
+            logger.debug("Dosya mesajı tespit edildi, şifreleme atlanıyor...")
+            message_data.update(content=content, encryption_type="NONE")
+            return message_data
+
+        encryption_type = data["encryptionType"]
+        async with self.encrypt.slot():
+            encrypted_content, encryption_data = await encryption_service.encrypt_async(
+                encryption_type, content
+            )
+
+        logger.debug("Şifreleme Yöntemi: %s, şifreli içerik: %s karakter", encryption_type, len(encrypted_content))
+        message_data.update(
+            encrypted_content=encrypted_content,
+            encryption_data=encryption_data,
+            encryption_type=encryption_type
+        )
+        return message_data
+
+    async def process(self, user_id: str, data: dict, received_at: float) -> dict:
+        """
+        Mesajı şifrele, kaydet ve alıcıya ilet; kaydedilen mesajı döndürür.
+        received_at (time.time()) teslim gecikmesi ölçümü için çerçeveyle taşınır.
+        """
+        message_data = await self._build_message(user_id, data)
+
+        async with self.persist.slot():
+            # Tüm bağlantılardan gelen mesajlar toplu insert_many ile yazılır
+            created_message = await message_writer.submit(message_data)
+
+        # Alıcı kendi seq'ini takip eder; yeniden bağlanınca buradan devam eder
+        created_message["seq"] = created_message["receiver_seq"]
+        async with self.deliver.slot():
+            await ws_manager.send_personal_message(created_message, data["receiverId"], received_at)
+        return created_message
+
+    def stats(self) -> dict:
+        stats = {}
+        for stage in self.stages:
+            stats[f"{stage.name}_waiting"] = stage.waiting
+            stats[f"{stage.name}_active"] = stage.active
+            stats[f"{stage.name}_processed"] = stage.processed
+        return stats
+
+ingest_pipeline = IngestPipeline(
+    settings.INGEST_ENCRYPT_CONCURRENCY,
+    settings.INGEST_PERSIST_CONCURRENCY,
+    settings.INGEST_DELIVER_CONCURRENCY
+)
@@ -0,0 +1,37 @@
+# backend/app/services/key_cache.py
+import hashlib
+from typing import Any, Callable
+from ..config import settings
+from .user_cache import TTLCache
+
+class KeyCache:
+    """
+    Ayrıştırılmış anahtar / cipher nesneleri için LRU önbellek.
+    Anahtarlar saklanan anahtar materyalinin özetiyle tutulur, böylece
+    önbellekte ham anahtar metni anahtar olarak yer almaz.
+    """
+
+    def __init__(self, max_size: int):
+        # Anahtar nesneleri zamanla geçersizleşmez, sadece LRU ile düşer
+        self._cache = TTLCache(max_size, float("inf"))
+
+    @staticmethod
+    def _digest(kind: str, material: str) -> str:
+        return hashlib.sha256(f"{kind}:{material}".encode("utf-8")).hexdigest()
+
+    def get_or_create(self, kind: str, material: str, factory: Callable[[], Any]) -> Any:
+        """Önbellekte varsa döndür, yoksa factory() ile oluşturup sakla"""
+        digest = self._digest(kind, material)
+        value = self._cache.get(digest)
+        if value is None:
+            value = factory()
+            self._cache.set(digest, value)
+        return value
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+key_cache = KeyCache(settings.KEY_CACHE_SIZE)
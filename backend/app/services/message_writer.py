@@ -0,0 +1,99 @@
+# backend/app/services/message_writer.py
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+from ..config import settings
+from ..database import create_messages
+from .metrics import message_write_batch_size
+
+logger = logging.getLogger(__name__)
+
+class MessageWriteCoalescer:
+    """
+    WebSocket yolundaki mesaj yazımlarını birleştirir. Tüm bağlantılardan
+    gelen mesajlar max_delay saniye ya da max_batch mesaj dolana kadar
+    toplanır ve tek bir insert_many ile yazılır; her gönderenin future'ı
+    kendi kaydıyla (id dahil) çözülür.
+
+    Aynı anda tek bir flush çalışır; bu sırada gelenler bir sonraki partide
+    toplanır. Böylece bir konuşmadaki mesajlar kabul sırasıyla kaydedilir
+    ve gönderenlere o sırayla döner.
+    """
+
+    def __init__(self, max_batch: int, max_delay: float):
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max(0.0, max_delay)
+        self.batches = 0
+        self.messages = 0
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: Optional[asyncio.Task] = None
+
+    async def submit(self, message_data: dict) -> dict:
+        """Mesajı sıradaki partiye ekle; kaydedilince mesajı döndürür"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((message_data, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._start_flush)
+        return await future
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Önceki flush bitince _flush_loop kalanları da yazar
+        if self._flushing is None and self._pending:
+            self._flushing = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        try:
+            while self._pending:
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                await self._write(batch)
+        finally:
+            self._flushing = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    async def _write(self, batch: List[Tuple[dict, asyncio.Future]]):
+        message_write_batch_size.observe(len(batch))
+        self.batches += 1
+        self.messages += len(batch)
+        try:
+            results = await create_messages([message_data for message_data, _ in batch])
+        except Exception as e:
+            logger.error("Error writing message batch of %s: %s", len(batch), e)
+            results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def flush(self):
+        """Bekleyen tüm mesajları yaz (kapanışta kullanılır)"""
+        self._start_flush()
+        if self._flushing is not None:
+            await self._flushing
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "messages": self.messages,
+            "avg_batch": self.messages / self.batches if self.batches else 0.0
+        }
+
+message_writer = MessageWriteCoalescer(
+    settings.MESSAGE_BATCH_SIZE,
+    settings.MESSAGE_BATCH_DELAY_MS / 1000
+)
@@ -0,0 +1,284 @@
+# backend/app/services/metrics.py
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from pymongo import monitoring
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Prometheus varsayılanlarına yakın, saniye cinsinden histogram sınırları
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        # callback verilirse değerler her okumada ondan alınır
+        self._callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        if self._callback is not None:
+            try:
+                items = list(self._callback().items())
+            except Exception as e:
+                logger.error("Metrics callback error for %s: %s", self.name, e)
+                items = []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [bucket sayıları..., toplam, adet]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels):
+        """Fonksiyon süresini ölçen decorator"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = self.header()
+        for key, state in items:
+            cumulative = 0
+            for index, bound in enumerate(self.buckets):
+                cumulative += state[index]
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+# Uygulama genelinde kullanılan metrikler
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ("method", "route", "status")
+)
+encryption_duration = registry.histogram(
+    "encryption_duration_seconds", "Message and file encryption/decryption time",
+    ("algorithm", "operation")
+)
+mongo_command_duration = registry.histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency",
+    ("command", "status")
+)
+gridfs_bytes = registry.counter(
+    "gridfs_bytes_total", "Bytes written to (in) and read from (out) GridFS chunks",
+    ("bucket", "direction")
+)
+websocket_connections = registry.gauge(
+    "websocket_active_connections", "Currently open WebSocket connections"
+)
+websocket_send_dropped = registry.counter(
+    "websocket_send_dropped_total",
+    "Outbound WebSocket messages hitting a full send queue, by queue policy",
+    ("policy",)
+)
+websocket_reaped = registry.counter(
+    "websocket_reaped_total", "WebSocket connections closed by the idle reaper"
+)
+message_write_batch_size = registry.histogram(
+    "message_write_batch_size", "Messages persisted per coalesced insert_many",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+file_dedup_hits = registry.counter(
+    "file_dedup_hits_total", "Uploads served by an existing content-addressed blob",
+    ("bucket",)
+)
+file_dedup_bytes_saved = registry.counter(
+    "file_dedup_bytes_saved_total", "Plaintext bytes not written thanks to upload deduplication",
+    ("bucket",)
+)
+rendition_duration = registry.histogram(
+    "rendition_duration_seconds", "Time to render a thumbnail/preview, including reading the original",
+    ("kind",)
+)
+rendition_requests = registry.counter(
+    "rendition_requests_total", "Preview rendition lookups by outcome (hit, generated, unavailable)",
+    ("result",)
+)
+ingest_stage_duration = registry.histogram(
+    "ingest_stage_duration_seconds",
+    "WebSocket ingest pipeline time per stage, waiting for a slot and running",
+    ("stage", "phase")
+)
+message_delivery_latency = registry.histogram(
+    "message_delivery_latency_seconds",
+    "Time from receiving a WebSocket message to writing it to the first recipient socket"
+)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Mongo komut sürelerini ve GridFS chunk trafiğini ölçen pymongo listener"""
+
+    def started(self, event):
+        if event.command_name == "insert":
+            collection = event.command.get("insert", "")
+            if isinstance(collection, str) and collection.endswith(".chunks"):
+                size = sum(len(doc.get("data", b"")) for doc in event.command.get("documents", []))
+                if size:
+                    gridfs_bytes.inc(size, bucket=collection[:-len(".chunks")], direction="in")
+
+    def succeeded(self, event):
+        mongo_command_duration.observe(
+            event.duration_micros / 1e6, command=event.command_name, status="ok"
+        )
+        if event.command_name in ("find", "getMore"):
+            cursor = event.reply.get("cursor") or {}
+            namespace = cursor.get("ns", "")
+            if namespace.endswith(".chunks"):
+                documents = cursor.get("firstBatch") or cursor.get("nextBatch") or []
+                size = sum(len(doc.get("data", b"")) for doc in documents)
+                if size:
+                    bucket = namespace.split(".", 1)[-1][:-len(".chunks")]
+                    gridfs_bytes.inc(size, bucket=bucket, direction="out")
+
+    def failed(self, event):
+        mongo_command_duration.observe(
+            event.duration_micros / 1e6, command=event.command_name, status="error"
+        )
+
+def stats_gauge(name: str, documentation: str, stats: Callable[[], dict], fields: Sequence[str]) -> Gauge:
+    """Bir servisin stats() sözlüğündeki alanları 'field' etiketiyle yayınla"""
+    return registry.gauge(
+        name, documentation, ("field",),
+        callback=lambda: {(field,): stats().get(field, 0) for field in fields}
+    )
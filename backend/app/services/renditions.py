@@ -0,0 +1,262 @@
+# backend/app/services/renditions.py
+import asyncio
+import io
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from bson import ObjectId
+from ..config import settings
+from ..database import stream_upload
+from .file_encryption import file_encryption_service
+from .file_storage import open_plaintext_stream, plaintext_length, find_rendition
+from .metrics import rendition_duration, rendition_requests
+
+logger = logging.getLogger(__name__)
+
+IMAGE_TYPES = ("image/jpeg", "image/png", "image/gif", "image/webp", "image/bmp", "image/tiff")
+PDF_TYPE = "application/pdf"
+
+# Üretilemeyen (bozuk/desteklenmeyen) kaynaklar her istekte tekrar denenmez
+MAX_FAILED = 1024
+
+class RenderError(Exception):
+    """Kaynak içerik çizilemedi (bozuk, desteklenmeyen ya da çok büyük)"""
+
+class _BytesSource:
+    """stream_upload için bellekteki içeriği read(size) coroutine'i ile ver"""
+
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._buffer.read(size)
+
+class RenditionService:
+    """
+    Görseller için küçültülmüş kopya, PDF'ler için ilk sayfa önizlemesi
+    üretir. Önizleme istekleri böylece orijinali indirip çözmek yerine
+    birkaç KB'lık türevi okur.
+
+    Pillow (görseller) ve pypdfium2 (PDF) isteğe bağlıdır ve ilk kullanımda
+    import edilir; kurulu değilse ilgili tür için türev üretilmez ve
+    önizleme orijinal dosyayla yapılır. Çizim event loop'u bloklamasın diye
+    executor'da çalışır; aynı türev için eşzamanlı istekler tek bir üretimi
+    bekler.
+    """
+
+    def __init__(self, sizes: Dict[str, int], eager_sizes: List[str], workers: int, max_source_bytes: int):
+        self.sizes = sizes
+        self.eager_sizes = [size for size in eager_sizes if size in sizes]
+        self.workers = max(1, workers)
+        self.max_source_bytes = max_source_bytes
+        self.generated = 0
+        self.failed = 0
+        self._libs: Optional[dict] = None
+        self._executor: Optional[Executor] = None
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        self._failed: "OrderedDict[Tuple[str, str, str], None]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _load(self) -> dict:
+        if self._libs is None:
+            libs = {}
+            try:
+                from PIL import Image, ImageOps
+            except ImportError:
+                logger.warning("Pillow is not installed; thumbnails and previews are disabled")
+            else:
+                libs["image"] = (Image, ImageOps)
+                try:
+                    import pypdfium2
+                except ImportError:
+                    logger.info("pypdfium2 is not installed; PDF previews are disabled")
+                else:
+                    libs["pdf"] = pypdfium2
+            self._libs = libs
+        return self._libs
+
+    def kind(self, content_type: Optional[str]) -> Optional[str]:
+        """İçerik türü için kullanılacak çizici ("image"/"pdf"); yoksa None"""
+        if content_type in IMAGE_TYPES:
+            kind = "image"
+        elif content_type == PDF_TYPE:
+            kind = "pdf"
+        else:
+            return None
+        return kind if kind in self._load() else None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rendition")
+        return self._executor
+
+    def _render(self, kind: str, data: bytes, max_px: int) -> Tuple[bytes, str]:
+        """Executor'da çalışır; (içerik, content_type) döndürür"""
+        Image, ImageOps = self._libs["image"]
+        if kind == "pdf":
+            pdf = self._libs["pdf"].PdfDocument(data)
+            try:
+                page = pdf[0]
+                width, height = page.get_size()
+                image = page.render(scale=max_px / max(width, height, 1)).to_pil()
+                page.close()
+            finally:
+                pdf.close()
+        else:
+            # open() sadece başlığı okur; boyut piksel sınırını aşarsa decode edilmez
+            image = Image.open(io.BytesIO(data))
+            width, height = image.size
+            if width * height > settings.RENDITION_MAX_PIXELS:
+                raise RenderError(f"image is {width}x{height}, over RENDITION_MAX_PIXELS")
+            # JPEG'lerde hedefe yakın ölçekte decode eder
+            image.draft("RGB", (max_px, max_px))
+            image = ImageOps.exif_transpose(image)
+
+        image.thumbnail((max_px, max_px))
+        output = io.BytesIO()
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            image.convert("RGBA").save(output, "PNG", optimize=True)
+            return output.getvalue(), "image/png"
+        image.convert("RGB").save(output, "JPEG", quality=settings.RENDITION_QUALITY, optimize=True)
+        return output.getvalue(), "image/jpeg"
+
+    async def _generate(self, bucket, source_id: ObjectId, kind: str, size: str) -> Optional[dict]:
+        start = time.perf_counter()
+        grid_out = await bucket.open_download_stream(source_id)
+        metadata = grid_out.metadata or {}
+        encryption_key = metadata.get("encryption_key") if metadata.get("is_encrypted") else None
+        if plaintext_length(grid_out, metadata, bool(encryption_key)) > self.max_source_bytes:
+            return None
+
+        chunks, _ = await open_plaintext_stream(grid_out, encryption_key)
+        data = b"".join([chunk async for chunk in chunks])
+        try:
+            body, content_type = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), self._render, kind, data, self.sizes[size]
+            )
+        except RenderError:
+            raise
+        except Exception as e:
+            raise RenderError(str(e)) from e
+
+        encryptor, key = file_encryption_service.encrypt_stream()
+        stored = await stream_upload(
+            bucket,
+            f"{size}_{grid_out.filename}",
+            _BytesSource(body),
+            {
+                "rendition_of": source_id,
+                "rendition": size,
+                "content_type": content_type,
+                "is_encrypted": True,
+                "encryption_key": key
+            },
+            encryptor=encryptor
+        )
+        rendition_duration.observe(time.perf_counter() - start, kind=kind)
+        self.generated += 1
+        return {"_id": ObjectId(stored["id"]), "metadata": stored["metadata"]}
+
+    async def _generate_once(self, key: Tuple[str, str, str], bucket, source_id: ObjectId,
+                             kind: str, size: str) -> Optional[dict]:
+        try:
+            return await self._generate(bucket, source_id, kind, size)
+        except RenderError as e:
+            # Sadece çizim hataları hatırlanır; aynı içerik tekrar denense de başarısız olur
+            logger.warning("Rendition %s of %s failed: %s", size, source_id, e)
+            self.failed += 1
+            self._failed[key] = None
+            if len(self._failed) > MAX_FAILED:
+                self._failed.popitem(last=False)
+            return None
+        except Exception as e:
+            # Mongo/GridFS hataları geçici olabilir; sonraki istek tekrar dener
+            logger.warning("Rendition %s of %s could not be stored: %s", size, source_id, e)
+            self.failed += 1
+            return None
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get(self, bucket, source_id: ObjectId, content_type: Optional[str], size: str) -> Optional[dict]:
+        """
+        Kaynak dosyanın `size` türevinin GridFS kaydı; yoksa üretilir.
+        Tür desteklenmiyorsa ya da üretilemiyorsa None döner.
+        """
+        rendition = await find_rendition(bucket, source_id, size)
+        if rendition is not None:
+            rendition_requests.inc(result="hit")
+            return rendition
+
+        kind = self.kind(content_type)
+        key = (bucket.collection.name, str(source_id), size)
+        if kind is None or key in self._failed:
+            rendition_requests.inc(result="unavailable")
+            return None
+
+        future = self._inflight.get(key)
+        started = future is None
+        if started:
+            future = asyncio.ensure_future(self._generate_once(key, bucket, source_id, kind, size))
+            self._inflight[key] = future
+        # İstemci bağlantıyı kapatsa da üretim diğer bekleyenler için sürer
+        rendition = await asyncio.shield(future)
+        if rendition is None:
+            rendition_requests.inc(result="unavailable")
+        else:
+            rendition_requests.inc(result="generated" if started else "hit")
+        return rendition
+
+    async def open_rendition(self, bucket, stored: dict,
+                             size: str) -> Optional[Tuple[AsyncIterator[bytes], int, str]]:
+        """
+        resolve_file ile bulunan dosyanın türevini aç: (chunk'lar, boyut,
+        content_type). Türev yoksa None döner, orijinal gönderilmelidir.
+        """
+        rendition = await self.get(bucket, stored["gridfs_id"], stored["metadata"].get("content_type"), size)
+        if rendition is None:
+            return None
+        metadata = rendition["metadata"]
+        grid_out = await bucket.open_download_stream(rendition["_id"])
+        chunks, decrypted = await open_plaintext_stream(grid_out, metadata["encryption_key"])
+        return chunks, plaintext_length(grid_out, metadata, decrypted), metadata["content_type"]
+
+    def schedule(self, bucket, source_id: ObjectId, content_type: Optional[str]):
+        """Yüklemeden sonra RENDITION_EAGER_SIZES türevlerini arka planda üret"""
+        if not self.eager_sizes or self.kind(content_type) is None:
+            return
+        task = asyncio.get_running_loop().create_task(self._pregenerate(bucket, source_id, content_type))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _pregenerate(self, bucket, source_id: ObjectId, content_type: Optional[str]):
+        for size in self.eager_sizes:
+            try:
+                await self.get(bucket, source_id, content_type, size)
+            except Exception as e:
+                logger.warning("Background rendition %s of %s failed: %s", size, source_id, e)
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self._inflight),
+            "background": len(self._tasks),
+            "generated": self.generated,
+            "failed": self.failed
+        }
+
+rendition_service = RenditionService(
+    settings.RENDITION_SIZES,
+    settings.RENDITION_EAGER_SIZES,
+    settings.RENDITION_WORKERS,
+    settings.RENDITION_MAX_SOURCE_BYTES
+)
@@ -0,0 +1,127 @@
+# backend/app/services/rsa_key_pool.py
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+from Crypto.PublicKey import RSA
+from ..config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _generate_keypair(bits: int) -> Tuple[bytes, bytes]:
+    """Worker process içinde RSA anahtar çifti üret (PEM formatında)"""
+    key = RSA.generate(bits)
+    return key.export_key(format='PEM'), key.publickey().export_key(format='PEM')
+
+class RSAKeyPool:
+    """
+    Önceden üretilmiş RSA anahtar çiftlerini tutan havuz.
+    Arka plandaki görev havuzu worker process'lerde hedef boyuta tamamlar;
+    havuz boşsa acquire() anahtarı yerinde üretir (miss olarak sayılır).
+    """
+
+    def __init__(self, size: int, bits: int = 2048, workers: int = 1):
+        self.size = size
+        self.bits = bits
+        self.workers = max(1, workers)
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self._keys: deque = deque()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._refill_needed: Optional[asyncio.Event] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._keys)
+
+    def acquire(self) -> Tuple[bytes, bytes]:
+        """Bir (private_pem, public_pem) çifti al; thread-safe"""
+        with self._lock:
+            keypair = self._keys.popleft() if self._keys else None
+            if keypair:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        self._request_refill()
+        if keypair is None:
+            keypair = _generate_keypair(self.bits)
+            with self._lock:
+                self.generated += 1
+        return keypair
+
+    def _request_refill(self):
+        if self._loop is not None and self._refill_needed is not None:
+            self._loop.call_soon_threadsafe(self._refill_needed.set)
+
+    async def start(self):
+        if self._task is not None or self.size <= 0:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._refill_needed = asyncio.Event()
+        self._refill_needed.set()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._task = asyncio.create_task(self._refill_loop())
+        logger.info("RSA key pool started (size=%s, workers=%s)", self.size, self.workers)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._loop = None
+        self._refill_needed = None
+
+    async def _refill_loop(self):
+        while True:
+            await self._refill_needed.wait()
+            self._refill_needed.clear()
+
+            missing = self.size - self.depth
+            while missing > 0:
+                batch = min(missing, self.workers)
+                results = await asyncio.gather(
+                    *(self._loop.run_in_executor(self._executor, _generate_keypair, self.bits)
+                      for _ in range(batch)),
+                    return_exceptions=True
+                )
+                for result in results:
+                    if isinstance(result, BaseException):
+                        logger.error("RSA key pool generation error: %s", result)
+                        continue
+                    with self._lock:
+                        self._keys.append(result)
+                        self.generated += 1
+                if all(isinstance(result, BaseException) for result in results):
+                    # Worker'lar sürekli hata veriyorsa döngüyü meşgul etme
+                    await asyncio.sleep(1)
+                missing = self.size - self.depth
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "depth": self.depth,
+            "target": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+rsa_key_pool = RSAKeyPool(
+    settings.RSA_KEY_POOL_SIZE,
+    bits=settings.RSA_KEY_BITS,
+    workers=settings.RSA_KEY_POOL_WORKERS
+)
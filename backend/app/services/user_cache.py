@@ -0,0 +1,105 @@
+# backend/app/services/user_cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from ..config import settings
+
+class TTLCache:
+    """Boyutu sınırlı, süreli (TTL) LRU önbellek; isabet/ıskalama sayar"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._items[key]
+                self.misses += 1
+                return None
+
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+class AuthCache:
+    """
+    get_current_user için çözülmüş JWT claim'lerini ve kullanıcı kayıtlarını
+    saklar. Kullanıcı kayıtları user id ile tutulur ve kullanıcı güncellenince
+    ya da silinince invalidate() ile düşürülmelidir.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.claims = TTLCache(max_size, ttl)
+        self.users = TTLCache(max_size, ttl)
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        # Ham token bellekte anahtar olarak tutulmaz
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get_claims(self, token: str) -> Optional[dict]:
+        return self.claims.get(self._token_key(token))
+
+    def set_claims(self, token: str, claims: dict):
+        # Token süresi dolduktan sonra önbellekten dönmemeli
+        ttl = None
+        if claims.get("exp") is not None:
+            ttl = float(claims["exp"]) - time.time()
+        self.claims.set(self._token_key(token), claims, ttl)
+
+    def get_user(self, user_id: str) -> Optional[dict]:
+        user = self.users.get(str(user_id))
+        return dict(user) if user else None
+
+    def set_user(self, user_id: str, user: dict):
+        self.users.set(str(user_id), dict(user))
+
+    def invalidate(self, user_id: str):
+        if user_id is not None:
+            self.users.delete(str(user_id))
+
+    def stats(self) -> dict:
+        return {"claims": self.claims.stats(), "users": self.users.stats()}
+
+auth_cache = AuthCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL_SECONDS)
@@ -0,0 +1,95 @@
+# backend/app/services/user_loader.py
+import asyncio
+from typing import Dict, Iterable, List, Optional, Set
+from bson import ObjectId
+from ..database import users_collection
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Kullanıcı özetleri için sadece gerekli alanlar okunur
+USER_SUMMARY_PROJECTION = {"email": 1, "first_name": 1, "last_name": 1}
+
+def format_user_summary(user: dict) -> dict:
+    """Kullanıcı dokümanını API'de kullanılan özet formata çevir"""
+    return {
+        "id": str(user["_id"]),
+        "email": user.get("email", ""),
+        "first_name": user.get("first_name", ""),
+        "last_name": user.get("last_name", "")
+    }
+
+class UserLoader:
+    """
+    İstek bazlı, DataLoader benzeri kullanıcı yükleyici.
+    Aynı event loop turunda yapılan load() çağrıları tek bir $in sorgusunda
+    birleştirilir, tekrar eden id'ler bir kez sorgulanır.
+    """
+
+    def __init__(self, projection: Optional[dict] = None):
+        self.projection = projection or USER_SUMMARY_PROJECTION
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._pending: List[str] = []
+        self._dispatch_scheduled = False
+        # Çalışan dispatch task'ları; referans tutulmazsa task toplanabilir
+        self._tasks: Set[asyncio.Task] = set()
+
+    def load(self, user_id: str) -> asyncio.Future:
+        """Kullanıcı özetini döndüren bir future (bulunamazsa sonuç None)"""
+        user_id = str(user_id)
+        if user_id in self._futures:
+            return self._futures[user_id]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._futures[user_id] = future
+        self._pending.append(user_id)
+
+        if not self._dispatch_scheduled:
+            self._dispatch_scheduled = True
+            loop.call_soon(self._start_dispatch)
+        return future
+
+    def _start_dispatch(self):
+        task = asyncio.get_running_loop().create_task(self._dispatch())
+        self._tasks.add(task)
+        task.add_done_callback(self._dispatch_done)
+
+    def _dispatch_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("UserLoader dispatch failed: %s", task.exception(), exc_info=task.exception())
+
+    async def load_many(self, user_ids: Iterable[str]) -> List[Optional[dict]]:
+        """Verilen sırayla kullanıcı özetlerini getir"""
+        return list(await asyncio.gather(*(self.load(user_id) for user_id in user_ids)))
+
+    async def _dispatch(self):
+        user_ids, self._pending = self._pending, []
+        self._dispatch_scheduled = False
+
+        object_ids = [ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)]
+        try:
+            users = {}
+            if object_ids:
+                async for user in users_collection.find(
+                    {"_id": {"$in": object_ids}},
+                    self.projection
+                ):
+                    users[str(user["_id"])] = format_user_summary(user)
+
+            for user_id in user_ids:
+                future = self._futures[user_id]
+                if not future.done():
+                    future.set_result(users.get(user_id))
+        except Exception as e:
+            logger.error("Error in UserLoader dispatch: %s", e)
+            for user_id in user_ids:
+                # Hatalı sonuçlar önbellekte kalmasın, sonraki çağrı tekrar denesin
+                future = self._futures.pop(user_id)
+                if not future.done():
+                    future.set_exception(e)
+
+def get_user_loader() -> UserLoader:
+    """FastAPI dependency: her istek için yeni bir yükleyici"""
+    return UserLoader()
@@ -1,27 +1,317 @@
 # backend/app/services/websocket_manager.py
 from fastapi import WebSocket
-from typing import Dict
+from typing import Callable, Dict, Optional, Tuple
+from collections import deque
+from datetime import datetime, timezone
+from ..config import settings
+from .metrics import websocket_connections, websocket_send_dropped, websocket_reaped, message_delivery_latency
+from .broker import MessageBroker, create_broker
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Gönderim kuyruğu dolduğunda uygulanabilecek politikalar
+SEND_QUEUE_POLICIES = ("drop", "coalesce", "disconnect")
+
+# "Try again later": yavaş istemci bağlantısı sunucu tarafından kapatıldı
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# "Going away": zaman aşımına uğrayan bağlantı kapatıldı
+IDLE_CLOSE_CODE = 1001
+
+def _coalesce_key(message: dict) -> Optional[Tuple[str, str]]:
+    """
+    Yenisi eskisinin yerine geçebilen olaylar (ör. okundu bildirimi) için
+    anahtar. Sohbet mesajları birleştirilemez, anahtarları None'dır.
+    """
+    event_type = message.get("type")
+    if event_type and event_type != "message" and message.get("conversation_id"):
+        return event_type, message["conversation_id"]
+    return None
+
+class DeliveryTimer:
+    """
+    Bir çerçevenin alındığı an (time.time()). Çerçeve kullanıcının tüm
+    soketlerinin kuyruklarına eklenir; gecikme sadece ilk başarılı
+    gönderimde ölçülür.
+    """
+
+    __slots__ = ("received_at", "observed")
+
+    def __init__(self, received_at: float):
+        self.received_at = received_at
+        self.observed = False
+
+    def sent(self):
+        if not self.observed:
+            self.observed = True
+            message_delivery_latency.observe(max(0.0, time.time() - self.received_at))
+
+class ClientConnection:
+    """
+    Tek bir WebSocket ve onun sınırlı gönderim kuyruğu. Kuyruğu kendi
+    writer task'ı boşaltır, böylece yavaş bir alıcı gönderen tarafın
+    döngüsünü bekletmez.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: str, max_queue: int, policy: str,
+                 on_close: Callable[["ClientConnection"], None]):
+        if policy not in SEND_QUEUE_POLICIES:
+            raise ValueError(f"Unsupported send queue policy: {policy}")
+        self.websocket = websocket
+        self.user_id = user_id
+        self.max_queue = max(1, max_queue)
+        self.policy = policy
+        self.closed = False
+        # İstemciden son çerçevenin geldiği an (pong dahil her mesaj sayılır)
+        self.last_seen = time.monotonic()
+        self._queue: deque = deque()
+        self._ready = asyncio.Event()
+        self._on_close = on_close
+        self._writer = asyncio.create_task(self._write_loop())
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def enqueue(self, text: str, key: Optional[Tuple[str, str]] = None,
+                timer: Optional[DeliveryTimer] = None) -> bool:
+        """Mesajı kuyruğa ekle; kabul edilmediyse False döner"""
+        if self.closed:
+            return False
+        if len(self._queue) >= self.max_queue:
+            websocket_send_dropped.inc(policy=self.policy)
+            if not self._handle_full(text, key, timer):
+                return False
+        else:
+            self._queue.append((key, text, timer))
+        self._ready.set()
+        return True
+
+    def _handle_full(self, text: str, key: Optional[Tuple[str, str]],
+                     timer: Optional[DeliveryTimer]) -> bool:
+        if self.policy == "coalesce":
+            # Aynı olayın bekleyen eski sürümü varsa yerine yaz, yoksa en eskiyi at
+            if key is not None:
+                for index, (queued_key, _, _) in enumerate(self._queue):
+                    if queued_key == key:
+                        self._queue[index] = (key, text, timer)
+                        return True
+            self._queue.popleft()
+            self._queue.append((key, text, timer))
+            return True
+
+        if self.policy == "disconnect":
+            logger.warning(
+                "Evicting slow WebSocket consumer %s (%s messages queued)",
+                self.user_id, len(self._queue)
+            )
+            self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        return False
+
+    async def _write_loop(self):
+        while True:
+            await self._ready.wait()
+            while self._queue:
+                _, text, timer = self._queue.popleft()
+                try:
+                    await self.websocket.send_text(text)
+                except Exception as e:
+                    logger.warning("Send to user %s failed, dropping socket: %s", self.user_id, e)
+                    self.close()
+                    return
+                if timer is not None:
+                    timer.sent()
+            self._ready.clear()
+
+    def close(self, code: Optional[int] = None):
+        """Kuyruğu bırak, writer'ı durdur; code verilirse soketi de kapat"""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        self._on_close(self)
+        if code is not None:
+            self._writer = asyncio.get_running_loop().create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception as e:
+            logger.debug("Closing WebSocket for %s failed: %s", self.user_id, e)
 
 class WebSocketManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
+    """
+    Kullanıcı başına birden fazla bağlantıyı (sekme / cihaz) tutar.
+    Mesajlar kullanıcının tüm açık soketlerinin gönderim kuyruklarına
+    eklenir; gönderimi başarısız olan soket diğerlerini etkilemeden
+    kayıttan düşer. Birden fazla worker çalışırken mesajlar broker
+    üzerinden alıcının bağlı olduğu worker'a yönlendirilir.
+    """
 
-    async def connect(self, websocket: WebSocket, user_id: str):
+    def __init__(self, broker: MessageBroker,
+                 max_queue: int = settings.WS_SEND_QUEUE_SIZE,
+                 queue_policy: str = settings.WS_SEND_QUEUE_POLICY,
+                 heartbeat_interval: float = settings.WS_HEARTBEAT_INTERVAL,
+                 idle_timeout: float = settings.WS_IDLE_TIMEOUT):
+        self.active_connections: Dict[str, Dict[WebSocket, ClientConnection]] = {}
+        self.max_queue = max_queue
+        self.queue_policy = queue_policy
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.reaped = 0
+        self.broker = broker
+        self.broker.deliver = self.deliver_local
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.broker.start()
+        if self.heartbeat_interval > 0 and self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        await self.broker.stop()
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error("WebSocket heartbeat error: %s", e)
+
+    def heartbeat(self) -> int:
+        """
+        Zaman aşımına uğramış bağlantıları kapat, sessiz kalanlara ping
+        gönder. Kapatılan bağlantı sayısını döndürür.
+        """
+        now = time.monotonic()
+        ping = json.dumps({"type": "ping", "timestamp": datetime.now(timezone.utc).isoformat()})
+        reaped = 0
+        for connection in [c for sockets in self.active_connections.values() for c in sockets.values()]:
+            idle = now - connection.last_seen
+            if self.idle_timeout > 0 and idle >= self.idle_timeout:
+                # Yarı açık TCP bağlantısında receive döngüsü de bu kapanışla sonlanır
+                connection.close(code=IDLE_CLOSE_CODE)
+                reaped += 1
+            elif idle >= self.heartbeat_interval:
+                connection.enqueue(ping)
+
+        if reaped:
+            self.reaped += reaped
+            websocket_reaped.inc(reaped)
+            logger.info("Reaped %s idle WebSocket connections", reaped)
+        return reaped
+
+    def _update_gauge(self):
+        websocket_connections.set(sum(len(sockets) for sockets in self.active_connections.values()))
+
+    async def connect(self, websocket: WebSocket, user_id: str) -> ClientConnection:
         await websocket.accept()
-        self.active_connections[user_id] = websocket
-        print(f"User {user_id} connected to WebSocket")
+        if not self.active_connections.get(user_id):
+            self.broker.subscribe(user_id)
+        connection = ClientConnection(websocket, user_id, self.max_queue, self.queue_policy, self._remove)
+        self.active_connections.setdefault(user_id, {})[websocket] = connection
+        self._update_gauge()
+        logger.info(
+            "User %s connected to WebSocket (%s connections)",
+            user_id, self.connection_count(user_id)
+        )
+        return connection
+
+    def disconnect(self, user_id: str, websocket: WebSocket):
+        """Sadece verilen soketi kaldır; kullanıcının diğer bağlantıları açık kalır"""
+        connection = self.active_connections.get(user_id, {}).get(websocket)
+        if connection is not None:
+            connection.close()
+
+    def _remove(self, connection: ClientConnection):
+        sockets = self.active_connections.get(connection.user_id)
+        if not sockets or sockets.get(connection.websocket) is not connection:
+            return
 
-    def disconnect(self, user_id: str):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-            print(f"User {user_id} disconnected from WebSocket")
+        del sockets[connection.websocket]
+        if not sockets:
+            del self.active_connections[connection.user_id]
+            self.broker.unsubscribe(connection.user_id)
+        self._update_gauge()
+        logger.info(
+            "User %s disconnected from WebSocket (%s connections left)",
+            connection.user_id, self.connection_count(connection.user_id)
+        )
 
     def is_connected(self, user_id: str) -> bool:
-        return user_id in self.active_connections
-
-    async def send_personal_message(self, message: dict, user_id: str):
-        if user_id in self.active_connections:
-            if "timestamp" not in message:
-                message["timestamp"] = datetime.now(timezone.utc).isoformat()
-            await self.active_connections[user_id].send_json(message)
-ws_manager = WebSocketManager()
\ No newline at end of file
+        """Kullanıcının bu worker'da açık soketi var mı"""
+        return bool(self.active_connections.get(user_id))
+
+    def connection_count(self, user_id: str) -> int:
+        return len(self.active_connections.get(user_id, ()))
+
+    def connection_counts(self) -> Dict[str, int]:
+        """Kullanıcı id'si -> açık bağlantı sayısı"""
+        return {user_id: len(sockets) for user_id, sockets in self.active_connections.items()}
+
+    def stats(self) -> dict:
+        counts = self.connection_counts().values()
+        depths = [
+            connection.depth
+            for sockets in self.active_connections.values()
+            for connection in sockets.values()
+        ]
+        return {
+            "users": len(counts),
+            "connections": sum(counts),
+            "max_per_user": max(counts, default=0),
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "reaped": self.reaped,
+            **self.broker.stats()
+        }
+
+    async def send_personal_message(self, message: dict, user_id: str,
+                                    received_at: Optional[float] = None) -> bool:
+        """
+        Mesajı hangi worker'a bağlı olursa olsun kullanıcının tüm
+        bağlantılarına gönder; teslim edildiyse True döner. received_at
+        verilirse ilk sokete yazıldığında teslim gecikmesi ölçülür.
+        """
+        if "timestamp" not in message:
+            message["timestamp"] = datetime.now(timezone.utc).isoformat()
+        return await self.broker.publish(user_id, message, received_at)
+
+    async def deliver_local(self, user_id: str, message: dict,
+                            received_at: Optional[float] = None) -> bool:
+        """
+        Mesajı kullanıcının bu worker'daki soketlerinin kuyruklarına ekle;
+        en az bir kuyruk kabul ettiyse True döner.
+        """
+        connections = list(self.active_connections.get(user_id, {}).values())
+        if not connections:
+            return False
+
+        # JSON her soket için ayrı ayrı değil, bir kez üretilir
+        text = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        key = _coalesce_key(message)
+        timer = DeliveryTimer(received_at) if received_at is not None else None
+
+        delivered = False
+        for connection in connections:
+            if connection.enqueue(text, key, timer):
+                delivered = True
+        return delivered
+
+ws_manager = WebSocketManager(create_broker())
@@ -3,6 +3,9 @@ import sib_api_v3_sdk
 from sib_api_v3_sdk.rest import ApiException
 from pydantic import EmailStr
 from ..config import settings
+import logging
+
+logger = logging.getLogger(__name__)
 
 async def send_verification_email(email: str, code: str):
     # API yapılandırması
@@ -43,5 +46,5 @@ async def send_verification_email(email: str, code: str):
         api_instance.send_transac_email(send_smtp_email)
         return True
     except ApiException as e:
-        print(f"Email gönderme hatası: {e}")
+        logger.error("Email gönderme hatası: %s", e)
         return False
\ No newline at end of file
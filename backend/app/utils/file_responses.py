@@ -0,0 +1,25 @@
+# backend/app/utils/file_responses.py
+from typing import Optional
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from ..services.renditions import rendition_service
+
+async def rendition_response(request: Request, bucket, stored: dict, file_id: str,
+                             size: str) -> Optional[Response]:
+    """
+    Dosyanın `size` türevini (küçük resim/PDF ilk sayfası) gönder; türev
+    yoksa ya da üretilemiyorsa None döner. Türevler değişmediği için
+    istemci önbelleğinde tutulabilir.
+    """
+    etag = f'"{file_id}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    opened = await rendition_service.open_rendition(bucket, stored, size)
+    if opened is None:
+        return None
+    chunks, length, media_type = opened
+    headers["Content-Length"] = str(length)
+    headers["Content-Disposition"] = f'inline; filename="{size}_{stored["filename"]}"'
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
@@ -0,0 +1,60 @@
+# backend/app/utils/http_range.py
+import re
+from typing import List, Optional, Tuple
+
+# Tek istekte kabul edilen en fazla aralık; fazlası için tüm dosya gönderilir
+MAX_RANGES = 16
+
+_RANGE_SPEC = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+class RangeNotSatisfiable(Exception):
+    """Range başlığındaki aralıkların hiçbiri dosyaya denk gelmiyor (416)"""
+
+def parse_range_header(header: Optional[str], length: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    'bytes=0-99,200-,-500' biçimindeki Range başlığını [start, end] (end
+    dahil) aralıklarına çevir. Başlık yoksa, biçimi bozuksa ya da çok fazla
+    aralık varsa None döner ve tüm dosya gönderilmelidir. Örtüşen veya
+    bitişik aralıklar birleştirilir.
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs:
+        return None
+
+    specs = specs.split(",")
+    if len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        match = _RANGE_SPEC.match(spec)
+        if not match or match.group(1) == match.group(2) == "":
+            return None
+        first, last = match.groups()
+        if first == "":
+            # Son N byte
+            suffix = int(last)
+            if suffix == 0:
+                continue
+            start, end = max(0, length - suffix), length - 1
+        else:
+            start = int(first)
+            end = min(int(last), length - 1) if last else length - 1
+            if last and int(last) < start:
+                return None
+        if start < length and start <= end:
+            ranges.append((start, end))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        if start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
@@ -0,0 +1,137 @@
+# backend/app/utils/logger.py
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from ..config import settings
+from ..services.metrics import registry
+
+# Uygulama logger'larının kökü; modüller logging.getLogger(__name__) kullanır
+ROOT_LOGGER = "app"
+
+log_records_dropped = registry.counter(
+    "log_records_dropped_total", "Log records dropped before reaching the output",
+    ("reason",)
+)
+
+# LogRecord'un kendi alanları; bunların dışındakiler extra={} ile gelen alanlardır
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class StructuredFormatter(logging.Formatter):
+    """Kayıtları tek satır JSON olarak yazar; extra={} alanları da eklenir"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "func": record.funcName,
+            "msg": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+class DebugSampler(logging.Filter):
+    """
+    DEBUG kayıtlarını örnekler ve aynı çağrı noktası için saniyedeki kayıt
+    sayısını sınırlar. INFO ve üstü seviyeler her zaman geçer.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, per_second: float = 0):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.per_second = per_second
+        self._buckets: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            log_records_dropped.inc(reason="sampled")
+            return False
+
+        if self.per_second > 0:
+            # Çağrı noktası başına token bucket
+            key = (record.pathname, record.lineno)
+            now = time.monotonic()
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = [self.per_second, now]
+                tokens = min(self.per_second, bucket[0] + (now - bucket[1]) * self.per_second)
+                bucket[1] = now
+                if tokens < 1:
+                    bucket[0] = tokens
+                    log_records_dropped.inc(reason="rate_limited")
+                    return False
+                bucket[0] = tokens - 1
+        return True
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Kuyruk doluysa isteği bekletmek yerine kaydı düşürür"""
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc(reason="queue_full")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging():
+    """
+    Uygulama logger'larını yapılandır. Kayıtlar istek/event loop thread'inde
+    sadece kuyruğa yazılır; biçimlendirme ve çıktı arka plandaki
+    QueueListener thread'inde yapılır. DEBUG_LOGGING açılmadıkça seviye
+    LOG_LEVEL'dir (varsayılan WARNING), yani ayrıntılı tanılama kayıtları
+    hiç oluşturulmaz.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    level = logging.DEBUG if settings.DEBUG_LOGGING else settings.LOG_LEVEL.upper()
+
+    output = logging.StreamHandler(sys.stderr)
+    if settings.LOG_FORMAT == "text":
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        output.setFormatter(StructuredFormatter())
+
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    queue_handler = _DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(
+        settings.LOG_DEBUG_SAMPLE_RATE,
+        settings.LOG_DEBUG_RATE_LIMIT
+    ))
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    root.handlers = [queue_handler]
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Kuyrukta kalan kayıtları yazıp listener thread'ini durdur"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
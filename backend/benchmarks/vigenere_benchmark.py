@@ -0,0 +1,82 @@
+# backend/benchmarks/vigenere_benchmark.py
+"""
+Vigenere: tablo tabanlı uygulama ile eski karakter-karakter uygulamanın
+hız ve saklama boyutu karşılaştırması.
+
+Kullanım (backend klasöründen):
+    python -m benchmarks.vigenere_benchmark
+"""
+import logging
+import os
+import timeit
+
+# config modülü DATABASE_URL ister; benchmark veritabanına bağlanmaz
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+
+import bson
+from app.services.encryption import encryption_service
+
+SAMPLES = {
+    "turkish": "Merhaba Dünya! Güvenli mesajlaşma ŞİFRELİ İleti, çok önemli. ",
+    "ascii": "Hello, see you at the meeting tomorrow around 7 pm. ",
+}
+LENGTHS = (64, 1024, 16384)
+REPEAT = 5
+
+def legacy_char_info(message: str):
+    """Eski formatın karakter başına sakladığı (tip, büyük harf) bilgisi"""
+    tr_chars = "ĞÜŞİÖÇğüşıöç"
+    return [
+        ('tr', c in "ĞÜŞİÖÇ") if c in tr_chars else ('en', c.isupper())
+        for c in message
+    ]
+
+def best_of(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=REPEAT)) / number
+
+def measure(name: str, message: str) -> tuple:
+    number = max(1, 20000 // len(message))
+
+    encrypted, new_data = encryption_service.encrypt_vigenere(message)
+    legacy_data = {'key': new_data['key'], 'char_info': legacy_char_info(message)}
+
+    encrypt_time = best_of(lambda: encryption_service.encrypt_vigenere(message), number)
+    new_decrypt = best_of(
+        lambda: encryption_service.decrypt_vigenere(encrypted, new_data), number
+    )
+    legacy_decrypt = best_of(
+        lambda: encryption_service.decrypt_vigenere(encrypted, legacy_data), number
+    )
+
+    return (
+        name,
+        len(message),
+        encrypt_time * 1e6,
+        legacy_decrypt * 1e6,
+        new_decrypt * 1e6,
+        len(bson.encode({'encryption_data': legacy_data})),
+        len(bson.encode({'encryption_data': new_data})),
+    )
+
+def main():
+    # Servisin log kayıtları ölçümü bozmasın
+    app_logger = logging.getLogger("app")
+    original_level = app_logger.level
+    app_logger.setLevel(logging.CRITICAL + 1)
+    try:
+        rows = [
+            measure(name, (sample * (length // len(sample) + 1))[:length])
+            for name, sample in SAMPLES.items()
+            for length in LENGTHS
+        ]
+    finally:
+        app_logger.setLevel(original_level)
+
+    print(f"{'sample':>8} {'chars':>7} {'encrypt µs':>11} {'legacy dec µs':>14} {'new dec µs':>11} "
+          f"{'speedup':>8} {'legacy bytes':>13} {'new bytes':>10}")
+    for name, length, enc, legacy_dec, new_dec, legacy_size, new_size in rows:
+        print(f"{name:>8} {length:>7} {enc:>11.1f} {legacy_dec:>14.1f} {new_dec:>11.1f} "
+              f"{legacy_dec / new_dec:>7.1f}x {legacy_size:>13} {new_size:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -30,13 +30,15 @@ const FilePreview: React.FC<FilePreviewProps> = ({
         setIsLoading(true);
         const token = localStorage.getItem('token');
         
+        // Balon 250px; orijinal yerine sunucuda üretilen küçük kopya istenir
+        // (üretilemezse sunucu orijinali gönderir)
         let endpoint;
         if (isMessage) {
           // Mesaj dosyaları için message_files koleksiyonunu kullan
-          endpoint = `/api/messages/files/${file.id}`;
+          endpoint = `/api/messages/files/preview/${file.id}?size=medium`;
         } else {
           // Normal dosyalar için fs koleksiyonunu kullan
-          endpoint = `/api/files/files/${file.id}`;
+          endpoint = `/api/files/preview/${file.id}?size=medium`;
         }
 
         console.log('Loading preview from:', endpoint); // Debug için
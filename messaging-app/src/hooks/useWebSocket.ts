@@ -21,6 +21,11 @@ export const useWebSocket = (userId: string, onMessageReceived: (message: Messag
         websocket.onmessage = (event) => {
             try {
                 const message = JSON.parse(event.data);
+                // Sunucunun heartbeat ping'ine cevap ver, aksi halde bağlantı boşta sayılıp kapatılır
+                if (message.type === 'ping') {
+                    websocket.send(JSON.stringify({ type: 'pong' }));
+                    return;
+                }
                 if (message.type === 'message') {
                     onMessageReceived(message);
                 }